@@ -3,14 +3,37 @@
 import logging
 import time
 from analysis import analysis
+from balanceCache import BalanceCache
+from cycleRuntime import CycleRuntime, call, exclusive
 from datetime import datetime
-from ollamaModel import call_llama_model
-from restClient import client
+from decisionCache import DecisionCache, quantize_features
+from eventTrigger import BookThresholdSource, CandleCloseSource, EventTrigger
+from latencyMetrics import metrics, start_exporter
+from indicatorEngine import IndicatorEngine
+from marketSnapshot import depth, get_current_price, get_market_snapshot, use_order_book_feed
+from ollamaModel import stream_decision
+from orderBook import OrderBookFeed
 from restClientHelper import market_order_buy, market_order_sell
+from strategyRules import ai_buy_percentage, ai_sell_percentage
+from timeStamps import exchange_now
 
 CRYPTO = "XRP"
 CASH = "USD"
 PRODUCT_ID = "XRP-USD"
+# 每个 REST 调用和 LLM 调用的超时时间（秒）
+FETCH_TIMEOUT = 10
+LLM_TIMEOUT = 60
+# 流式读取 LLM 决策的截止时间（秒），小于 LLM_TIMEOUT
+LLM_DEADLINE = 30
+# 计算盘口不平衡时使用的档数
+IMBALANCE_LEVELS = 10
+# LLM 决策缓存的持久化文件
+DECISION_CACHE_FILE = 'decision_cache.json'
+# 事件驱动模式：1 分钟蜡烛收盘或盘口中间价变化超过 BOOK_TRIGGER_BPS 时立即决策，没有事件时按 DECISION_INTERVAL 兜底
+EVENT_DRIVEN = True
+DECISION_INTERVAL = 60
+MIN_DECISION_INTERVAL = 15
+BOOK_TRIGGER_BPS = 20
 
 # Configure logging
 logging.basicConfig(
@@ -21,6 +44,23 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# 增量指标引擎，在交易循环之间保留状态
+indicator_engine = IndicatorEngine()
+# 超时的分析仍在后台线程运行时跳过本周期，两个线程不会同时更新 indicator_engine
+exclusive_analysis = exclusive(analysis)
+
+# 并发执行每个周期里互不依赖的数据请求
+runtime = CycleRuntime(default_timeout=FETCH_TIMEOUT)
+
+# 相同（量化后）市场状态的 LLM 决策缓存
+decision_cache = DecisionCache(persist_file=DECISION_CACHE_FILE)
+
+# 决策触发器
+trigger = EventTrigger(min_interval=MIN_DECISION_INTERVAL)
+
+# 账户余额缓存，由用户频道的成交推送保持最新
+balance_cache = BalanceCache([PRODUCT_ID])
+
 # Function to make a trade decision using LLM and KNN strategy
 def make_llm_trade_decision(prompt):
     try:
@@ -41,47 +81,30 @@ def make_llm_trade_decision(prompt):
 
         logger.debug(f"Sending enhanced prompt to LLM:\n{enhanced_prompt}")
         
-        response = call_llama_model(enhanced_prompt)
+        # 流式读取，第一行出现 BUY / SELL / HOLD 即返回；超过截止时间返回 None（按 HOLD 处理，不写入缓存）
+        decision = stream_decision(enhanced_prompt, deadline=LLM_DEADLINE, fallback=None, product_id=PRODUCT_ID)
 
-        logger.debug(f"Raw LLM response: {response}")
-
-        first_line = response.splitlines()[0]
-
-        logger.debug(f"LLM parsed response: {first_line}")
-
-        if "BUY" in first_line:
-            return "BUY"
-        elif "SELL" in first_line:
-            return "SELL"
-        elif "HOLD" in first_line:
-            return "HOLD"
-        else:
-            logger.warning("Unclear response from LLM, defaulting to HOLD.")
-            return "HOLD"
+        logger.debug(f"LLM parsed response: {decision}")
+        return decision
 
     except Exception as e:
+        # 返回 None 而不是 HOLD，调用失败的结果不写入决策缓存
         logger.exception("Failed to communicate with LLM.")
-        return "HOLD"
+        return None
 
 
 def get_product_book(product_id):
     try:
         logger.debug(f"Fetching product book data for {product_id}...")
 
-        # Fetch the product book data using the SDK's built-in method
-        product_book_data = client.get_product_book(product_id=product_id, limit=100)
-
-        # Log the entire raw response to inspect its structure
-        #logger.debug(f"Full product book data: {product_book_data}")
-
-        # Extract bids and asks from the 'pricebook' section of the data
-        pricebook = product_book_data['pricebook']
-        bids = pricebook['bids']
-        asks = pricebook['asks']
+        # 共享的盘口快照，TTL 内与 get_current_price 共用同一次 REST 请求
+        snapshot = get_market_snapshot(product_id)
+        bids = snapshot.bids
+        asks = snapshot.asks
 
         # Find the best bid (highest bid price) and best ask (lowest ask price)
-        best_bid = float(bids[0]['price']) if bids else None
-        best_ask = float(asks[0]['price']) if asks else None
+        best_bid = snapshot.best_bid
+        best_ask = snapshot.best_ask
 
         if best_bid is None or best_ask is None:
             logger.error("Failed to extract best bid or best ask from the data.")
@@ -92,8 +115,8 @@ def get_product_book(product_id):
 
         # Assume that each trade happens at the midpoint between a bid and an ask
         for i in range(min(len(bids), len(asks))):
-            trade_price = (float(bids[i]['price']) + float(asks[i]['price'])) / 2
-            trade_size = min(float(bids[i]['size']), float(asks[i]['size']))  # Assume trade size is the smaller of bid/ask
+            trade_price = (bids[i][0] + asks[i][0]) / 2
+            trade_size = min(bids[i][1], asks[i][1])  # Assume trade size is the smaller of bid/ask
             recent_trades.append({
                 'trade_id': f"trade_{i}",
                 'price': trade_price,
@@ -130,29 +153,27 @@ def get_product_book(product_id):
         return None, None, None
 
 
-def get_balances():
+def get_book_depth(product_id):
     try:
-        # Fetch account balances using the SDK
-        response = client.get_accounts()
-
-        # Extract the list of accounts from the response
-        accounts = response['accounts']
-
-        # Log the raw accounts response for debugging
-        #logger.debug(f"Accounts data: {accounts}")
-
-        crypto_balance = None
-        cash_balance = None
+        snapshot = get_market_snapshot(product_id)
+        return depth(snapshot.bids, IMBALANCE_LEVELS), depth(snapshot.asks, IMBALANCE_LEVELS)
+    except Exception as e:
+        logger.exception(f"Error getting book depth for {product_id}: {e}")
+        return None, None
 
-        # Loop through the accounts to find balances for BTC and USDC
-        for account in accounts:
-            currency = account['currency']
-            available_balance = account['available_balance']['value']
+def get_book_mid(order_book_feed):
+    # 只读取本地盘口，没有网络请求
+    book = order_book_feed.get_book(PRODUCT_ID)
+    return book.mid() if book is not None else None
 
-            if currency == CRYPTO:
-                crypto_balance = float(available_balance)
-            elif currency == CASH:
-                cash_balance = float(available_balance)
+def get_balances():
+    try:
+        # 余额来自用户频道推送更新的缓存（字典读取），首次调用时通过 REST 初始化
+        # 在 try 之内计时，异常在下面被吞掉之前先记为 error
+        with metrics.stage('get_balances', PRODUCT_ID):
+            if not balance_cache.seeded:
+                balance_cache.start()
+            crypto_balance, cash_balance = balance_cache.get_balances(CRYPTO, CASH)
 
         # Print and return balances
         if crypto_balance is not None:
@@ -171,48 +192,16 @@ def get_balances():
         logger.exception("Failed to retrieve account balances.")
         return None, None
 
-
-
-# Get current crypto price
-def get_current_crypto_price():
-    try:
-        logger.info(f"Fetching current {CRYPTO} price...")
-
-        # Fetch the product book data using the SDK's method
-        product_book_data = client.get_product_book(product_id=PRODUCT_ID)
-
-        # Extract bids and asks from 'pricebook'
-        pricebook = product_book_data['pricebook']
-        bids = pricebook['bids']
-        asks = pricebook['asks']
-
-        # Get the best bid and ask from the first entry
-        best_bid = float(bids[0]['price']) if bids else None
-        best_ask = float(asks[0]['price']) if asks else None
-
-        # Calculate the midpoint as the current price
-        if best_bid and best_ask:
-            current_price = (best_bid + best_ask) / 2
-            logger.info(f"Calculated {CRYPTO} price: {current_price:.8f} {CASH} (midpoint of best_bid and best_ask)")
-            return current_price
-        else:
-            logger.error("Best bid or best ask is missing.")
-            return None
-
-    except Exception as e:
-        logger.exception(f"Failed to retrieve {CRYPTO} price.")
-        return None
-
 # Analyse how many cryptos we should buy
 def analysis_buy_price(cash_balance, percent_b):
-    buy_percentage = (percent_b + 0.3) * 0.20
+    buy_percentage = ai_buy_percentage(percent_b)
     buy_amount = cash_balance * buy_percentage
     print(f"Current {CASH} Balance: {cash_balance}, percent_b: {percent_b}, buy_percentage: {buy_percentage}, buy_amount: {buy_amount}")
     return buy_amount
 
 # Analyse how many cryptos we should sell
 def analysis_sell_price(crypto_balance, percent_b):
-    sell_percentage = min((1-percent_b) * 0.40, 1)
+    sell_percentage = ai_sell_percentage(percent_b)
     sell_amount = crypto_balance * sell_percentage
     print(f"Current {CRYPTO} Balance: {crypto_balance}, percent_b: {percent_b}, sell_percentage: {sell_percentage}, sell_amount: {sell_amount}")
     return sell_amount
@@ -221,25 +210,43 @@ def analysis_sell_price(crypto_balance, percent_b):
 # Main trading logic
 def main():
     logger.info("Starting main trading loop...")
+    # 各阶段耗时定期写入 metrics_aiTrader.prom（Prometheus 文本格式）
+    start_exporter('aiTrader')
+    # 盘口由 level2 频道在本地维护，不再每个周期请求 REST
+    order_book_feed = OrderBookFeed([PRODUCT_ID]).start()
+    use_order_book_feed(order_book_feed)
+    if EVENT_DRIVEN:
+        CandleCloseSource(DECISION_INTERVAL, clock=exchange_now).start(trigger)
+        BookThresholdSource(lambda: get_book_mid(order_book_feed), BOOK_TRIGGER_BPS).start(trigger)
     while True:
-        # Get the current balances
-        crypto_balance, cash_balance = get_balances()
+        # 余额、盘口、K 线指标和当前价格互不依赖，并发获取
+        results = runtime.fetch_all({
+            'balances': call(get_balances, default=(None, None)),
+            'product_book': call(get_product_book, PRODUCT_ID, default=(None, None, None)),
+            'analysis': call(exclusive_analysis, engine=indicator_engine, product_id=PRODUCT_ID),
+            'current_price': call(get_current_price, PRODUCT_ID),
+        })
+        crypto_balance, cash_balance = results['balances']
+        prompt, best_bid, best_ask = results['product_book']
 
         if crypto_balance is None or cash_balance is None:
             logger.warning("Failed to retrieve account balances. Skipping this cycle.")
+            time.sleep(60)
             continue
 
-        # Fetch real-time market data and construct prompt for LLM
-        prompt, best_bid, best_ask = get_product_book(PRODUCT_ID)
+        if results['analysis'] is None:
+            logger.warning("Failed to analyse candles. Skipping this cycle.")
+            time.sleep(60)
+            continue
 
         # Add RSI and Bollinger Bands value to prompt
-        signal, rsi, percent_b = analysis()
-        prompt += (
-                f"singal: {signal}, RSI value: {rsi:.2f}, Bollinger Bands% value: {percent_b:.2f}. "
-            )
+        signal, rsi, percent_b = results['analysis']
 
         if prompt and best_bid and best_ask:
-            current_price = get_current_crypto_price()
+            prompt += (
+                f"singal: {signal}, RSI value: {rsi:.2f}, Bollinger Bands% value: {percent_b:.2f}. "
+            )
+            current_price = results['current_price']
             # Append the current price, balances, and recent trades to the prompt
             prompt += (
                 f"Current {CRYPTO} price: {current_price} {CASH}."
@@ -249,9 +256,19 @@ def main():
 
             print("Prompt: ", prompt)
 
-            # Get the decision from the LLM
-            decision = make_llm_trade_decision(prompt)
-            logger.info(f"Trade decision: {decision}")
+            # 量化后的市场状态命中缓存时直接使用之前的决策，不再调用模型
+            bid_depth, ask_depth = get_book_depth(PRODUCT_ID)
+            decision_key = quantize_features(signal, rsi, percent_b, best_bid, best_ask, bid_depth, ask_depth)
+            decision = decision_cache.get(decision_key)
+            if decision is None:
+                # Get the decision from the LLM
+                decision = runtime.fetch(make_llm_trade_decision, prompt, timeout=LLM_TIMEOUT)
+                if decision is None:
+                    logger.warning("LLM call failed or timed out, defaulting to HOLD.")
+                    decision = "HOLD"
+                else:
+                    decision_cache.put(decision_key, decision)
+            logger.info(f"Trade decision: {decision}, decision cache: {decision_cache.stats()}")
 
             # Execute the trade based on LLM's decision
             print("decision", decision)
@@ -269,8 +286,8 @@ def main():
         else:
             logger.warning("Failed to construct prompt for LLM. Skipping this cycle.")
 
-        # sleep for 1 minutes
-        time.sleep(60)
+        # 等待下一个事件（最多 1 分钟）
+        trigger.wait(timeout=DECISION_INTERVAL)
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,28 @@
 from technicalAnalysis import process_candle_data, calculate_indicators, detect_golden_death_cross
 from getProductCandles import get_candles
-
-def analysis(minutes=0, hours=0, days=0, seconds=0):
-    # 处理蜡烛数据
-    df = process_candle_data(get_candles(minutes, hours, days, seconds))
-    # 计算指标
-    df = calculate_indicators(df)
-    # 检测金叉和死叉
-    df = detect_golden_death_cross(df)
-
-    # 获取最新一条数据
-    latest_data = df.iloc[-1]
+from latencyMetrics import metrics
+
+def analysis(minutes=0, hours=0, days=0, seconds=0, engine=None, candles=None, product_id='XRP-USD'):
+    # 处理蜡烛数据；传入 candles（例如本地生成蜡烛的 CandleAggregator）时不通过 REST 拉取
+    if candles is None:
+        candles = get_candles(minutes, hours, days, seconds, product_id=product_id)
+    # 指标计算的耗时（不包括 get_candles，它单独计时）
+    with metrics.stage('indicators', product_id):
+        df = process_candle_data(candles)
+
+        if engine is not None:
+            # 增量引擎：只处理新增的蜡烛，O(1) 更新所有指标
+            latest_data = engine.update_from_df(df)
+            if not engine.is_ready():
+                raise Exception("ERROR: Need at least 20 datapoints to analyse.")
+        else:
+            # 计算指标
+            df = calculate_indicators(df)
+            # 检测金叉和死叉
+            df = detect_golden_death_cross(df)
+
+            # 获取最新一条数据
+            latest_data = df.iloc[-1]
     # print(latest_data)
 
     # # 判断当前走势
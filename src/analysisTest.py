@@ -1,44 +1,36 @@
-from datetime import datetime, timedelta
-from analysis import analysis
-from timeStamps import convert_timedelta_to_seconds
-import time
+from datetime import datetime, timedelta, timezone
+from backtest import load_candle_history, compute_signals, run_backtest
 
-def analysis_test(start_time_str, end_time_str, interval_minutes=5, tps=3):
+def analysis_test(start_time_str=None, end_time_str=None, interval_minutes=5):
     """
-    从指定的开始时间到结束时间，每隔 interval_minutes 分钟运行一次 analysis 函数。
-    以指定的 TPS（每秒处理次数）运行，默认为 3 TPS。
+    离线回测：从本地蜡烛缓存一次性读取历史数据，向量化计算所有时间点的指标和信号，
+    再按 interval_minutes 输出每一步的结果并运行 simpleTrader / aiTrader 的规则。
+    :param start_time_str: 'YYYY-MM-DD HH:MM:SS'（UTC），None 时为缓存中最后一天的开始
+    :param end_time_str: None 时为缓存中最后一根蜡烛
     """
-    # 将字符串转换为 datetime 对象
-    start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S')
-    end_time = datetime.strptime(end_time_str, '%Y-%m-%d %H:%M:%S')
+    df = load_candle_history()
+    end_time = parse_time(end_time_str) if end_time_str else df['start'].iloc[-1]
+    start_time = parse_time(start_time_str) if start_time_str else end_time - timedelta(days=1)
+    # 在整段历史上计算指标，保证窗口开头也有足够的前置数据
+    signals = compute_signals(df)
+    window = signals[(signals['start'] >= start_time) & (signals['start'] <= end_time)]
 
-    # 计算每一步的时间间隔（秒）
-    time_per_step = 1.0 / tps  # 每秒处理 tps 次
-    t = start_time
+    # 与旧版每一步调用 analysis() 的输出相同
+    for row in window.iloc[::interval_minutes].itertuples(index=False):
+        print(f"TimeFrame: {row.start}, signal: {row.signal}, RSI value: {row.RSI:.2f}, Bollinger Bands% value: {row.PercentB:.2f}. ")
 
-    while t <= end_time:
-        current_time = datetime.utcnow()
-        # print(f"\n运行时间：{current_time}")
+    for strategy in ('simple', 'ai'):
+        result = run_backtest(df, strategy=strategy, start_time=start_time, end_time=end_time)
+        print(f"Strategy: {strategy}, PnL: {result['pnl']:.2f} ({result['pnl_pct']:.2f}%), Max Drawdown: {result['max_drawdown']:.2f}%, Trades: {result['trades']}")
 
-        # 计算从开始时间到当前时间的秒数，作为 analysis 函数的参数
-        seconds_difference = convert_timedelta_to_seconds(current_time - t)
-
-        # 调用 analysis 函数，传递 seconds_difference 参数
-        analysis(seconds=seconds_difference)
-
-        # 时间步进
-        t += timedelta(minutes=interval_minutes)
-
-        # 控制 TPS
-        time.sleep(time_per_step)
+def parse_time(time_str):
+    # 将字符串转换为 datetime 对象（UTC）
+    return datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
 
 def main():
-    # 设置开始和结束时间，格式为 'YYYY-MM-DD HH:MM:SS'
-    start_time_str = '2024-11-27 00:20:00'
-    end_time_str = '2024-11-27 01:10:00'
-
-    # 调用 analysis_test 函数，设置 TPS 为 3
-    analysis_test(start_time_str, end_time_str, tps=3)
+    # 默认回测缓存中的最后一天；指定时间段时格式为 'YYYY-MM-DD HH:MM:SS'，例如
+    # analysis_test('2024-11-27 00:20:00', '2024-11-27 01:10:00')
+    analysis_test()
 
 if __name__ == "__main__":
     main()
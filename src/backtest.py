@@ -0,0 +1,284 @@
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+from candleStore import CACHE_DIR
+from strategyRules import SIMPLE_BUY_THRESHOLD, SIMPLE_SELL_THRESHOLD, SIMPLE_BUY_FRACTION, SIMPLE_SELL_FRACTION, ai_buy_percentage, ai_sell_percentage
+from strategyRules import OPPOSITE_VOLUME_THRESHOLD, OPPOSITE_SELL_CAP, OPPOSITE_BUY_CAP, OPPOSITE_SELL_STREAK_MULTIPLIER, OPPOSITE_BUY_STREAK_MULTIPLIER
+from technicalAnalysis import calculate_indicators, detect_golden_death_cross
+
+# wsMonitor 按交易对写入的买卖比记录，以及按交易对拆分之前的记录文件
+TRADE_FLOW_FILE = 'trade_analysis_{product_id}.txt'
+LEGACY_TRADE_FLOW_FILE = 'trade_analysis.txt'
+
+def load_candle_history(product_id='XRP-USD', granularity="ONE_MINUTE", cache_dir=CACHE_DIR):
+    """
+    一次性读取本地蜡烛缓存（见 candleStore），不需要网络。
+    :return: 与 process_candle_data 结构相同的 DataFrame，按时间升序
+    """
+    file_path = os.path.join(cache_dir, f"{product_id}_{granularity}.csv")
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Candle history not found: {file_path}, run getProductCandles.fill_candle_history first.")
+
+    df = pd.read_csv(file_path)
+    # 同一根蜡烛以最后写入的为准
+    df = df.drop_duplicates('start', keep='last').sort_values('start').reset_index(drop=True)
+    df['start'] = pd.to_datetime(df['start'], unit='s', utc=True)
+    return df
+
+def load_trade_flow_history(file_path=None, product_id='XRP-USD'):
+    """
+    读取 wsMonitor 输出的买卖比记录，与 oppositeTrader 一样跳过成交量或买卖比为 0 的数据点。
+    :param file_path: 默认读取 trade_analysis_<product_id>.txt，不存在时读取按交易对拆分之前的 trade_analysis.txt
+    :return: DataFrame，包含 time（时间窗口结束时间，UTC）、total_volume、ratio
+    """
+    if file_path is None:
+        file_path = TRADE_FLOW_FILE.format(product_id=product_id)
+        if not os.path.exists(file_path) and os.path.exists(LEGACY_TRADE_FLOW_FILE):
+            file_path = LEGACY_TRADE_FLOW_FILE
+    rows = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            time_match = re.search(r' - (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})', line)
+            total_volume_match = re.search(r'Total Volume: (\d+\.?\d*)', line)
+            ratio_match = re.search(r'Ratio: ([+-]?\d+\.?\d*)', line)
+            if time_match and total_volume_match and ratio_match:
+                total_volume = float(total_volume_match.group(1))
+                ratio = float(ratio_match.group(1))
+                if total_volume == 0 or ratio == 0.0:
+                    continue
+                rows.append((time_match.group(1), total_volume, ratio))
+
+    df = pd.DataFrame(rows, columns=['time', 'total_volume', 'ratio'])
+    df['time'] = pd.to_datetime(df['time'], utc=True)
+    return df.sort_values('time').reset_index(drop=True)
+
+def compute_signals(df, **indicator_params):
+    """
+    一次向量化计算全部时间点的指标和金叉/死叉信号。
+    :param indicator_params: 传给 calculate_indicators 的窗口参数
+    """
+    # 浅拷贝即可：只会新增列，不会修改原有的蜡烛数据（optimizer 中它们位于共享内存）
+    df = calculate_indicators(df.copy(deep=False), **indicator_params)
+    return detect_golden_death_cross(df)
+
+def simple_trader_actions(percent_b, buy_threshold=SIMPLE_BUY_THRESHOLD, sell_threshold=SIMPLE_SELL_THRESHOLD,
+                          buy_fraction=SIMPLE_BUY_FRACTION, sell_fraction=SIMPLE_SELL_FRACTION):
+    """
+    simpleTrader 的 %B 阈值规则，返回每个时间点的动作（1 买 / -1 卖 / 0 持有）和下单比例。
+    """
+    actions = np.where(percent_b > buy_threshold, 1, np.where(percent_b < sell_threshold, -1, 0))
+    fractions = np.where(actions == 1, buy_fraction, np.where(actions == -1, sell_fraction, 0.0))
+    return actions, fractions
+
+def ai_trader_actions(signal, percent_b):
+    """
+    aiTrader 的下单规则。离线时没有 LLM，按照提示词的要求以金叉（1）作为 BUY、死叉（-1）作为 SELL，
+    下单比例使用 analysis_buy_price / analysis_sell_price 的公式。
+    """
+    actions = np.asarray(signal, dtype=np.int64)
+    buy_fractions = np.clip(ai_buy_percentage(percent_b), 0.0, 1.0)
+    sell_fractions = np.clip(ai_sell_percentage(percent_b), 0.0, 1.0)
+    fractions = np.where(actions == 1, buy_fractions, np.where(actions == -1, sell_fractions, 0.0))
+    return actions, fractions
+
+def opposite_trader_actions(ratio, total_volume, threshold=OPPOSITE_VOLUME_THRESHOLD,
+                            sell_cap=OPPOSITE_SELL_CAP, buy_cap=OPPOSITE_BUY_CAP,
+                            sell_streak_multiplier=OPPOSITE_SELL_STREAK_MULTIPLIER,
+                            buy_streak_multiplier=OPPOSITE_BUY_STREAK_MULTIPLIER):
+    """
+    oppositeTrader 的规则（见 strategyRules.opposite_trader_action）的向量化版本：
+    把买卖比按符号分段，在每次变号时取上一段的长度作为 streak、段内最大成交量判断是否达到阈值。
+    """
+    ratio = np.asarray(ratio, dtype=np.float64)
+    total_volume = np.asarray(total_volume, dtype=np.float64)
+    n = len(ratio)
+    actions = np.zeros(n, dtype=np.int64)
+    fractions = np.zeros(n)
+    if n < 2:
+        return actions, fractions
+
+    positive = ratio > 0
+    changes = np.flatnonzero(positive[1:] != positive[:-1]) + 1
+    run_starts = np.concatenate(([0], changes))
+    run_lengths = np.diff(np.append(run_starts, n))
+    run_max_volume = np.maximum.reduceat(total_volume, run_starts)
+
+    # 第 k 次变号对应的上一段是第 k 段（从 0 开始）
+    previous_runs = np.arange(len(changes))
+    streak = run_lengths[previous_runs]
+    reached = run_max_volume[previous_runs] > threshold
+    was_positive = positive[changes - 1]
+
+    sell = reached & was_positive
+    buy = reached & ~was_positive
+    actions[changes[sell]] = -1
+    actions[changes[buy]] = 1
+    fractions[changes[sell]] = np.minimum(streak[sell] * sell_streak_multiplier, sell_cap) / 100
+    fractions[changes[buy]] = np.minimum(streak[buy] * buy_streak_multiplier, buy_cap) / 100
+    return actions, fractions
+
+def simulate(close, actions, fractions, initial_cash=1000.0, initial_crypto=0.0, fee_rate=0.0):
+    """
+    按动作序列模拟账户。只在有动作的时间点执行 Python 循环，权益曲线用向量化方式前向填充。
+    :param close: 收盘价数组
+    :param actions: 1 买（花费现金的 fraction）/ -1 卖（卖出持仓的 fraction）/ 0 持有
+    :param fractions: 每个时间点的下单比例
+    :param fee_rate: 手续费率
+    :return: 结果 dict，包括 pnl、max_drawdown、trades 和权益曲线
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    cash_path = np.full(n, np.nan)
+    crypto_path = np.full(n, np.nan)
+    cash = initial_cash
+    crypto = initial_crypto
+    trades = 0
+
+    for i in np.flatnonzero((actions != 0) & (fractions > 0)):
+        price = close[i]
+        if actions[i] == 1 and cash > 0:
+            spend = cash * fractions[i]
+            cash -= spend
+            crypto += spend * (1 - fee_rate) / price
+            trades += 1
+        elif actions[i] == -1 and crypto > 0:
+            sell = crypto * fractions[i]
+            crypto -= sell
+            cash += sell * price * (1 - fee_rate)
+            trades += 1
+        else:
+            continue
+        cash_path[i] = cash
+        crypto_path[i] = crypto
+
+    cash_path = pd.Series(cash_path).ffill().fillna(initial_cash).to_numpy()
+    crypto_path = pd.Series(crypto_path).ffill().fillna(initial_crypto).to_numpy()
+    equity = cash_path + crypto_path * close
+
+    initial_equity = initial_cash + initial_crypto * close[0]
+    final_equity = equity[-1]
+    peak = np.maximum.accumulate(equity)
+    drawdown = (peak - equity) / peak
+    return {
+        'final_equity': final_equity,
+        'pnl': final_equity - initial_equity,
+        'pnl_pct': (final_equity / initial_equity - 1) * 100 if initial_equity else 0.0,
+        'max_drawdown': float(np.max(drawdown)) * 100,
+        'trades': trades,
+        'equity': equity
+    }
+
+def _check_window(times, filtered, start_time, end_time, what):
+    """
+    start_time / end_time 之间没有数据时抛出 ValueError，说明请求的范围和已有的范围。
+    :param times: 过滤前的时间列
+    :param filtered: 过滤后的 DataFrame
+    """
+    if len(filtered):
+        return
+    available = f"{times.iloc[0]} - {times.iloc[-1]}" if len(times) else "nothing"
+    raise ValueError(f"No {what} between {start_time} and {end_time}, the history covers {available}.")
+
+# 每隔多少根一分钟蜡烛做一次决策，与实盘循环的 sleep 相同：simpleTrader 300 秒，aiTrader 60 秒。
+# oppositeTrader 在每个 wsMonitor 数据点上决策。
+DECISION_INTERVALS = {'simple': 5, 'ai': 1, 'opposite': 1}
+
+def run_backtest(df, strategy='simple', decision_interval=None, initial_cash=1000.0, initial_crypto=0.0, fee_rate=0.0,
+                 strategy_params=None, indicator_params=None, trade_flow=None, start_time=None, end_time=None):
+    """
+    在整段蜡烛历史上回测 simpleTrader、aiTrader 或 oppositeTrader 的规则。
+    :param df: load_candle_history 返回的 DataFrame
+    :param strategy: 'simple'、'ai' 或 'opposite'
+    :param decision_interval: 每隔多少根蜡烛（opposite 为数据点）做一次决策，默认见 DECISION_INTERVALS
+    :param strategy_params: 传给 simple_trader_actions / opposite_trader_actions 的阈值/比例参数
+    :param indicator_params: 传给 calculate_indicators 的窗口参数
+    :param trade_flow: opposite 策略使用的 load_trade_flow_history 结果
+    :param start_time: 只在该时间之后交易，之前的蜡烛只用于预热指标
+    :param end_time: 回测结束时间
+    """
+    if strategy == 'opposite':
+        return run_opposite_backtest(df, trade_flow, decision_interval, initial_cash, initial_crypto, fee_rate,
+                                     strategy_params, start_time, end_time)
+
+    df = compute_signals(df, **(indicator_params or {}))
+    times = df['start']
+    if start_time is not None:
+        df = df[df['start'] >= start_time]
+    if end_time is not None:
+        df = df[df['start'] <= end_time]
+    _check_window(times, df, start_time, end_time, 'candles')
+    close = df['close'].to_numpy(dtype=np.float64)
+    percent_b = df['PercentB'].to_numpy(dtype=np.float64)
+    signal = df['signal'].to_numpy(dtype=np.int64)
+
+    if strategy == 'simple':
+        actions, fractions = simple_trader_actions(percent_b, **(strategy_params or {}))
+    elif strategy == 'ai':
+        actions, fractions = ai_trader_actions(signal, percent_b)
+    else:
+        raise ValueError(f"Unknown strategy: {strategy}")
+
+    # 只在决策时间点、且指标有效时下单
+    if decision_interval is None:
+        decision_interval = DECISION_INTERVALS[strategy]
+    decision_rows = np.zeros(len(df), dtype=bool)
+    decision_rows[::decision_interval] = True
+    actions = np.where(decision_rows & np.isfinite(percent_b), actions, 0)
+
+    result = simulate(close, actions, fractions, initial_cash, initial_crypto, fee_rate)
+    result['strategy'] = strategy
+    result['start'] = df['start'].iloc[0]
+    result['end'] = df['start'].iloc[-1]
+    return result
+
+def run_opposite_backtest(df, trade_flow, decision_interval=None, initial_cash=1000.0, initial_crypto=0.0, fee_rate=0.0,
+                          strategy_params=None, start_time=None, end_time=None):
+    """
+    在 wsMonitor 的买卖比记录上回测 oppositeTrader，成交价取数据点所在分钟蜡烛的收盘价。
+    """
+    if trade_flow is None:
+        raise ValueError("The opposite strategy needs trade_flow, see load_trade_flow_history.")
+    times = trade_flow['time']
+    if start_time is not None:
+        trade_flow = trade_flow[trade_flow['time'] >= start_time]
+    if end_time is not None:
+        trade_flow = trade_flow[trade_flow['time'] <= end_time]
+
+    # 只保留有对应蜡烛的数据点
+    rows = df['start'].searchsorted(trade_flow['time'], side='right') - 1
+    valid = rows >= 0
+    trade_flow = trade_flow[valid]
+    _check_window(times, trade_flow, start_time, end_time, 'trade flow data points with candles')
+    close = df['close'].to_numpy(dtype=np.float64)[rows[valid]]
+
+    actions, fractions = opposite_trader_actions(
+        trade_flow['ratio'].to_numpy(), trade_flow['total_volume'].to_numpy(), **(strategy_params or {})
+    )
+    if decision_interval is None:
+        decision_interval = DECISION_INTERVALS['opposite']
+    decision_rows = np.zeros(len(actions), dtype=bool)
+    decision_rows[::decision_interval] = True
+    actions = np.where(decision_rows, actions, 0)
+
+    result = simulate(close, actions, fractions, initial_cash, initial_crypto, fee_rate)
+    result['strategy'] = 'opposite'
+    result['start'] = trade_flow['time'].iloc[0]
+    result['end'] = trade_flow['time'].iloc[-1]
+    return result
+
+def main():
+    df = load_candle_history()
+    for strategy in ('simple', 'ai'):
+        started = time.perf_counter()
+        result = run_backtest(df, strategy=strategy)
+        elapsed = time.perf_counter() - started
+        print(
+            f"Strategy: {strategy}, {result['start']} - {result['end']}, "
+            f"PnL: {result['pnl']:.2f} ({result['pnl_pct']:.2f}%), Max Drawdown: {result['max_drawdown']:.2f}%, "
+            f"Trades: {result['trades']}, Elapsed: {elapsed * 1000:.1f}ms"
+        )
+
+if __name__ == "__main__":
+    main()
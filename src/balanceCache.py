@@ -0,0 +1,234 @@
+import json
+import logging
+import socket
+import threading
+import time
+import websocket
+
+logger = logging.getLogger(__name__)
+
+# Advanced Trade 的用户频道（需要 JWT 认证）
+USER_CHANNEL_URL = 'wss://advanced-trade-ws-user.coinbase.com'
+# 定期通过 REST 重新核对余额的间隔（秒）
+RECONCILE_INTERVAL = 5 * 60
+# 断线后重新连接前等待的时间（秒）
+RECONNECT_DELAY = 5
+# 订单到达这些状态后不会再有新的成交
+TERMINAL_STATUSES = {'FILLED', 'CANCELLED', 'EXPIRED', 'FAILED'}
+
+def fetch_accounts():
+    from restClient import client
+    return client.get_accounts(limit=250)
+
+def default_jwt_provider():
+    # 使用与 REST 客户端相同的 API key 生成 websocket JWT（每次连接生成一次，有效期 2 分钟）
+    from coinbase.jwt_generator import build_ws_jwt
+    from restClient import client
+    return build_ws_jwt(client.api_key, client.api_secret)
+
+def parse_accounts(response):
+    """
+    :return: {币种: 可用余额}
+    """
+    balances = {}
+    for account in response['accounts']:
+        balances[account['currency']] = float(account['available_balance']['value'])
+    return balances
+
+def _number(value):
+    return float(value) if value not in (None, '') else 0.0
+
+class BalanceCache:
+    """
+    账户余额缓存：启动时通过 REST 读取一次，之后根据用户频道推送的订单成交增量更新，
+    并定期通过 REST 重新核对。读取余额只是一次字典查找，没有网络延迟。
+    websocket 地址、JWT 和 REST 读取函数都可以替换，方便用本地的模拟服务器测试。
+    """
+    def __init__(self, product_ids, url=USER_CHANNEL_URL, jwt_provider=default_jwt_provider,
+                 fetch_accounts=fetch_accounts, reconcile_interval=RECONCILE_INTERVAL):
+        """
+        :param product_ids: 订阅成交事件的交易对，例如 ["XRP-USD"]
+        :param jwt_provider: 返回 JWT 字符串的函数，返回 None 时订阅消息不带 jwt
+        :param fetch_accounts: 返回 SDK get_accounts 结果的函数
+        """
+        self.product_ids = list(product_ids)
+        self.url = url
+        self.jwt_provider = jwt_provider
+        self.fetch_accounts = fetch_accounts
+        self.reconcile_interval = reconcile_interval
+        self.lock = threading.Lock()
+        self.balances = {}
+        self.orders = {}  # order_id -> (cumulative_quantity, filled_value, total_fees)
+        self.seeded = False
+        self.last_sequence = None
+        self.last_reconcile = None
+        self.fills_applied = 0
+        self.ws = None
+        self._stop = threading.Event()
+        self._threads = []
+        self.started = False
+        self.start_lock = threading.Lock()
+
+    def get(self, currency):
+        return self.balances.get(currency)
+
+    def get_balances(self, crypto, cash):
+        """
+        :return: (crypto 可用余额, cash 可用余额)，没有读取到时为 None
+        """
+        balances = self.balances
+        return balances.get(crypto), balances.get(cash)
+
+    def reconcile(self):
+        """
+        通过 REST 读取全部账户余额并替换缓存，返回与缓存之间的差异。
+        """
+        balances = parse_accounts(self.fetch_accounts())
+        with self.lock:
+            drift = {
+                currency: balance - self.balances.get(currency, 0.0)
+                for currency, balance in balances.items()
+                if self.seeded and abs(balance - self.balances.get(currency, 0.0)) > 1e-9
+            }
+            self.balances = balances
+            self.seeded = True
+            self.last_reconcile = time.monotonic()
+        if drift:
+            logger.warning(f"Balance cache drift corrected: {drift}")
+        return drift
+
+    def handle_message(self, message):
+        """
+        处理一条用户频道消息（原始文本或已解析的 dict）。
+        """
+        data = json.loads(message) if isinstance(message, (str, bytes)) else message
+        if data.get('channel') != 'user':
+            return
+
+        sequence = data.get('sequence_num')
+        if sequence is not None:
+            if self.last_sequence is not None and sequence != self.last_sequence + 1:
+                logger.warning(f"User channel sequence gap: {self.last_sequence} -> {sequence}, reconciling.")
+                self._reconcile_safely()
+            self.last_sequence = sequence
+
+        for event in data.get('events', []):
+            # snapshot 中的成交已经包含在 REST 余额中，只记录基准，不更新余额
+            apply = event.get('type') != 'snapshot'
+            for order in event.get('orders', []):
+                self._apply_order(order, apply)
+
+    def _apply_order(self, order, apply=True):
+        product_id = order.get('product_id', '')
+        if '-' not in product_id:
+            return
+        base, quote = product_id.split('-', 1)
+        order_id = order['order_id']
+        quantity = _number(order.get('cumulative_quantity'))
+        value = _number(order.get('filled_value'))
+        fees = _number(order.get('total_fees'))
+
+        with self.lock:
+            last_quantity, last_value, last_fees = self.orders.get(order_id, (0.0, 0.0, 0.0))
+            delta_quantity = quantity - last_quantity
+            delta_value = value - last_value
+            delta_fees = fees - last_fees
+            if apply and (delta_quantity or delta_value or delta_fees):
+                if order.get('order_side') == 'BUY':
+                    self.balances[base] = self.balances.get(base, 0.0) + delta_quantity
+                    self.balances[quote] = self.balances.get(quote, 0.0) - delta_value - delta_fees
+                else:
+                    self.balances[base] = self.balances.get(base, 0.0) - delta_quantity
+                    self.balances[quote] = self.balances.get(quote, 0.0) + delta_value - delta_fees
+                self.fills_applied += 1
+
+            if order.get('status') in TERMINAL_STATUSES:
+                self.orders.pop(order_id, None)
+            else:
+                self.orders[order_id] = (quantity, value, fees)
+
+    def _reconcile_safely(self):
+        try:
+            self.reconcile()
+        except Exception as e:
+            logger.exception("Failed to reconcile balances.")
+
+    def _subscribe_message(self):
+        message = {
+            "type": "subscribe",
+            "channel": "user",
+            "product_ids": self.product_ids
+        }
+        jwt = self.jwt_provider() if self.jwt_provider else None
+        if jwt:
+            message["jwt"] = jwt
+        return json.dumps(message)
+
+    def _on_open(self, ws):
+        logger.info("User channel connection opened")
+        self.last_sequence = None
+        ws.send(self._subscribe_message())
+
+    def _on_message(self, ws, message):
+        try:
+            self.handle_message(message)
+        except Exception as e:
+            logger.exception("Failed to handle user channel message.")
+
+    def _on_error(self, ws, error):
+        logger.error(f"User channel error: {error}")
+
+    def _run_websocket(self):
+        while not self._stop.is_set():
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error
+            )
+            self.ws.run_forever()
+            if self._stop.is_set():
+                break
+            # 断线期间可能漏掉成交，重新连接后以 REST 为准
+            logger.warning(f"User channel closed, reconnecting in {RECONNECT_DELAY} seconds")
+            self._stop.wait(RECONNECT_DELAY)
+            self._reconcile_safely()
+
+    def _run_reconcile(self):
+        while not self._stop.wait(self.reconcile_interval):
+            self._reconcile_safely()
+
+    def start(self):
+        """
+        通过 REST 读取初始余额，然后在后台线程中连接用户频道并定期核对。
+        可以重复调用（例如从并发的 get_balances 调用）：尚未读取到余额时重新读取，后台线程只启动一次。
+        """
+        with self.start_lock:
+            if not self.seeded:
+                self.reconcile()
+            if not self.started:
+                self._stop.clear()
+                for target in (self._run_websocket, self._run_reconcile):
+                    thread = threading.Thread(target=target, daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+                self.started = True
+        return self
+
+    def stop(self):
+        self._stop.set()
+        ws = self.ws
+        if ws is not None:
+            # 不能直接 ws.close()：关闭套接字后 run_forever 中阻塞的 select 不会被唤醒，线程要等到 join 超时。
+            # 发送 close 帧后关闭套接字的读写方向，由 run_forever 读到连接结束后自行退出
+            ws.keep_running = False
+            sock = ws.sock
+            try:
+                sock.send_close()
+                sock.sock.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                ws.close()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        self.started = False
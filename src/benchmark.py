@@ -0,0 +1,320 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import zlib
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from candleStore import Candle
+from feedRecorder import isolated_ws_monitor
+
+# 离线基准测试：用固定种子生成的蜡烛、成交和盘口数据测量分析与信号热点路径的延迟和吞吐量，
+# 并与保存的基线比较。基线与机器相关，换机器后重新保存。
+
+BASELINE_FILE = 'benchmark_baseline.json'
+# p50 延迟比基线慢超过这一比例视为退化
+REGRESSION_TOLERANCE = 0.25
+# 每个用例至少运行的时间（秒）和次数
+MIN_SECONDS = 0.5
+MIN_ROUNDS = 5
+SEED = 42
+
+PRODUCTS = ('XRP-USD', 'BTC-USD', 'ETH-USD')
+START_PRICES = {'XRP-USD': 2.0, 'BTC-USD': 95000.0, 'ETH-USD': 3500.0}
+# 每种数据的规模：蜡烛根数、成交笔数、oppositeTrader 数据点数量、盘口档数
+SIZES = {
+    'candles': (250, 1000, 5000),
+    'trades': (1000, 10000, 100000),
+    'data_points': (10, 100, 1000),
+    'book_levels': (100, 1000),
+}
+QUICK_SIZES = {kind: sizes[:2] for kind, sizes in SIZES.items()}
+
+# 合成数据的结束时间，固定下来保证每次生成的数据相同
+END_TIME = datetime(2024, 12, 3, 8, 45, tzinfo=timezone.utc)
+
+class SyntheticMarket:
+    """
+    确定性的合成行情：同一 product_id 和 seed 总是生成相同的蜡烛、成交和盘口。
+    """
+    def __init__(self, product_id='XRP-USD', seed=SEED, end_time=END_TIME, volatility=0.001):
+        self.product_id = product_id
+        self.seed = seed + zlib.crc32(product_id.encode('ascii'))
+        self.end_time = int(end_time.timestamp())
+        self.start_price = START_PRICES.get(product_id, 100.0)
+        self.volatility = volatility
+
+    def _rng(self, kind):
+        return np.random.default_rng([self.seed, zlib.crc32(kind.encode('ascii'))])
+
+    def _walk(self, rng, count):
+        return self.start_price * np.exp(np.cumsum(rng.normal(0, self.volatility, count)))
+
+    def candles(self, count, granularity=60):
+        """
+        :return: 与 client.get_candles 相同结构的 dict，蜡烛按时间倒序排列
+        """
+        rng = self._rng(f'candles{count}')
+        closes = self._walk(rng, count)
+        opens = np.concatenate(([self.start_price], closes[:-1]))
+        spread = np.abs(rng.normal(0, self.volatility, count)) * closes
+        highs = np.maximum(opens, closes) + spread
+        lows = np.minimum(opens, closes) - spread
+        volumes = rng.lognormal(10, 1, count)
+        first = self.end_time // granularity * granularity - (count - 1) * granularity
+        candles = [
+            Candle(first + i * granularity, float(lows[i]), float(highs[i]), float(opens[i]), float(closes[i]), float(volumes[i]))
+            for i in range(count)
+        ]
+        return {'candles': candles[::-1]}
+
+    def match_messages(self, count, seconds=15 * 60):
+        """
+        :return: matches 频道的原始 JSON 文本，时间均匀分布在结束时间之前的 seconds 秒内
+        """
+        rng = self._rng(f'matches{count}')
+        prices = self._walk(rng, count)
+        sizes = rng.lognormal(5, 1.5, count)
+        sides = rng.random(count) < 0.5
+        times = np.sort(rng.uniform(self.end_time - seconds, self.end_time, count))
+        messages = []
+        for i in range(count):
+            moment = datetime.fromtimestamp(times[i], timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            messages.append(json.dumps({
+                'type': 'match', 'trade_id': i, 'side': 'buy' if sides[i] else 'sell',
+                'size': f'{sizes[i]:.6f}', 'price': f'{prices[i]:.6f}', 'product_id': self.product_id,
+                'sequence': i, 'time': moment
+            }, separators=(',', ':')))
+        return messages
+
+    def order_book(self, levels, updates=1000, tick=None):
+        """
+        :return: (snapshot, batches)，snapshot 和每一批 update 都是 level2 频道的 updates 列表
+        """
+        rng = self._rng(f'book{levels}')
+        tick = tick or self.start_price * 1e-4
+        mid = self.start_price
+
+        def level(side, distance, quantity):
+            price = mid - distance * tick if side == 'bid' else mid + distance * tick
+            return {'side': side, 'price_level': f'{price:.8f}', 'new_quantity': f'{quantity:.6f}'}
+
+        snapshot = [
+            level(side, distance, quantity)
+            for side in ('bid', 'offer')
+            for distance, quantity in zip(range(1, levels + 1), rng.lognormal(5, 1, levels))
+        ]
+        distances = rng.integers(1, levels + 1, updates)
+        sides = rng.random(updates) < 0.5
+        # 约四分之一的更新删除价位
+        quantities = np.where(rng.random(updates) < 0.25, 0.0, rng.lognormal(5, 1, updates))
+        batch = [level('bid' if sides[i] else 'offer', int(distances[i]), quantities[i]) for i in range(updates)]
+        return snapshot, [batch[i:i + 10] for i in range(0, updates, 10)]
+
+    def data_points(self, count):
+        """
+        :return: oppositeTrader 从 wsMonitor 读取的数据点
+        """
+        rng = self._rng(f'points{count}')
+        ratios = np.cumsum(rng.normal(0, 20, count))
+        volumes = rng.lognormal(13, 1, count)
+        return [{'ratio': float(ratios[i]), 'total_volume': float(volumes[i])} for i in range(count)]
+
+def measure(func, min_seconds=MIN_SECONDS, min_rounds=MIN_ROUNDS):
+    """
+    反复调用 func，至少 min_rounds 次且至少 min_seconds 秒。
+    :return: 每次调用的耗时（秒）
+    """
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < min_rounds or time.perf_counter() - started < min_seconds:
+        t = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t)
+    return samples
+
+def summarize(samples, items):
+    """
+    :param items: 每次调用处理的数据量（蜡烛根数、消息条数等）
+    :return: 延迟百分位（毫秒）和吞吐量（每秒处理的数据量）
+    """
+    samples = np.asarray(samples)
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99]) * 1000
+    return {
+        'rounds': len(samples),
+        'items': items,
+        'p50_ms': p50,
+        'p90_ms': p90,
+        'p99_ms': p99,
+        'max_ms': samples.max() * 1000,
+        'throughput': items / samples.mean(),
+    }
+
+# 每个用例的 setup(market, size, stack) 返回 (func, items)，只测量 func；需要清理的资源注册到 stack（contextlib.ExitStack）
+
+def _process_candle_data(market, size, stack):
+    from technicalAnalysis import process_candle_data
+    candles = market.candles(size)
+    return lambda: process_candle_data(candles), size
+
+def _calculate_indicators(market, size, stack):
+    from technicalAnalysis import process_candle_data, calculate_indicators
+    # calculate_indicators 只覆盖写入指标列，重复使用同一个 DataFrame 不影响结果
+    df = process_candle_data(market.candles(size))
+    return lambda: calculate_indicators(df), size
+
+def _detect_golden_death_cross(market, size, stack):
+    from technicalAnalysis import process_candle_data, calculate_indicators, detect_golden_death_cross
+    df = calculate_indicators(process_candle_data(market.candles(size)))
+    return lambda: detect_golden_death_cross(df), size
+
+def _ws_on_message(market, size, stack):
+    messages = market.match_messages(size)
+    wsMonitor = stack.enter_context(isolated_ws_monitor([market.product_id]))
+
+    def run():
+        for message in messages:
+            wsMonitor.on_message(None, message)
+    return run, size
+
+def _ws_process_trade_data(market, size, stack):
+    # process_trade_data 每个周期的工作：对每个交易对调用一次 process_product，时间轮中有 size 笔成交；
+    # 吞吐量按周期计
+    wsMonitor = stack.enter_context(isolated_ws_monitor([market.product_id]))
+    for message in market.match_messages(size):
+        wsMonitor.on_message(None, message)
+    now = datetime.fromtimestamp(market.end_time, timezone.utc).replace(tzinfo=None)
+    stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+
+    def run():
+        for product_id, wheel in wsMonitor.trade_wheels.items():
+            wsMonitor.process_product(product_id, wheel, now)
+    return run, 1
+
+def _opposite_check_trading_conditions(market, size, stack):
+    from oppositeTrader import check_trading_conditions
+    data_points = market.data_points(size)
+    return lambda: check_trading_conditions(data_points), size
+
+def _order_book_apply(market, size, stack):
+    from orderBook import OrderBook
+    snapshot, batches = market.order_book(size)
+    book = OrderBook(market.product_id)
+    book.apply('snapshot', snapshot)
+
+    def run():
+        for batch in batches:
+            book.apply('update', batch)
+    return run, sum(len(batch) for batch in batches)
+
+# 用例名称 -> (setup, 规模类型)
+BENCHMARKS = {
+    'technicalAnalysis.process_candle_data': (_process_candle_data, 'candles'),
+    'technicalAnalysis.calculate_indicators': (_calculate_indicators, 'candles'),
+    'technicalAnalysis.detect_golden_death_cross': (_detect_golden_death_cross, 'candles'),
+    'wsMonitor.on_message': (_ws_on_message, 'trades'),
+    'wsMonitor.process_trade_data': (_ws_process_trade_data, 'trades'),
+    'oppositeTrader.check_trading_conditions': (_opposite_check_trading_conditions, 'data_points'),
+    'orderBook.OrderBook.apply': (_order_book_apply, 'book_levels'),
+}
+
+def run_benchmarks(names=None, products=PRODUCTS, sizes=SIZES, min_seconds=MIN_SECONDS, min_rounds=MIN_ROUNDS):
+    """
+    :return: {'<用例>[<交易对>/<规模>]': summarize() 的结果}
+    """
+    results = {}
+    # 信号函数里的日志不计入测量
+    logging.disable(logging.INFO)
+    try:
+        for name, (setup, kind) in BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            for product_id in products:
+                market = SyntheticMarket(product_id)
+                for size in sizes[kind]:
+                    with contextlib.ExitStack() as stack:
+                        func, items = setup(market, size, stack)
+                        samples = measure(func, min_seconds, min_rounds)
+                    key = f"{name}[{product_id}/{size}]"
+                    results[key] = summarize(samples, items)
+                    print(_format_result(key, results[key]))
+    finally:
+        logging.disable(logging.NOTSET)
+    return results
+
+def _format_result(key, result):
+    return (
+        f"{key:<60} p50 {result['p50_ms']:>9.3f} ms  p90 {result['p90_ms']:>9.3f} ms  "
+        f"p99 {result['p99_ms']:>9.3f} ms  {result['throughput']:>14,.0f} /s"
+    )
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+def save_baseline(results, file_path=BASELINE_FILE):
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+
+def load_baseline(file_path=BASELINE_FILE):
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    :return: (用例, 基线 p50, 当前 p50, 变化比例) 的列表，只包含超过 tolerance 的退化
+    """
+    regressions = []
+    for key, result in results.items():
+        previous = baseline['results'].get(key)
+        if previous is None or previous['p50_ms'] <= 0:
+            continue
+        change = result['p50_ms'] / previous['p50_ms'] - 1
+        if change > tolerance:
+            regressions.append((key, previous['p50_ms'], result['p50_ms'], change))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the analysis and signal hot paths.")
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument('--products', nargs='+', default=list(PRODUCTS))
+    parser.add_argument('--quick', action='store_true', help="skip the largest data sizes")
+    parser.add_argument('--min-seconds', type=float, default=MIN_SECONDS)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.products, QUICK_SIZES if args.quick else SIZES, args.min_seconds)
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Saved baseline with {len(results)} results to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline}, run with --save-baseline first.")
+        return 0
+    if baseline.get('environment') != environment():
+        print(f"Warning: baseline was recorded on {baseline.get('environment')}, results may not be comparable.")
+    regressions = compare(results, baseline, args.tolerance)
+    for key, previous, current, change in regressions:
+        print(f"REGRESSION {key}: p50 {previous:.3f} ms -> {current:.3f} ms (+{change * 100:.0f}%)")
+    print(f"{len(regressions)} regression(s) over {args.tolerance * 100:.0f}% against {args.baseline}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
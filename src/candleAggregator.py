@@ -0,0 +1,223 @@
+import logging
+import threading
+import time
+import requests
+from candleStore import Candle, MAX_MEMORY_CANDLES
+
+logger = logging.getLogger(__name__)
+
+# 与 wsMonitor 的 matches 频道同源的公共蜡烛接口（不需要 API key），单次最多返回 300 根
+EXCHANGE_CANDLES_URL = 'https://api.exchange.coinbase.com/products/{product_id}/candles'
+MAX_EXCHANGE_CANDLES = 300
+# 一分钟蜡烛，以及由同一成交流同时维护的 5 分钟、15 分钟蜡烛
+BASE_GRANULARITY = 60
+ROLLUP_GRANULARITIES = (5 * 60, 15 * 60)
+# 首次连接时通过 REST 补齐的历史长度（秒），与 get_candles 使用的 250 根一分钟蜡烛相同
+BACKFILL_SECONDS = 250 * 60
+# 重连对账在缺口所在的蜡烛收盘后再等待这段时间（秒），等交易所生成蜡烛
+RECONCILE_DELAY = 5
+
+def fetch_exchange_candles(product_id, start, end, granularity=BASE_GRANULARITY):
+    """
+    分批读取 [start, end) 内的蜡烛。
+    :return: Candle 列表
+    """
+    candles = []
+    step = MAX_EXCHANGE_CANDLES * granularity
+    for chunk_start in range(start, end, step):
+        chunk_end = min(chunk_start + step, end)
+        response = requests.get(
+            EXCHANGE_CANDLES_URL.format(product_id=product_id),
+            params={'granularity': granularity, 'start': chunk_start, 'end': chunk_end - 1},
+            timeout=10
+        )
+        response.raise_for_status()
+        # 每一行为 [time, low, high, open, close, volume]
+        for row in response.json():
+            if start <= row[0] < end:
+                candles.append(Candle(int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5])))
+    return candles
+
+class _Bars:
+    """
+    单一粒度的 K 线。每根记录开盘、收盘成交的时间，迟到的成交也能正确修正开盘价和收盘价。
+    """
+    def __init__(self, granularity, max_candles):
+        self.granularity = granularity
+        self.max_candles = max_candles
+        self.bars = {}  # start -> [low, high, open, close, volume, open_time, close_time]
+        self.head = None
+
+    def add(self, timestamp, price, size):
+        start = int(timestamp) // self.granularity * self.granularity
+        bar = self.bars.get(start)
+        if bar is None:
+            if self.head is not None and start <= self.head - self.max_candles * self.granularity:
+                return False
+            self.bars[start] = [price, price, price, price, size, timestamp, timestamp]
+            if self.head is None or start > self.head:
+                self.head = start
+                self._trim()
+            return True
+        if price < bar[0]:
+            bar[0] = price
+        if price > bar[1]:
+            bar[1] = price
+        if timestamp < bar[5]:
+            bar[2] = price
+            bar[5] = timestamp
+        if timestamp >= bar[6]:
+            bar[3] = price
+            bar[6] = timestamp
+        bar[4] += size
+        return True
+
+    def set(self, candle):
+        # 使用 REST 蜡烛替换本地蜡烛，开盘/收盘时间取蜡烛的边界
+        self.bars[candle.start] = [
+            candle.low, candle.high, candle.open, candle.close, candle.volume,
+            candle.start, candle.start + self.granularity - 1e-6
+        ]
+        if self.head is None or candle.start > self.head:
+            self.head = candle.start
+            self._trim()
+
+    def _trim(self):
+        horizon = self.head - self.max_candles * self.granularity
+        if len(self.bars) > self.max_candles:
+            for start in [start for start in self.bars if start <= horizon]:
+                del self.bars[start]
+
+    def candles(self, count):
+        """
+        :return: 最近 count 根（包括正在形成的）Candle，按时间倒序排列
+        """
+        starts = sorted(self.bars, reverse=True)[:count]
+        return [Candle(start, *self.bars[start][:5]) for start in starts]
+
+class CandleAggregator:
+    """
+    由 matches 成交流在本地生成 OHLCV 蜡烛（一分钟，以及 5 分钟、15 分钟），不需要 REST 拉取。
+    迟到的成交直接修正所在的蜡烛；只在（重新）连接后，用 REST 蜡烛替换断线期间的蜡烛。
+    """
+    def __init__(self, product_id, rollups=ROLLUP_GRANULARITIES, max_candles=MAX_MEMORY_CANDLES,
+                 fetch_candles=fetch_exchange_candles, backfill_seconds=BACKFILL_SECONDS):
+        """
+        :param fetch_candles: fetch_candles(product_id, start, end) 返回一分钟 Candle 列表
+        """
+        self.product_id = product_id
+        self.granularities = (BASE_GRANULARITY,) + tuple(rollups)
+        self.series = {granularity: _Bars(granularity, max_candles) for granularity in self.granularities}
+        self.fetch_candles = fetch_candles
+        self.backfill_seconds = backfill_seconds
+        self.lock = threading.Lock()
+        self.last_trade_time = None
+        self.pending_reconcile = None  # 需要对账的 [start, end)
+        self.trades = 0
+        self.late_trades = 0
+        self.dropped = 0
+
+    def add(self, timestamp, price, size):
+        """
+        记录一笔成交（UNIX 秒）。
+        """
+        with self.lock:
+            self.trades += 1
+            base = self.series[BASE_GRANULARITY]
+            if base.head is not None and timestamp < base.head:
+                # 属于已经收盘的蜡烛
+                self.late_trades += 1
+            for bars in self.series.values():
+                if not bars.add(timestamp, price, size):
+                    self.dropped += 1
+                    return
+            if self.last_trade_time is None or timestamp > self.last_trade_time:
+                self.last_trade_time = timestamp
+
+    def mark_connected(self, now=None):
+        """
+        websocket 连接（或重新连接）后调用：断线期间的成交无法恢复，
+        等缺口所在的蜡烛收盘后用 REST 蜡烛替换 [上一笔成交, 连接时刻] 之间的蜡烛。
+        首次连接时补齐 backfill_seconds 的历史。
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            gap_start = self.last_trade_time if self.last_trade_time is not None else now - self.backfill_seconds
+            start = int(gap_start) // BASE_GRANULARITY * BASE_GRANULARITY
+            end = int(now) // BASE_GRANULARITY * BASE_GRANULARITY + BASE_GRANULARITY
+            if self.pending_reconcile is not None:
+                start = min(start, self.pending_reconcile[0])
+            self.pending_reconcile = (start, end)
+
+    def reconcile_due(self, now=None):
+        now = time.time() if now is None else now
+        pending = self.pending_reconcile
+        return pending is not None and now >= pending[1] + RECONCILE_DELAY
+
+    def reconcile(self, now=None):
+        """
+        在 reconcile_due() 为真时调用，用 REST 蜡烛替换缺口范围内的蜡烛并重建对应的 5 分钟 / 15 分钟蜡烛。
+        :return: 替换的一分钟蜡烛数量
+        """
+        if not self.reconcile_due(now):
+            return 0
+        start, end = self.pending_reconcile
+        candles = self.fetch_candles(self.product_id, start, end)
+        with self.lock:
+            base = self.series[BASE_GRANULARITY]
+            for candle in candles:
+                base.set(candle)
+            for granularity in self.granularities[1:]:
+                self._rebuild(granularity, start, end)
+            if self.pending_reconcile == (start, end):
+                self.pending_reconcile = None
+        logger.info(f"Reconciled {len(candles)} {self.product_id} candles in [{start}, {end}) against REST.")
+        return len(candles)
+
+    def _rebuild(self, granularity, start, end):
+        # 由一分钟蜡烛重新汇总受影响的较大粒度蜡烛
+        base = self.series[BASE_GRANULARITY].bars
+        bars = self.series[granularity]
+        for bucket in range(start // granularity * granularity, end, granularity):
+            minutes = [base[minute] for minute in range(bucket, bucket + granularity, BASE_GRANULARITY) if minute in base]
+            if not minutes:
+                continue
+            first = min(minutes, key=lambda bar: bar[5])
+            last = max(minutes, key=lambda bar: bar[6])
+            bars.bars[bucket] = [
+                min(bar[0] for bar in minutes),
+                max(bar[1] for bar in minutes),
+                first[2],
+                last[3],
+                sum(bar[4] for bar in minutes),
+                first[5],
+                last[6]
+            ]
+            if bars.head is None or bucket > bars.head:
+                bars.head = bucket
+
+    def closed_candles(self, start=None, now=None):
+        """
+        已收盘且不会再被对账替换的一分钟蜡烛，用于写入 candleStore 缓存。
+        收盘后再等 RECONCILE_DELAY 秒接收迟到的成交；待对账的缺口及之后的蜡烛不返回。
+        :param start: UNIX 时间戳（秒），默认为最早的蜡烛
+        :return: ([start, end) 内的 Candle 列表（按时间正序）, start, end)
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            end = int(now - RECONCILE_DELAY) // BASE_GRANULARITY * BASE_GRANULARITY
+            if self.pending_reconcile is not None:
+                end = min(end, self.pending_reconcile[0])
+            bars = self.series[BASE_GRANULARITY].bars
+            if start is None:
+                start = min(bars) if bars else end
+            end = max(start, end)
+            candles = [Candle(bucket, *bars[bucket][:5]) for bucket in sorted(bars) if start <= bucket < end]
+        return candles, start, end
+
+    def get_candles(self, count=250, granularity=BASE_GRANULARITY):
+        """
+        :return: 与 client.get_candles 相同结构的 dict，可以直接交给 technicalAnalysis.process_candle_data
+        """
+        with self.lock:
+            return {'candles': self.series[granularity].candles(count)}
@@ -0,0 +1,285 @@
+import csv
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# 本地蜡烛缓存目录，每个交易对/粒度一个 CSV 文件
+CACHE_DIR = 'candle_cache'
+
+# Coinbase 单次 get_candles 最多返回 350 根蜡烛
+MAX_CANDLES_PER_REQUEST = 350
+
+# 内存中最多保留的蜡烛数量（一分钟粒度约 7 天）
+MAX_MEMORY_CANDLES = 7 * 24 * 60
+
+GRANULARITY_SECONDS = {
+    "ONE_MINUTE": 60,
+    "FIVE_MINUTE": 5 * 60,
+    "FIFTEEN_MINUTE": 15 * 60,
+    "THIRTY_MINUTE": 30 * 60,
+    "ONE_HOUR": 60 * 60,
+    "TWO_HOUR": 2 * 60 * 60,
+    "SIX_HOUR": 6 * 60 * 60,
+    "ONE_DAY": 24 * 60 * 60,
+}
+
+CANDLE_FIELDS = ['start', 'low', 'high', 'open', 'close', 'volume']
+
+# 与 SDK 返回的 Candle 字段相同，可以直接交给 process_candle_data
+Candle = namedtuple('Candle', CANDLE_FIELDS)
+
+def to_candle(candle):
+    """
+    将 SDK 返回的 Candle（字段均为字符串）转换为本地的 Candle。
+    """
+    return Candle(
+        int(candle.start),
+        float(candle.low),
+        float(candle.high),
+        float(candle.open),
+        float(candle.close),
+        float(candle.volume)
+    )
+
+def merge_ranges(ranges):
+    """
+    合并重叠或相邻的 [start, end) 区间。
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def subtract_ranges(start, end, covered):
+    """
+    :return: [start, end) 中未被 covered 覆盖的区间列表
+    """
+    missing = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            missing.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+class CandleStore:
+    """
+    单个交易对、单个粒度的蜡烛缓存。
+    已收盘的蜡烛保存在内存和磁盘上，只通过 REST 拉取缺失的尾部或空洞；
+    尚未收盘的最后一根蜡烛每次都会重新拉取。
+    多个进程可以共享同一缓存目录：每次读取前先载入其他进程追加的蜡烛和覆盖区间。
+    """
+    def __init__(self, product_id, granularity="ONE_MINUTE", cache_dir=CACHE_DIR, max_memory_candles=MAX_MEMORY_CANDLES):
+        self.product_id = product_id
+        self.granularity = granularity
+        self.granularity_seconds = GRANULARITY_SECONDS[granularity]
+        self.cache_dir = cache_dir
+        self.max_memory_candles = max_memory_candles
+
+        self.candles = {}  # start -> Candle
+        self.covered = []  # 已经从 REST 拉取过或由本地写入的 [start, end) 区间（只包含已收盘的部分）
+        self.horizon = None  # 内存淘汰的边界，之前的区间不再视为已覆盖
+        self.lock = threading.Lock()
+
+        # 其他进程（例如 wsMonitor）也会向同一缓存追加蜡烛，记录已经读到的位置
+        self.file_offset = 0
+        self.coverage_mtime = None
+
+        base_name = f"{product_id}_{granularity}"
+        self.candle_file = os.path.join(cache_dir, f"{base_name}.csv") if cache_dir else None
+        self.coverage_file = os.path.join(cache_dir, f"{base_name}.json") if cache_dir else None
+
+        self._load()
+
+    def _bucket(self, timestamp):
+        return int(timestamp) - int(timestamp) % self.granularity_seconds
+
+    def _load(self):
+        if not self.candle_file or not os.path.exists(self.candle_file):
+            return
+        try:
+            self._sync()
+            logger.info(f"Loaded {len(self.candles)} cached {self.granularity} candles for {self.product_id}.")
+        except Exception as e:
+            logger.exception(f"Failed to load candle cache {self.candle_file}, starting empty.")
+            self.candles = {}
+            self.covered = []
+            self.file_offset = 0
+            self.coverage_mtime = None
+
+    def _sync(self):
+        """
+        读取上次之后追加到 CSV 的蜡烛（包括其他进程写入的），并合并覆盖区间文件。
+        先读覆盖区间再读 CSV：写入方先追加 CSV 再更新覆盖区间，所以读到的区间一定有对应的蜡烛。
+        """
+        if not self.candle_file or not os.path.exists(self.candle_file):
+            return
+        if os.path.exists(self.coverage_file):
+            mtime = os.stat(self.coverage_file).st_mtime_ns
+            if mtime != self.coverage_mtime:
+                with open(self.coverage_file, 'r', encoding='utf-8') as f:
+                    ranges = json.load(f)
+                if self.horizon is not None:
+                    ranges = [[max(start, self.horizon), end] for start, end in ranges if end > self.horizon]
+                self.covered = merge_ranges(self.covered + ranges)
+                self.coverage_mtime = mtime
+
+        with open(self.candle_file, 'rb') as f:
+            f.seek(self.file_offset)
+            data = f.read()
+        # 只处理完整的行，写了一半的行留到下次
+        data = data[:data.rfind(b'\n') + 1]
+        self.file_offset += len(data)
+        for row in csv.reader(data.decode('utf-8').splitlines()):
+            if not row or row[0] == 'start':
+                continue
+            try:
+                candle = Candle(int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5]))
+            except (ValueError, IndexError):
+                logger.warning(f"Skipping malformed row in {self.candle_file}: {row}")
+                continue
+            self.candles[candle.start] = candle
+        self._trim()
+
+    def _save(self, candles):
+        """
+        以追加方式把新收盘的蜡烛写入 CSV，并原子地更新覆盖区间文件。
+        读取时同一 start 以后写入的为准。
+        """
+        if not self.candle_file:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            new_file = not os.path.exists(self.candle_file)
+            if candles or new_file:
+                with open(self.candle_file, 'a', encoding='utf-8', newline='') as f:
+                    writer = csv.writer(f)
+                    if new_file:
+                        writer.writerow(CANDLE_FIELDS)
+                    writer.writerows(candles)
+
+            tmp_file = self.coverage_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.covered, f)
+            os.replace(tmp_file, self.coverage_file)
+        except Exception as e:
+            logger.exception(f"Failed to write candle cache {self.candle_file}.")
+
+    def _trim(self):
+        if len(self.candles) <= self.max_memory_candles:
+            return
+        keep = sorted(self.candles)[-self.max_memory_candles:]
+        horizon = keep[0]
+        self.horizon = horizon
+        self.candles = {start: self.candles[start] for start in keep}
+        # 被淘汰的时间段不再视为已覆盖，之后需要时重新拉取
+        self.covered = [[max(start, horizon), end] for start, end in self.covered if end > horizon]
+
+    def _fetch(self, client, start, end):
+        """
+        分批从 REST 拉取 [start, end) 区间的蜡烛。
+        """
+        step = MAX_CANDLES_PER_REQUEST * self.granularity_seconds
+        fetched = []
+        for chunk_start in range(start, end, step):
+            chunk_end = min(chunk_start + step, end)
+            response = client.get_candles(
+                product_id=self.product_id,
+                start=str(chunk_start),
+                end=str(chunk_end - 1),
+                granularity=self.granularity
+            )
+            for candle in response['candles'] or []:
+                candle = to_candle(candle)
+                self.candles[candle.start] = candle
+                fetched.append(candle)
+        return fetched
+
+    def refresh(self, client, start_time, end_time, now=None):
+        """
+        确保 [start_time, end_time] 内的蜡烛都在缓存中，只拉取缺失部分。
+        :param client: RESTClient
+        :param start_time: UNIX 时间戳（秒）
+        :param end_time: UNIX 时间戳（秒）
+        :param now: 当前交易所时间，用于判断哪些蜡烛已经收盘，默认为 end_time
+        :return: 本次通过 REST 拉取到的蜡烛数量
+        """
+        start = self._bucket(start_time)
+        end = self._bucket(end_time) + self.granularity_seconds
+        with self.lock:
+            self._sync()
+            missing = subtract_ranges(start, end, self.covered)
+            if not missing:
+                return 0
+
+            fetched = []
+            for missing_start, missing_end in missing:
+                fetched += self._fetch(client, missing_start, missing_end)
+
+            # 只有已收盘的蜡烛才算作已覆盖，正在形成的蜡烛下次还要重新拉取
+            closed_until = self._bucket(end_time if now is None else now)
+            self.covered = merge_ranges(
+                self.covered + [[s, min(e, closed_until)] for s, e in missing if s < closed_until]
+            )
+            self._save(sorted(candle for candle in fetched if candle.start < closed_until))
+            self._trim()
+            logger.debug(f"Fetched {len(fetched)} {self.granularity} candles for {self.product_id} in {len(missing)} range(s).")
+            return len(fetched)
+
+    def add_closed(self, candles, start, end):
+        """
+        写入本地生成的已收盘蜡烛（例如 wsMonitor 由成交流汇总的蜡烛），
+        并把 [start, end) 标记为已覆盖，之后读取这段时间不再通过 REST 拉取。
+        :param candles: Candle 列表，start 在 [start, end) 内
+        :param start: UNIX 时间戳（秒），粒度的整数倍
+        :param end: UNIX 时间戳（秒），粒度的整数倍，之前的蜡烛都已收盘
+        """
+        with self.lock:
+            self._sync()
+            for candle in candles:
+                self.candles[candle.start] = candle
+            self.covered = merge_ranges(self.covered + [[start, end]])
+            self._save(sorted(candles))
+            self._trim()
+
+    def get_window(self, start_time, end_time):
+        """
+        :return: 与 client.get_candles 相同结构的 dict，蜡烛按时间倒序排列
+        """
+        start = self._bucket(start_time)
+        end = self._bucket(end_time)
+        with self.lock:
+            candles = [
+                self.candles[bucket]
+                for bucket in range(end, start - 1, -self.granularity_seconds)
+                if bucket in self.candles
+            ]
+        return {'candles': candles}
+
+    def get_candles(self, client, start_time, end_time, now=None):
+        self.refresh(client, start_time, end_time, now)
+        return self.get_window(start_time, end_time)
+
+# 每个交易对/粒度共享一个缓存
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_candle_store(product_id, granularity="ONE_MINUTE"):
+    with _stores_lock:
+        key = (product_id, granularity)
+        if key not in _stores:
+            _stores[key] = CandleStore(product_id, granularity)
+        return _stores[key]
@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 本地晶振的最大频率误差，与 NTP 相同取 500 ppm
+MAX_DRIFT = 500e-6
+
+class ClockSync:
+    """
+    类 NTP 的交易所时钟同步：偶尔采样一次服务器时间，估计偏移量（offset）和漂移率（drift），
+    之后只用本地单调时钟推算交易所当前时间，不再发起网络请求。
+    """
+    def __init__(self, fetch_server_time, resync_interval=300, max_samples=8):
+        """
+        :param fetch_server_time: 无参函数，返回 (服务器 UNIX 时间（秒，浮点）, 时间分辨率（秒）)
+        :param resync_interval: 两次采样之间的最长间隔（秒）
+        :param max_samples: 用于估计偏移和漂移的最近采样数量
+        """
+        self.fetch_server_time = fetch_server_time
+        self.resync_interval = resync_interval
+        self.samples = deque(maxlen=max_samples)  # (本地单调时间, 偏移, 往返延迟, 分辨率)
+        self.lock = threading.Lock()
+
+        self._ref_time = None
+        self._ref_offset = None
+        self._ref_delay = 0.0
+        self._resolution = 0.0
+        self._drift = 0.0
+        self._drift_error = MAX_DRIFT
+        self._last_sample = None
+
+    def sample(self):
+        """
+        采样一次服务器时间。与 NTP 一样，假设请求和响应的路径对称，
+        服务器时间对应于本地发送和接收时刻的中点。
+        """
+        t0 = time.monotonic()
+        server_time, resolution = self.fetch_server_time()
+        t1 = time.monotonic()
+
+        midpoint = (t0 + t1) / 2
+        delay = t1 - t0
+        with self.lock:
+            self.samples.append((midpoint, server_time - midpoint, delay, resolution))
+            self._last_sample = t1
+            self._fit()
+        logger.debug(f"Clock sample: offset {server_time - midpoint:.6f}s, delay {delay * 1000:.1f}ms")
+
+    def _fit(self):
+        # 时钟过滤：往返延迟最小的样本最可信，作为参考点
+        ref_time, ref_offset, ref_delay, resolution = min(self.samples, key=lambda s: s[2])
+        self._ref_time = ref_time
+        self._ref_offset = ref_offset
+        self._ref_delay = ref_delay
+        self._resolution = resolution
+
+        # 用最小二乘拟合偏移随时间的变化作为漂移率
+        n = len(self.samples)
+        span = self.samples[-1][0] - self.samples[0][0]
+        if n < 3 or span < self.resolution_span():
+            self._drift = 0.0
+            self._drift_error = MAX_DRIFT
+            return
+
+        mean_t = sum(s[0] for s in self.samples) / n
+        mean_o = sum(s[1] for s in self.samples) / n
+        sxx = sum((s[0] - mean_t) ** 2 for s in self.samples)
+        sxy = sum((s[0] - mean_t) * (s[1] - mean_o) for s in self.samples)
+        drift = sxy / sxx
+        residual = sum((s[1] - mean_o - drift * (s[0] - mean_t)) ** 2 for s in self.samples)
+        drift_error = (residual / (n - 2) / sxx) ** 0.5
+
+        self._drift = max(-MAX_DRIFT, min(MAX_DRIFT, drift))
+        self._drift_error = min(MAX_DRIFT, drift_error)
+
+    def resolution_span(self):
+        # 采样跨度至少要比服务器时间分辨率大 1000 倍，漂移估计才有意义
+        return max(self._resolution, 0.001) * 1000
+
+    def _needs_sync(self):
+        return self._last_sample is None or time.monotonic() - self._last_sample >= self.resync_interval
+
+    def now(self):
+        """
+        :return: 交易所当前 UNIX 时间（秒，浮点）
+        """
+        if self._needs_sync():
+            try:
+                self.sample()
+            except Exception as e:
+                if self._ref_offset is None:
+                    logger.exception("Failed to sync exchange clock, falling back to local time.")
+                    return time.time()
+                logger.warning(f"Failed to resync exchange clock, using previous estimate: {e}")
+                with self.lock:
+                    self._last_sample = time.monotonic()
+
+        with self.lock:
+            now = time.monotonic()
+            return now + self._ref_offset + self._drift * (now - self._ref_time)
+
+    def uncertainty(self):
+        """
+        :return: 当前偏移估计的误差上界（秒）：参考样本的半个往返延迟、服务器时间分辨率，
+                 以及自参考样本以来漂移误差的累积
+        """
+        with self.lock:
+            if self._ref_offset is None:
+                return float('inf')
+            age = time.monotonic() - self._ref_time
+            return self._ref_delay / 2 + self._resolution + self._drift_error * age
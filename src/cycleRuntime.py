@@ -0,0 +1,98 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 单个调用默认的超时时间（秒）
+DEFAULT_TIMEOUT = 10
+# 同时执行的阻塞调用数量上限（超时的调用仍会占用线程直到 REST 请求返回）
+MAX_WORKERS = 8
+
+Call = namedtuple('Call', ['func', 'args', 'kwargs', 'timeout', 'default'])
+
+def call(func, *args, timeout=None, default=None, **kwargs):
+    """
+    描述一次阻塞调用。
+    :param timeout: 超时时间（秒），None 时使用 CycleRuntime 的默认值
+    :param default: 超时或出错时返回的值
+    """
+    return Call(func, args, kwargs, timeout, default)
+
+def exclusive(func, default=None):
+    """
+    包装 func：上一次调用仍在执行时（例如超时后仍占用线程的调用）直接返回 default，不与之并发执行。
+    用于修改共享状态的调用，例如使用 IndicatorEngine 的 analysis。
+    """
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not lock.acquire(blocking=False):
+            logger.warning(f"{func.__name__} is still running from a previous cycle, skipping.")
+            return default
+        try:
+            return func(*args, **kwargs)
+        finally:
+            lock.release()
+    return wrapper
+
+class CycleRuntime:
+    """
+    交易循环的 asyncio 运行时：把每个周期里互不依赖的 REST / 文件读取等阻塞调用放到线程池中并发执行，
+    每个调用有各自的超时，周期耗时约等于最慢的那个调用，而不是所有调用耗时之和。
+    aiTrader、simpleTrader、oppositeTrader 共用这个运行时，交易逻辑本身仍然是同步的。
+    """
+    def __init__(self, default_timeout=DEFAULT_TIMEOUT, max_workers=MAX_WORKERS):
+        self.default_timeout = default_timeout
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cycle'))
+        self.last_timings = {}
+
+    async def _run(self, name, item):
+        timeout = self.default_timeout if item.timeout is None else item.timeout
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(item.func, *item.args, **item.kwargs), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"{name} timed out after {timeout}s.")
+            return item.default
+        except Exception as e:
+            logger.exception(f"{name} failed.")
+            return item.default
+        finally:
+            self.last_timings[name] = time.perf_counter() - started
+
+    async def _gather(self, calls):
+        names = list(calls)
+        results = await asyncio.gather(*(self._run(name, calls[name]) for name in names))
+        return dict(zip(names, results))
+
+    def fetch_all(self, calls):
+        """
+        并发执行多个调用并等待全部完成。
+        :param calls: {名称: call(...)}
+        :return: {名称: 结果}，超时或出错的调用返回其 default
+        """
+        self.last_timings = {}
+        started = time.perf_counter()
+        results = self.loop.run_until_complete(self._gather(calls))
+        elapsed = time.perf_counter() - started
+        timings = ", ".join(f"{name}: {seconds:.3f}s" for name, seconds in self.last_timings.items())
+        logger.debug(f"Fetched {len(calls)} calls in {elapsed:.3f}s ({timings})")
+        return results
+
+    def fetch(self, func, *args, timeout=None, default=None, **kwargs):
+        """
+        带超时执行单个调用（例如 LLM 请求）。
+        """
+        name = getattr(func, '__name__', 'call')
+        return self.fetch_all({name: call(func, *args, timeout=timeout, default=default, **kwargs)})[name]
+
+    def close(self):
+        self.loop.run_until_complete(self.loop.shutdown_default_executor())
+        self.loop.close()
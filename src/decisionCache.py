@@ -0,0 +1,123 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 特征量化的桶宽
+RSI_BUCKET = 5
+PERCENT_B_BUCKET = 0.1
+SPREAD_BUCKET_BPS = 1
+IMBALANCE_BUCKET = 0.1
+
+# 缓存条目数上限和有效期（秒）
+MAX_ENTRIES = 1024
+DECISION_TTL = 15 * 60
+
+def _bucket(value, width):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return int(math.floor(value / width))
+
+def quantize_features(signal, rsi, percent_b, best_bid=None, best_ask=None, bid_depth=None, ask_depth=None):
+    """
+    把当前市场状态量化为缓存键：(signal, RSI 桶, %B 桶, 价差桶, 盘口不平衡桶)。
+    价差以基点计，盘口不平衡为 (买盘量 - 卖盘量) / (买盘量 + 卖盘量)。
+    """
+    spread = None
+    if best_bid and best_ask:
+        spread = (best_ask - best_bid) / ((best_ask + best_bid) / 2) * 10000
+    imbalance = None
+    if bid_depth is not None and ask_depth is not None and bid_depth + ask_depth > 0:
+        imbalance = (bid_depth - ask_depth) / (bid_depth + ask_depth)
+    return (
+        int(signal),
+        _bucket(rsi, RSI_BUCKET),
+        _bucket(percent_b, PERCENT_B_BUCKET),
+        _bucket(spread, SPREAD_BUCKET_BPS),
+        _bucket(imbalance, IMBALANCE_BUCKET),
+    )
+
+class DecisionCache:
+    """
+    LLM 决策缓存：Ollama 使用 temperature 0.0，相同的市场状态得到相同的回答，
+    量化后的状态命中缓存时直接返回之前的决策，不再调用模型。
+    按最近使用顺序淘汰（LRU），超过 ttl 秒的条目视为过期；可选持久化到 JSON 文件。
+    """
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=DECISION_TTL, persist_file=None, clock=time.time):
+        """
+        :param persist_file: 持久化文件路径，None 时只保存在内存中
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist_file = persist_file
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (decision, stored_at)
+        self.hits = 0
+        self.misses = 0
+        if persist_file:
+            self.load()
+
+    def get(self, key):
+        """
+        :return: 缓存的决策，没有命中时返回 None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.clock() - entry[1] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, decision):
+        with self.lock:
+            self.entries[key] = (decision, self.clock())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        if self.persist_file:
+            self.save()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate(), 'entries': len(self.entries)}
+
+    def save(self):
+        try:
+            with self.lock:
+                rows = [[list(key), decision, stored_at] for key, (decision, stored_at) in self.entries.items()]
+            tmp_file = self.persist_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(rows, f)
+            os.replace(tmp_file, self.persist_file)
+        except Exception as e:
+            logger.exception(f"Failed to write decision cache {self.persist_file}.")
+
+    def load(self):
+        if not os.path.exists(self.persist_file):
+            return
+        try:
+            with open(self.persist_file, 'r', encoding='utf-8') as f:
+                rows = json.load(f)
+            now = self.clock()
+            with self.lock:
+                for key, decision, stored_at in rows:
+                    if now - stored_at <= self.ttl:
+                        self.entries[tuple(key)] = (decision, stored_at)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        except Exception as e:
+            logger.exception(f"Failed to read decision cache {self.persist_file}.")
@@ -1,13 +1,34 @@
 import os
+import queue
+import threading
+import time
 import requests
 
 # 定义 Webhook URL 文件路径
 WEBHOOK_FILE_PATH = r'J:\Trading\webhooks\Discord\trading-info\Trade_Alert_Bot.txt'
 
+# 等待发送的消息数量上限，队列满时丢弃新消息，不阻塞调用方
+MAX_QUEUE_SIZE = 100
+# 在这段时间（秒）内到达的消息合并为一条发送
+COALESCE_SECONDS = 2.0
+# Discord 单条消息的最大长度
+MAX_MESSAGE_LENGTH = 2000
+# 单次请求的超时时间（秒）
+REQUEST_TIMEOUT = 10
+# 发送失败（429 / 5xx / 网络错误）时的最大重试次数
+MAX_RETRIES = 5
+
+# 读取一次后缓存
+_webhook_url = None
+
 def get_webhook_url():
     """
     从文件中读取 Discord Webhook URL
     """
+    global _webhook_url
+    if _webhook_url is not None:
+        return _webhook_url
+
     # 检查文件是否存在
     if not os.path.exists(WEBHOOK_FILE_PATH):
         raise FileNotFoundError(f"Webhook URL 文件未找到：{WEBHOOK_FILE_PATH}")
@@ -19,25 +40,206 @@ def get_webhook_url():
     if not webhook_url:
         raise ValueError("Webhook URL 为空，请检查文件内容。")
 
+    _webhook_url = webhook_url
     return webhook_url
 
-def send_discord_notification(message):
+def coalesce(messages, max_length=MAX_MESSAGE_LENGTH):
+    """
+    把多条消息合并成尽量少的、每条不超过 max_length 的消息。
+    """
+    return [batch for batch, _ in coalesce_batches(messages, max_length)]
+
+def coalesce_batches(messages, max_length=MAX_MESSAGE_LENGTH):
     """
-    使用 Discord Webhook 发送通知
-    """
-    webhook_url = get_webhook_url()
-    data = {
-        "content": message  # 消息内容
-    }
-    try:
-        response = requests.post(webhook_url, json=data)
-        if response.status_code == 204:
-            print("已发送通知到 Discord。")
-        else:
+    与 coalesce 相同，同时返回每条合并后的消息包含哪些原始消息（下标）。
+    超长的消息被拆分到多条合并后的消息中。
+    :return: [(合并后的消息, {原始消息下标})]
+    """
+    batches = []
+    current = ""
+    members = set()
+    for index, message in enumerate(messages):
+        message = message.strip()
+        while len(message) > max_length:
+            if current:
+                batches.append((current, members))
+                current = ""
+                members = set()
+            batches.append((message[:max_length], {index}))
+            message = message[max_length:]
+        if not message:
+            continue
+        if current and len(current) + 1 + len(message) > max_length:
+            batches.append((current, members))
+            current = ""
+            members = set()
+        current = f"{current}\n{message}" if current else message
+        members.add(index)
+    if current:
+        batches.append((current, members))
+    return batches
+
+class DiscordNotifier:
+    """
+    后台发送 Discord 通知：调用方只把消息放入有界队列（不阻塞），
+    后台线程把短时间内的多条消息合并，通过复用连接的 Session 发送，遇到 429 时按 retry_after 等待后重试。
+    """
+    def __init__(self, url_provider=get_webhook_url, max_queue_size=MAX_QUEUE_SIZE, coalesce_seconds=COALESCE_SECONDS,
+                 session=None, max_retries=MAX_RETRIES):
+        """
+        :param url_provider: 返回 Webhook URL 的函数
+        """
+        self.url_provider = url_provider
+        self.coalesce_seconds = coalesce_seconds
+        self.max_retries = max_retries
+        self.session = session or requests.Session()
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.lock = threading.Lock()
+        self.thread = None
+        # 统计（调用方线程和后台线程都会更新，读写都在 metrics_lock 中进行）
+        self.metrics_lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self.sent = 0  # 发送成功的合并后消息数
+        self.coalesced = 0
+        self.failed = 0  # 发送失败的原始消息数
+        self.rate_limited = 0
+
+    def notify(self, message):
+        """
+        :return: False 表示队列已满，消息被丢弃
+        """
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('enqueued')
+        return True
+
+    def _count(self, name, amount=1):
+        with self.metrics_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def metrics(self):
+        with self.metrics_lock:
+            return {
+                'backlog': self.queue.qsize(),
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'sent': self.sent,
+                'coalesced': self.coalesced,
+                'failed': self.failed,
+                'rate_limited': self.rate_limited,
+            }
+
+    def flush(self, timeout=None):
+        """
+        等待队列中的消息全部发送（或放弃），用于退出前。
+        :return: 是否在 timeout 内完成
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _ensure_started(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            messages = [self.queue.get()]
+            try:
+                # 等待合并窗口结束，收集这段时间内到达的消息
+                deadline = time.monotonic() + self.coalesce_seconds
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        messages.append(self.queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                self._send(messages)
+            finally:
+                for _ in messages:
+                    self.queue.task_done()
+
+    def _send(self, messages):
+        """
+        逐条发送合并后的消息，某一条失败不影响其余的消息。
+        失败按原始消息计数：一条合并后的消息失败时，其中包含的每条原始消息都记为失败。
+        """
+        try:
+            batches = coalesce_batches(messages)
+        except Exception as e:
+            print(f"发送通知失败：{e}")
+            self._count('failed', len(messages))
+            return
+        self._count('coalesced', len(messages) - len(batches))
+        failed = set()
+        for batch, members in batches:
+            try:
+                if self._post(batch):
+                    continue
+            except Exception as e:
+                print(f"发送通知失败：{e}")
+            failed |= members
+        if failed:
+            self._count('failed', len(failed))
+
+    def _post(self, content):
+        webhook_url = self.url_provider()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(webhook_url, json={"content": content}, timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                print(f"发送通知失败：{e}")
+                time.sleep(min(2 ** attempt, 30))
+                continue
+
+            if response.status_code in (200, 204):
+                self._count('sent')
+                print("已发送通知到 Discord。")
+                return True
+            if response.status_code == 429:
+                # 按 Discord 返回的 retry_after（秒）等待
+                self._count('rate_limited')
+                retry_after = response.headers.get('Retry-After')
+                try:
+                    retry_after = float(response.json().get('retry_after', retry_after))
+                except Exception:
+                    retry_after = float(retry_after or 1)
+                time.sleep(retry_after)
+                continue
+            if response.status_code >= 500:
+                time.sleep(min(2 ** attempt, 30))
+                continue
+
             print(f"发送通知失败，状态码：{response.status_code}")
-    except Exception as e:
-        print(f"发送通知失败：{e}")
+            break
+
+        return False
+
+notifier = DiscordNotifier()
+
+def send_discord_notification(message):
+    """
+    使用 Discord Webhook 发送通知（放入后台队列，立即返回）
+    """
+    if not notifier.notify(message):
+        print(f"通知队列已满，丢弃消息（已丢弃 {notifier.dropped} 条）。")
 
 
 if __name__ == "__main__":
-    send_discord_notification("Test Message. 测试发送。")
\ No newline at end of file
+    send_discord_notification("Test Message. 测试发送。")
+    notifier.flush(timeout=30)
+    print(notifier.metrics())
@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from signalChannel import CHANNEL_NAME, SignalConsumer
+
+logger = logging.getLogger(__name__)
+
+# 第一个事件到达后再等待这段时间（秒），把同时发生的多个事件合并为一次决策
+DEBOUNCE_SECONDS = 0.05
+# 蜡烛收盘后等待这段时间（秒）再触发，给交易所生成蜡烛留出时间
+CANDLE_CLOSE_DELAY = 1.0
+# 共享内存通道超过这段时间（秒）没有新记录时重新附加（wsMonitor 可能已重启）
+CHANNEL_STALE_SECONDS = 5 * 60
+# 轮询本地盘口的间隔（秒）
+BOOK_POLL_INTERVAL = 0.05
+
+TriggerEvent = namedtuple('TriggerEvent', ['reason', 'time'])
+
+def _start_thread(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+class EventTrigger:
+    """
+    事件驱动的决策触发器：事件源在蜡烛收盘、wsMonitor 窗口完成或盘口变化超过阈值时调用 fire()，
+    交易循环在 wait() 中阻塞，事件到达后几毫秒内返回。
+    debounce 把短时间内的多个事件合并为一次决策，min_interval 保证两次决策之间的最短间隔；
+    wait() 超时时也会返回，保留原来的固定周期作为兜底。
+    """
+    def __init__(self, min_interval=0.0, debounce=DEBOUNCE_SECONDS, clock=time.monotonic):
+        self.min_interval = min_interval
+        self.debounce = debounce
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.pending = []
+        self.last_run = None
+
+    def fire(self, reason):
+        with self.condition:
+            self.pending.append(TriggerEvent(reason, self.clock()))
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        :param timeout: 没有事件时最多等待的秒数（原来的固定周期）
+        :return: 触发本次决策的事件列表，超时返回空列表
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        with self.condition:
+            while not self.pending:
+                remaining = None if deadline is None else deadline - self.clock()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            if self.pending:
+                ready_at = self.pending[0].time + self.debounce
+                if self.last_run is not None:
+                    ready_at = max(ready_at, self.last_run + self.min_interval)
+                while self.clock() < ready_at:
+                    self.condition.wait(ready_at - self.clock())
+
+            events = self.pending
+            self.pending = []
+            self.last_run = self.clock()
+        if events:
+            reasons = ", ".join(sorted({event.reason for event in events}))
+            logger.info(f"Decision triggered by {reasons}, {self.latency(events) * 1000:.1f} ms after the event")
+        return events
+
+    def latency(self, events):
+        """
+        :return: 从第一个事件到现在的秒数
+        """
+        return self.clock() - events[0].time if events else None
+
+class CandleCloseSource:
+    """
+    在每根蜡烛收盘（按交易所时间对齐到 granularity_seconds）后触发。
+    """
+    def __init__(self, granularity_seconds=60, delay=CANDLE_CLOSE_DELAY, clock=time.time):
+        """
+        :param clock: 返回当前 UNIX 时间的函数，例如 timeStamps.exchange_now
+        """
+        self.granularity_seconds = granularity_seconds
+        self.delay = delay
+        self.clock = clock
+
+    def start(self, trigger):
+        return _start_thread(self._run, trigger)
+
+    def _run(self, trigger):
+        while True:
+            try:
+                now = self.clock()
+                next_close = (now // self.granularity_seconds + 1) * self.granularity_seconds
+                time.sleep(max(0.0, next_close + self.delay - now))
+                trigger.fire('candle_close')
+            except Exception as e:
+                logger.exception("Candle close source failed.")
+                time.sleep(1)
+
+class SignalChannelSource:
+    """
+    wsMonitor 在共享内存通道发布 product_id 的新窗口结果时触发。
+    """
+    def __init__(self, product_id, name=CHANNEL_NAME, stale_seconds=CHANNEL_STALE_SECONDS):
+        self.product_id = product_id
+        self.name = name
+        self.stale_seconds = stale_seconds
+
+    def start(self, trigger):
+        return _start_thread(self._run, trigger)
+
+    def _run(self, trigger):
+        consumer = None
+        last_record = time.monotonic()
+        while True:
+            try:
+                if consumer is not None and time.monotonic() - last_record > self.stale_seconds:
+                    consumer.close()
+                    consumer = None
+                if consumer is None:
+                    consumer = SignalConsumer(self.name, from_start=False)
+                    last_record = time.monotonic()
+                records, _ = consumer.wait(timeout=1.0)
+                if records:
+                    last_record = time.monotonic()
+                if any(record.product_id == self.product_id for record in records):
+                    trigger.fire('trade_flow_window')
+            except FileNotFoundError:
+                # wsMonitor 还没有运行
+                consumer = None
+                time.sleep(5)
+            except Exception as e:
+                logger.exception("Signal channel source failed.")
+                consumer = None
+                time.sleep(5)
+
+class BookThresholdSource:
+    """
+    本地盘口中间价相对上次触发时的变化超过 threshold_bps 个基点时触发。
+    """
+    def __init__(self, get_mid, threshold_bps=20, poll_interval=BOOK_POLL_INTERVAL):
+        """
+        :param get_mid: 返回当前中间价（没有时为 None）的函数，不应有网络请求，例如读取 orderBook.OrderBook.mid()
+        """
+        self.get_mid = get_mid
+        self.threshold_bps = threshold_bps
+        self.poll_interval = poll_interval
+
+    def start(self, trigger):
+        return _start_thread(self._run, trigger)
+
+    def _run(self, trigger):
+        reference = None
+        while True:
+            try:
+                mid = self.get_mid()
+                if mid:
+                    if reference is None:
+                        reference = mid
+                    elif abs(mid - reference) / reference * 10000 >= self.threshold_bps:
+                        trigger.fire('book_move')
+                        reference = mid
+            except Exception as e:
+                logger.exception("Book threshold source failed.")
+            time.sleep(self.poll_interval)
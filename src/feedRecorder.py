@@ -0,0 +1,295 @@
+import argparse
+import contextlib
+import gzip
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime, timezone
+from signalChannel import SignalRecord
+
+logger = logging.getLogger(__name__)
+
+# 录制文件：gzip 压缩、只追加，每行为 "<接收时间（UNIX 秒）>\t<原始消息>"
+# 每次打开追加一个新的 gzip 成员，后台线程每 FLUSH_INTERVAL 秒刷新一次，进程异常退出时最多丢失最后 FLUSH_INTERVAL 秒的消息
+FEED_RECORD_FILE = 'matches_feed.log.gz'
+FLUSH_INTERVAL = 1.0
+
+class FeedRecorder:
+    """
+    把 websocket 收到的原始消息连同接收时间写入压缩的只追加文件，供 FeedReplayer 回放。
+    刷新由后台线程按时间进行，与是否还有新消息无关；record() 只写入缓冲区。
+    """
+    def __init__(self, file_path=FEED_RECORD_FILE, flush_interval=FLUSH_INTERVAL, clock=time.time):
+        self.file_path = file_path
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.file = gzip.open(file_path, 'ab')
+        self.recorded = 0
+        self.unflushed = 0
+        self.stopped = threading.Event()
+        self.flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flush_thread.start()
+
+    def record(self, message, received_at=None):
+        received_at = self.clock() if received_at is None else received_at
+        if isinstance(message, bytes):
+            message = message.decode('utf-8')
+        line = f"{received_at:.6f}\t{message.rstrip()}\n".encode('utf-8')
+        with self.lock:
+            self.file.write(line)
+            self.recorded += 1
+            self.unflushed += 1
+
+    def flush(self):
+        with self.lock:
+            if self.unflushed and not self.file.closed:
+                # 同步刷新：已经写入的部分即使进程退出也可以读取
+                self.file.flush()
+                self.unflushed = 0
+
+    def _flush_loop(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception(f"Failed to flush feed recording {self.file_path}.")
+
+    def close(self):
+        self.stopped.set()
+        if self.flush_thread is not threading.current_thread():
+            self.flush_thread.join()
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+def read_recording(file_path):
+    """
+    逐条读取录制文件。文件末尾不完整（录制进程异常退出）时读到最后一条完整的消息为止。
+    :return: (接收时间, 原始消息) 的生成器
+    """
+    with gzip.open(file_path, 'rb') as f:
+        try:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                received_at, _, message = line.rstrip(b'\n').partition(b'\t')
+                yield float(received_at), message.decode('utf-8')
+        except (EOFError, zlib.error):
+            logger.warning(f"Recording {file_path} ends with an incomplete block, stopping there.")
+
+class FeedReplayer:
+    """
+    按录制时的时间间隔把消息推给 handler：speed=1 为原速，speed=N 为 N 倍速，speed=None 为不等待的最大速度。
+    """
+    def __init__(self, file_path, speed=1.0):
+        self.file_path = file_path
+        self.speed = speed
+        self.messages = 0
+        self.elapsed = 0.0
+        self.max_lag = 0.0  # 落后于计划时间的最大秒数（原速 / N 倍速时）
+
+    def replay(self, handler, on_tick=None):
+        """
+        :param handler: handler(message)，例如 wsMonitor.on_message 的包装
+        :param on_tick: on_tick(received_at)，在每条消息之前以录制时的接收时间调用，用于驱动按时间运行的处理
+        :return: 回放的消息数量
+        """
+        started = time.perf_counter()
+        first = None
+        for received_at, message in read_recording(self.file_path):
+            if first is None:
+                first = received_at
+            if self.speed:
+                due = started + (received_at - first) / self.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+            if on_tick is not None:
+                on_tick(received_at)
+            handler(message)
+            self.messages += 1
+        self.elapsed = time.perf_counter() - started
+        return self.messages
+
+    def throughput(self):
+        return self.messages / self.elapsed if self.elapsed else 0.0
+
+class _CollectedSignals:
+    """
+    代替共享内存通道，收集 wsMonitor 发布的窗口结果。
+    """
+    def __init__(self):
+        self.records = []
+
+    def publish(self, product_id, window_end, buy_volume, sell_volume, total_volume, ratio):
+        self.records.append(SignalRecord(len(self.records), window_end, buy_volume, sell_volume, total_volume, ratio, product_id))
+
+    def close(self):
+        pass
+
+@contextlib.contextmanager
+def isolated_ws_monitor(product_ids, signal_channel=None):
+    """
+    让 wsMonitor 只处理 product_ids：分析日志写入临时目录、不发送 Discord 通知、不向 REST 对账，结束后恢复原来的状态。
+    :param signal_channel: 代替共享内存通道的对象（需要 publish / close），None 时使用单独的共享内存通道
+    """
+    import wsMonitor
+    from candleAggregator import CandleAggregator
+    from signalChannel import SignalChannel
+    from timeWheel import TimeWheel
+    names = ('trade_wheels', 'candle_aggregators', 'TRADE_LOG_FILE', 'trade_logs', 'signal_channel', 'VOLUME_THRESHOLDS', 'alert_sent')
+    saved = {name: getattr(wsMonitor, name) for name in names}
+    with tempfile.TemporaryDirectory() as directory:
+        channel = signal_channel or SignalChannel(name=f'coinbasebot_isolated_{os.getpid()}')
+        try:
+            wsMonitor.trade_wheels = {product_id: TimeWheel(wsMonitor.WINDOWS) for product_id in product_ids}
+            wsMonitor.candle_aggregators = {
+                product_id: CandleAggregator(product_id, fetch_candles=lambda *args: []) for product_id in product_ids
+            }
+            wsMonitor.TRADE_LOG_FILE = os.path.join(directory, 'trade_analysis_{product_id}.txt')
+            wsMonitor.trade_logs = {}
+            wsMonitor.signal_channel = channel
+            wsMonitor.VOLUME_THRESHOLDS = {product_id: float('inf') for product_id in product_ids}
+            wsMonitor.alert_sent = set(product_ids)
+            yield wsMonitor
+        finally:
+            # Windows 上需要先关闭日志文件才能删除临时目录
+            for trade_log in wsMonitor.trade_logs.values():
+                trade_log.close()
+            for name, value in saved.items():
+                setattr(wsMonitor, name, value)
+            channel.close()
+
+def recorded_products(file_path):
+    product_ids = []
+    for _, message in read_recording(file_path):
+        if '"match"' not in message:
+            continue
+        product_id = json.loads(message).get('product_id')
+        if product_id and product_id not in product_ids:
+            product_ids.append(product_id)
+    return product_ids
+
+def replay_ws_monitor(file_path, speed=None, product_ids=None, quiet=True):
+    """
+    把录制的 matches 消息推入 wsMonitor.on_message，并按录制时的接收时间每 PROCESS_INTERVAL 秒运行一次 process_product，
+    窗口结果与录制时的实时运行相同（与机器速度无关）。
+    :return: (FeedReplayer, 发布的 SignalRecord 列表)
+    """
+    product_ids = product_ids or recorded_products(file_path)
+    signals = _CollectedSignals()
+    replayer = FeedReplayer(file_path, speed)
+    with isolated_ws_monitor(product_ids, signals) as wsMonitor, contextlib.ExitStack() as stack:
+        if quiet:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+        next_cycle = None
+
+        def run_cycles(received_at):
+            nonlocal next_cycle
+            if next_cycle is None:
+                next_cycle = received_at + wsMonitor.PROCESS_INTERVAL
+            while received_at >= next_cycle:
+                now = datetime.fromtimestamp(next_cycle, timezone.utc).replace(tzinfo=None)
+                for product_id, wheel in wsMonitor.trade_wheels.items():
+                    wsMonitor.process_product(product_id, wheel, now)
+                next_cycle += wsMonitor.PROCESS_INTERVAL
+
+        replayer.replay(lambda message: wsMonitor.on_message(None, message), on_tick=run_cycles)
+    return replayer, signals.records
+
+def opposite_trader_decisions(signals, product_id):
+    """
+    按 oppositeTrader 交易循环的节奏重新计算决策：wsMonitor 每发布一个 product_id 的窗口，
+    SignalChannelSource 触发一次决策（每个 PROCESS_INTERVAL 一次，MIN_DECISION_INTERVAL 不会限制），
+    交易循环用 accumulate_signal_records 加入新的数据点，数据点足够时调用 check_trading_conditions。
+    被过滤掉的窗口（成交量或买卖比为零）同样触发一次决策，使用的是之前的数据点。
+    没有窗口时 WAIT_TIME 的兜底超时只会用相同的数据点重复同一决策，这里不模拟。
+    :return: [(window_end, action, percentage)]
+    """
+    from oppositeTrader import MAX_DATA_POINTS, accumulate_signal_records, check_trading_conditions, ready_data_points
+    data_points = deque(maxlen=MAX_DATA_POINTS)
+    decisions = []
+    # 只保留 ERROR（例如零成交量的窗口），不输出每次决策的日志
+    logging.disable(logging.WARNING)
+    try:
+        for record in signals:
+            if record.product_id != product_id:
+                continue
+            accumulate_signal_records([record], data_points, product_id)
+            ready = ready_data_points(data_points)
+            if ready is not None:
+                action, percentage = check_trading_conditions(ready)
+                decisions.append((record.window_end, action, percentage))
+    finally:
+        logging.disable(logging.NOTSET)
+    return decisions
+
+def record_feed(file_path=FEED_RECORD_FILE, product_ids=None, seconds=None):
+    """
+    单独录制 matches 频道（不运行分析），seconds 秒后停止，None 时一直录制。
+    """
+    import websocket
+    import wsMonitor
+    product_ids = product_ids or wsMonitor.PRODUCT_IDS
+    recorder = FeedRecorder(file_path)
+
+    def on_open(ws):
+        ws.send(json.dumps({"type": "subscribe", "channels": [{"name": "matches", "product_ids": product_ids}]}))
+
+    ws = websocket.WebSocketApp(
+        "wss://ws-feed.exchange.coinbase.com",
+        on_open=on_open,
+        on_message=lambda ws, message: recorder.record(message)
+    )
+    timer = threading.Timer(seconds, ws.close) if seconds else None
+    if timer is not None:
+        timer.start()
+    try:
+        ws.run_forever()
+    finally:
+        if timer is not None:
+            timer.cancel()
+        recorder.close()
+    return recorder.recorded
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record the matches feed or replay a recording through wsMonitor offline.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record_parser = subparsers.add_parser('record')
+    record_parser.add_argument('file', nargs='?', default=FEED_RECORD_FILE)
+    record_parser.add_argument('--seconds', type=float)
+    record_parser.add_argument('--products', nargs='+')
+    replay_parser = subparsers.add_parser('replay')
+    replay_parser.add_argument('file')
+    replay_parser.add_argument('--speed', default='max', help="1 for real time, N for N times faster, max for no waiting")
+    replay_parser.add_argument('--products', nargs='+')
+    replay_parser.add_argument('--decisions', action='store_true', help="print the oppositeTrader decision for every window")
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        count = record_feed(args.file, args.products, args.seconds)
+        print(f"Recorded {count} messages to {args.file}")
+        return 0
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    replayer, signals = replay_ws_monitor(args.file, speed, args.products)
+    print(f"Replayed {replayer.messages} messages in {replayer.elapsed:.3f}s ({replayer.throughput():,.0f} msg/s), "
+          f"{len(signals)} windows, max lag {replayer.max_lag * 1000:.1f} ms")
+    if args.decisions:
+        for product_id in sorted({record.product_id for record in signals}):
+            for window_end, action, percentage in opposite_trader_decisions(signals, product_id):
+                window = datetime.fromtimestamp(window_end, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+                print(f"{product_id} {window}: {action} {percentage}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,19 +2,43 @@ import time
 from restClient import client
 from datetime import timedelta
 from timeStamps import generate_unix_timestamp
+from candleStore import get_candle_store, GRANULARITY_SECONDS
+from latencyMetrics import metrics
+from resampler import get_resampler
 
 # product = client.get_product(product_id = 'XRP-USD')
 # print("Product info: ")
 # print(product)
 
-def get_candles(minutes=0, hours=0, days=0, seconds=0):
-    endTime = generate_unix_timestamp(minutes, hours, days, seconds)
-    start_time = generate_unix_timestamp(minutes + 250, hours, days, seconds)
-    return client.get_candles(product_id = 'XRP-USD', start = start_time, end = endTime, granularity = "ONE_MINUTE")
+def get_candles(minutes=0, hours=0, days=0, seconds=0, product_id='XRP-USD', granularity="ONE_MINUTE"):
+    now = int(generate_unix_timestamp())
+    endTime = now - int(timedelta(minutes=minutes, hours=hours, days=days, seconds=seconds).total_seconds())
+    store = get_candle_store(product_id, granularity)
+    start_time = endTime - 250 * store.granularity_seconds
+    # 从本地缓存读取，只通过 REST 拉取缺失的蜡烛
+    with metrics.stage('get_candles', product_id):
+        return store.get_candles(client, start_time, endTime, now=now)
+
+def get_timeframe_candles(granularity="FIVE_MINUTE", count=250, product_id='XRP-USD'):
+    # 由缓存的一分钟蜡烛增量生成较大粒度的蜡烛，不需要按粒度单独拉取
+    now = int(generate_unix_timestamp())
+    store = get_candle_store(product_id, "ONE_MINUTE")
+    resampler = get_resampler(product_id)
+    # 一分钟缓存最多保留 max_memory_candles 根，较大粒度在运行过程中逐渐积累到 count 根
+    lookback = min(count * GRANULARITY_SECONDS[granularity], store.max_memory_candles * store.granularity_seconds)
+    start_time = now - lookback
+    if resampler.first_closed is not None and resampler.first_closed <= start_time < resampler.last_closed:
+        # 之前已经合并过的一分钟蜡烛不再读取
+        start_time = resampler.last_closed
+    resampler.update(store.get_candles(client, start_time, now, now=now), now)
+    return resampler.get_candles(granularity, count)
+
+def fill_candle_history(days=30, product_id='XRP-USD', granularity="ONE_MINUTE"):
+    # 把最近 days 天的蜡烛拉取到本地缓存，供离线回测使用
+    now = int(generate_unix_timestamp())
+    store = get_candle_store(product_id, granularity)
+    return store.refresh(client, now - days * 24 * 60 * 60, now, now=now)
 
-candles = get_candles()
 # print(candles)
 # print(client.get_unix_time().epoch_seconds)
 # print(generate_unix_timestamp())
-
-
@@ -0,0 +1,244 @@
+import math
+import numpy as np
+from collections import deque
+
+class RollingWindow:
+    """
+    固定长度的滑动窗口，维护运行和（Kahan 补偿）以及 Welford 方差。
+    push / replace_last 均为 O(1)；每滚动一整个窗口重新精确求和一次，
+    均摊仍为 O(1)，同时避免增删过程中浮点误差的累积。
+    """
+    def __init__(self, size):
+        self.size = size
+        self.values = deque()
+        self._sum = 0.0
+        self._compensation = 0.0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._pushes = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def is_full(self):
+        return len(self.values) == self.size
+
+    def _add_to_sum(self, x):
+        # Kahan 求和，避免长时间运行后的累积误差
+        y = x - self._compensation
+        t = self._sum + y
+        self._compensation = (t - self._sum) - y
+        self._sum = t
+
+    def _welford_add(self, x):
+        n = len(self.values)
+        delta = x - self._mean
+        self._mean += delta / n
+        self._m2 += delta * (x - self._mean)
+
+    def _welford_remove(self, x):
+        n = len(self.values)
+        if n == 0:
+            self._mean = 0.0
+            self._m2 = 0.0
+            return
+        delta = x - self._mean
+        self._mean -= delta / n
+        self._m2 -= delta * (x - self._mean)
+
+    def push(self, x):
+        """
+        追加一个新值，窗口已满时移除最旧的值。
+        :param x: 新值（可以为 NaN）
+        :return: 被移除的值，没有则为 None
+        """
+        evicted = None
+        if len(self.values) == self.size:
+            evicted = self.values.popleft()
+            self._add_to_sum(-evicted)
+            self._welford_remove(evicted)
+        self.values.append(x)
+        self._add_to_sum(x)
+        self._welford_add(x)
+        self._pushes += 1
+        if self._pushes >= self.size:
+            self._resync()
+        return evicted
+
+    def _resync(self):
+        values = self.values
+        self._pushes = 0
+        self._sum = math.fsum(values)
+        self._compensation = 0.0
+        self._mean = self._sum / len(values)
+        self._m2 = math.fsum((x - self._mean) ** 2 for x in values)
+
+    def replace_last(self, x):
+        """
+        替换最新的值（用于尚未收盘、价格仍在变化的蜡烛）。
+        """
+        old = self.values.pop()
+        self._add_to_sum(-old)
+        self._welford_remove(old)
+        self.values.append(x)
+        self._add_to_sum(x)
+        self._welford_add(x)
+
+    def mean(self):
+        if not self.is_full():
+            return np.nan
+        return self._sum / self.size
+
+    def std(self):
+        # 与 pandas rolling().std() 一致，使用样本标准差 (ddof=1)
+        if not self.is_full() or self.size < 2:
+            return np.nan
+        return math.sqrt(max(self._m2, 0.0) / (self.size - 1))
+
+class IndicatorEngine:
+    """
+    增量指标引擎：每追加一根蜡烛，以 O(1) 的代价更新 MA5、MA10、布林带、
+    标准差、RSI、%B 以及金叉/死叉信号，结果与 calculate_indicators 的 pandas 路径一致。
+    """
+    def __init__(self, ma_short=5, ma_long=10, bb_window=20, bb_std=2, rsi_window=14):
+        self.ma_short = ma_short
+        self.ma_long = ma_long
+        self.bb_window = bb_window
+        self.bb_std = bb_std
+        self.rsi_window = rsi_window
+
+        self._short = RollingWindow(ma_short)
+        self._long = RollingWindow(ma_long)
+        self._bb = RollingWindow(bb_window)
+        self._gain = RollingWindow(rsi_window)
+        self._loss = RollingWindow(rsi_window)
+
+        self.count = 0
+        self.last_start = None
+        self.last_candle = None
+        self._prev_close = np.nan
+        self._last_close = np.nan
+        self._prev_ma = (np.nan, np.nan)
+        self._last_ma = (np.nan, np.nan)
+
+    def min_periods(self):
+        # 与 calculate_indicators 的最少数据点要求一致
+        return max(20, self.bb_window, self.ma_long, self.rsi_window + 1)
+
+    def is_ready(self):
+        return self.count >= self.min_periods()
+
+    def _rsi_delta(self, close, prev_close):
+        delta = close - prev_close
+        if math.isnan(delta):
+            return np.nan, np.nan
+        return max(delta, 0.0), -min(delta, 0.0)
+
+    def update(self, start, candle):
+        """
+        追加或修正一根蜡烛。
+        :param start: 蜡烛开始时间（可比较的时间戳）
+        :param candle: 包含 open/high/low/close/volume 的 dict
+        :return: 最新的指标 dict（见 latest()）
+        """
+        close = float(candle['close'])
+
+        if self.last_start is not None and start < self.last_start:
+            # 比当前最新蜡烛更旧的数据直接忽略
+            return self.latest()
+
+        if self.last_start is not None and start == self.last_start:
+            # 同一根蜡烛的新价格：只替换最后一个值
+            self._short.replace_last(close)
+            self._long.replace_last(close)
+            self._bb.replace_last(close)
+            if self.count > 1:
+                gain, loss = self._rsi_delta(close, self._prev_close)
+                self._gain.replace_last(gain)
+                self._loss.replace_last(loss)
+        else:
+            self._prev_close = self._last_close
+            self._prev_ma = self._last_ma
+            self._short.push(close)
+            self._long.push(close)
+            self._bb.push(close)
+            if self.count > 0:
+                gain, loss = self._rsi_delta(close, self._prev_close)
+                self._gain.push(gain)
+                self._loss.push(loss)
+            self.count += 1
+
+        self.last_start = start
+        self.last_candle = dict(candle, start=start)
+        self._last_close = close
+        self._last_ma = (self._short.mean(), self._long.mean())
+        return self.latest()
+
+    def update_from_df(self, df):
+        """
+        将 process_candle_data 返回的 DataFrame 中尚未处理的蜡烛喂给引擎。
+        第一次调用时使用整个窗口初始化，之后只处理新增（或最后一根被修正）的行。
+        """
+        if self.last_start is not None:
+            df = df[df['start'] >= self.last_start]
+        for row in df.itertuples(index=False):
+            self.update(row.start, {
+                'open': row.open,
+                'high': row.high,
+                'low': row.low,
+                'close': row.close,
+                'volume': row.volume
+            })
+        return self.latest()
+
+    def _rsi(self):
+        if not self._gain.is_full():
+            return np.nan
+        average_gain = self._gain.mean()
+        average_loss = self._loss.mean()
+        # 与 pandas 的除法语义保持一致：0/0 -> NaN，x/0 -> inf -> RSI 100
+        if average_loss == 0:
+            if average_gain == 0 or math.isnan(average_gain):
+                return np.nan
+            return 100.0
+        rs = average_gain / average_loss
+        return 100 - (100 / (1 + rs))
+
+    def _signal(self):
+        ma5, ma10 = self._last_ma
+        prev_ma5, prev_ma10 = self._prev_ma
+        # NaN 参与比较时结果为 False，与 detect_golden_death_cross 相同
+        if ma5 > ma10 and prev_ma5 <= prev_ma10:
+            return 1
+        if ma5 < ma10 and prev_ma5 >= prev_ma10:
+            return -1
+        return 0
+
+    def latest(self):
+        """
+        :return: 最新一根蜡烛的指标，键名与 calculate_indicators / detect_golden_death_cross 的列名相同
+        """
+        middle = self._bb.mean()
+        std = self._bb.std()
+        upper = middle + std * self.bb_std
+        lower = middle - std * self.bb_std
+        close = self._last_close
+        band_width = upper - lower
+        if band_width == 0:
+            percent_b = np.nan if close - lower == 0 else math.copysign(np.inf, close - lower)
+        else:
+            percent_b = (close - lower) / band_width
+
+        latest_data = dict(self.last_candle or {})
+        latest_data.update({
+            'MA5': self._last_ma[0],
+            'MA10': self._last_ma[1],
+            'MiddleBand': middle,
+            'StdDev': std,
+            'UpperBand': upper,
+            'LowerBand': lower,
+            'RSI': self._rsi(),
+            'PercentB': percent_b,
+            'signal': self._signal()
+        })
+        return latest_data
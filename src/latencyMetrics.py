@@ -0,0 +1,298 @@
+import atexit
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# 设为 False 时 stage() 返回空操作的计时器，热路径上只剩一次函数调用
+ENABLED = True
+
+# HDR 风格的对数-线性分桶：以微秒记录，0 到 63 微秒每微秒一个桶（SUB_BUCKET_COUNT = 64），
+# 之后每个 2 的幂区间分为 32 个子桶（SUB_BUCKET_HALF），相对误差约 3%
+SUB_BUCKET_BITS = 6
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT // 2
+# 超过 1 小时的耗时按 1 小时记录
+MAX_MICROSECONDS = 3600 * 1000000
+BUCKET_COUNT = SUB_BUCKET_COUNT + (MAX_MICROSECONDS.bit_length() - SUB_BUCKET_BITS) * SUB_BUCKET_HALF
+
+# Prometheus 导出时使用的累计分桶上界（秒）
+EXPORT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+EXPORT_QUANTILES = (0.5, 0.9, 0.99)
+METRIC_PREFIX = 'coinbasebot'
+
+# 写入文件的路径（node_exporter textfile collector 可以直接读取）和间隔（秒）
+METRICS_FILE = 'metrics_{name}.prom'
+DUMP_INTERVAL = 15
+
+def bucket_index(microseconds):
+    if microseconds < SUB_BUCKET_COUNT:
+        return microseconds
+    shift = microseconds.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKET_COUNT + (shift - 1) * SUB_BUCKET_HALF + (microseconds >> shift) - SUB_BUCKET_HALF
+
+def bucket_upper_bound(index):
+    """
+    :return: 分桶包含的最大微秒数
+    """
+    if index < SUB_BUCKET_COUNT:
+        return index
+    shift = (index - SUB_BUCKET_COUNT) // SUB_BUCKET_HALF + 1
+    mantissa = (index - SUB_BUCKET_COUNT) % SUB_BUCKET_HALF + SUB_BUCKET_HALF
+    return ((mantissa + 1) << shift) - 1
+
+def _last_index_within(microseconds):
+    # 上界不超过 microseconds 的最后一个分桶
+    index = bucket_index(microseconds)
+    return index if bucket_upper_bound(index) <= microseconds else index - 1
+
+# 每个导出分桶对应的最后一个 HDR 分桶
+_EXPORT_INDEXES = [_last_index_within(int(bound * 1000000)) for bound in EXPORT_BUCKETS]
+
+class LatencyHistogram:
+    """
+    固定大小的 HDR 风格直方图：记录是 O(1) 的一次下标计算和加法，内存不随样本数增长。
+    """
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        microseconds = min(max(int(seconds * 1000000), 0), MAX_MICROSECONDS)
+        index = bucket_index(microseconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.count, self.sum, self.min, self.max
+
+    def percentile(self, q, snapshot=None):
+        """
+        :param q: 0 到 1 之间
+        :return: 秒，没有样本时为 None
+        """
+        counts, count, _, _, maximum = snapshot or self.snapshot()
+        if not count:
+            return None
+        target = max(1, int(q * count + 0.5))
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(bucket_upper_bound(index) / 1000000, maximum)
+        return maximum
+
+class _StageTimer:
+    __slots__ = ('stats', 'started')
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stats.record(time.perf_counter() - self.started, 'ok' if exc_type is None else 'error')
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _StageStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.outcomes = {}  # outcome -> 次数
+
+    def record(self, seconds, outcome='ok'):
+        self.histogram.record(seconds)
+        # 字典单个键的读写在 GIL 下是原子的，偶尔丢失一次计数可以接受
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+class LatencyMetrics:
+    """
+    按 (阶段, 交易对) 记录耗时直方图和结果计数（ok / error / timeout 等），以 Prometheus 文本格式导出。
+    """
+    def __init__(self, prefix=METRIC_PREFIX):
+        self.prefix = prefix
+        self.stages = {}  # (stage, product_id) -> _StageStats
+        self.lock = threading.Lock()
+
+    def _stats(self, stage, product_id):
+        key = (stage, product_id or '')
+        stats = self.stages.get(key)
+        if stats is None:
+            with self.lock:
+                stats = self.stages.setdefault(key, _StageStats())
+        return stats
+
+    def stage(self, stage, product_id=None):
+        """
+        with metrics.stage('get_candles', 'XRP-USD'): ...
+        抛出异常时结果记为 error。
+        """
+        if not ENABLED:
+            return _NULL_TIMER
+        return _StageTimer(self._stats(stage, product_id))
+
+    def record(self, stage, seconds, product_id=None, outcome='ok'):
+        if ENABLED:
+            self._stats(stage, product_id).record(seconds, outcome)
+
+    def timed(self, stage, product_id=None):
+        """
+        装饰器版本的 stage()。
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage, product_id):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """
+        :return: {(stage, product_id): {'count', 'p50', 'p90', 'p99', 'max', 'outcomes'}}，耗时以秒计
+        """
+        summary = {}
+        for key, stats in list(self.stages.items()):
+            snapshot = stats.histogram.snapshot()
+            summary[key] = {
+                'count': snapshot[1],
+                'p50': stats.histogram.percentile(0.5, snapshot),
+                'p90': stats.histogram.percentile(0.9, snapshot),
+                'p99': stats.histogram.percentile(0.99, snapshot),
+                'max': snapshot[4],
+                'outcomes': dict(stats.outcomes),
+            }
+        return summary
+
+    def render(self):
+        """
+        :return: Prometheus 文本格式
+        """
+        histogram_name = f'{self.prefix}_stage_latency_seconds'
+        quantile_name = f'{self.prefix}_stage_latency_quantile_seconds'
+        counter_name = f'{self.prefix}_stage_calls_total'
+        histogram_lines = [
+            f'# HELP {histogram_name} Time spent in each trading stage.',
+            f'# TYPE {histogram_name} histogram',
+        ]
+        quantile_lines = [
+            f'# HELP {quantile_name} Latency quantiles from the HDR histogram.',
+            f'# TYPE {quantile_name} gauge',
+        ]
+        counter_lines = [
+            f'# HELP {counter_name} Calls of each trading stage by outcome.',
+            f'# TYPE {counter_name} counter',
+        ]
+        for (stage, product_id), stats in sorted(list(self.stages.items()), key=lambda item: item[0]):
+            labels = f'stage="{stage}",product="{product_id}"'
+            snapshot = stats.histogram.snapshot()
+            counts, count, total, _, _ = snapshot
+            cumulative = 0
+            start = 0
+            for bound, last_index in zip(EXPORT_BUCKETS, _EXPORT_INDEXES):
+                cumulative += sum(counts[start:last_index + 1])
+                start = last_index + 1
+                histogram_lines.append(f'{histogram_name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            histogram_lines.append(f'{histogram_name}_bucket{{{labels},le="+Inf"}} {count}')
+            histogram_lines.append(f'{histogram_name}_sum{{{labels}}} {total}')
+            histogram_lines.append(f'{histogram_name}_count{{{labels}}} {count}')
+            for q in EXPORT_QUANTILES:
+                value = stats.histogram.percentile(q, snapshot)
+                if value is not None:
+                    quantile_lines.append(f'{quantile_name}{{{labels},quantile="{q}"}} {value}')
+            for outcome, outcome_count in sorted(list(stats.outcomes.items())):
+                counter_lines.append(f'{counter_name}{{{labels},outcome="{outcome}"}} {outcome_count}')
+        return '\n'.join(histogram_lines + quantile_lines + counter_lines) + '\n'
+
+    def dump(self, file_path):
+        # 先写临时文件再替换，读取方不会读到一半的内容
+        tmp_file = file_path + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_file, file_path)
+
+    def _dump_safely(self, file_path):
+        try:
+            self.dump(file_path)
+        except Exception:
+            logger.exception(f"Failed to write metrics to {file_path}.")
+
+    def start_dump(self, file_path, interval=DUMP_INTERVAL):
+        """
+        立即写入一次 file_path，之后后台线程每隔 interval 秒写入一次，进程退出时再写入最后一次，
+        运行时间不足 interval 的进程也会留下指标。
+        """
+        self._dump_safely(file_path)
+        atexit.register(self._dump_safely, file_path)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self._dump_safely(file_path)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def start_http_server(self, port, host='127.0.0.1'):
+        """
+        在 http://host:port/metrics 提供 Prometheus 文本格式的指标。
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+        return server
+
+# 进程内共享
+metrics = LatencyMetrics()
+
+def start_exporter(name, port=None, interval=DUMP_INTERVAL):
+    """
+    交易程序启动时调用：定期写入 metrics_<name>.prom，指定 port 时同时提供 HTTP 接口。
+    """
+    metrics.start_dump(METRICS_FILE.format(name=name), interval)
+    if port is not None:
+        return metrics.start_http_server(port)
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# 同一交易对的盘口在这段时间（秒）内只请求一次
+SNAPSHOT_TTL = 2.0
+# 每次请求的盘口档数
+BOOK_DEPTH = 100
+
+# bids / asks 是 (price, size) 列表，按价格从优到劣排列
+MarketSnapshot = namedtuple('MarketSnapshot', ['product_id', 'best_bid', 'best_ask', 'mid', 'bids', 'asks', 'fetched_at'])
+
+def fetch_product_book(product_id, limit=BOOK_DEPTH):
+    from restClient import client
+    return client.get_product_book(product_id=product_id, limit=limit)
+
+def parse_product_book(product_id, product_book_data, fetched_at):
+    pricebook = product_book_data['pricebook']
+    bids = [(float(level['price']), float(level['size'])) for level in pricebook['bids']]
+    asks = [(float(level['price']), float(level['size'])) for level in pricebook['asks']]
+    best_bid = bids[0][0] if bids else None
+    best_ask = asks[0][0] if asks else None
+    mid = (best_bid + best_ask) / 2 if best_bid and best_ask else None
+    return MarketSnapshot(product_id, best_bid, best_ask, mid, bids, asks, fetched_at)
+
+def snapshot_from_book(book, depth, fetched_at):
+    # 由本地 L2 盘口（orderBook.OrderBook）生成快照，不需要 REST 请求
+    bids, asks = book.top(depth)
+    best_bid = bids[0][0] if bids else None
+    best_ask = asks[0][0] if asks else None
+    mid = (best_bid + best_ask) / 2 if best_bid and best_ask else None
+    return MarketSnapshot(book.product_id, best_bid, best_ask, mid, bids, asks, fetched_at)
+
+def depth(levels, max_levels=None):
+    """
+    :return: 前 max_levels 档的挂单总量（默认全部）
+    """
+    return sum(size for _, size in levels[:max_levels])
+
+class _Entry:
+    __slots__ = ('snapshot', 'inflight', 'error')
+
+    def __init__(self):
+        self.snapshot = None
+        self.inflight = None  # 正在请求时为 threading.Event
+        self.error = None
+
+class SnapshotService:
+    """
+    所有交易脚本共用的盘口快照：每个交易对在 ttl 秒内只请求一次 REST 盘口，
+    同时到达的请求合并成一次进行中的调用，其他线程等待它的结果。
+    """
+    def __init__(self, fetch_book=fetch_product_book, ttl=SNAPSHOT_TTL, depth=BOOK_DEPTH, clock=time.monotonic):
+        """
+        :param fetch_book: fetch_book(product_id, limit) 返回 SDK 的 get_product_book 结果
+        """
+        self.fetch_book = fetch_book
+        self.ttl = ttl
+        self.depth = depth
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.order_book_feed = None  # 设置后优先使用本地 L2 盘口
+        self.fetches = 0
+        self.hits = 0
+
+    def get(self, product_id, max_age=None):
+        """
+        :param max_age: 可以接受的最大快照年龄（秒），默认为 ttl
+        :return: MarketSnapshot，请求失败时抛出异常
+        """
+        max_age = self.ttl if max_age is None else max_age
+        feed = self.order_book_feed
+        if feed is not None:
+            book = feed.get_book(product_id)
+            if book is not None:
+                return snapshot_from_book(book, self.depth, self.clock())
+
+        with self.lock:
+            entry = self.entries.setdefault(product_id, _Entry())
+            snapshot = entry.snapshot
+            if snapshot is not None and self.clock() - snapshot.fetched_at <= max_age:
+                self.hits += 1
+                return snapshot
+            inflight = entry.inflight
+            if inflight is None:
+                # 由当前线程发起请求
+                inflight = entry.inflight = threading.Event()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            inflight.wait()
+            with self.lock:
+                self.hits += 1
+                if entry.error is not None:
+                    raise entry.error
+                return entry.snapshot
+
+        snapshot = None
+        error = None
+        try:
+            product_book_data = self.fetch_book(product_id, self.depth)
+            snapshot = parse_product_book(product_id, product_book_data, self.clock())
+        except Exception as e:
+            error = e
+        with self.lock:
+            self.fetches += 1
+            entry.error = error
+            if snapshot is not None:
+                entry.snapshot = snapshot
+            entry.inflight = None
+        inflight.set()
+        if error is not None:
+            raise error
+        return snapshot
+
+    def invalidate(self, product_id=None):
+        # 下单后调用，下一次读取重新请求盘口
+        with self.lock:
+            if product_id is None:
+                self.entries.clear()
+            elif product_id in self.entries:
+                self.entries[product_id].snapshot = None
+
+market_snapshots = SnapshotService()
+
+def use_order_book_feed(feed):
+    """
+    :param feed: orderBook.OrderBookFeed，盘口同步期间自动退回 REST
+    """
+    market_snapshots.order_book_feed = feed
+
+def get_market_snapshot(product_id, max_age=None):
+    return market_snapshots.get(product_id, max_age)
+
+def get_current_price(product_id):
+    """
+    :return: 买一和卖一的中间价，获取失败时返回 None
+    """
+    try:
+        snapshot = market_snapshots.get(product_id)
+        if snapshot.mid is None:
+            logger.error("Best bid or best ask is missing.")
+            return None
+        logger.info(f"Calculated {product_id} price: {snapshot.mid:.8f} (midpoint of best_bid and best_ask)")
+        return snapshot.mid
+
+    except Exception as e:
+        logger.exception(f"Failed to retrieve {product_id} price.")
+        return None
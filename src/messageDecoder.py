@@ -0,0 +1,141 @@
+import json
+import time
+from datetime import datetime, timezone
+
+# 可选的高速 JSON 库，没有安装时使用标准库
+try:
+    import orjson
+    json_loads = orjson.loads
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    json_loads = json.loads
+    JSON_BACKEND = 'json'
+
+# Coinbase 行情推送的 match 消息里固定包含这段文本，先做子串判断，其他类型的消息不做完整解析
+MATCH_MARKERS = ('"type":"match"', '"type": "match"')
+
+class Trade:
+    """
+    紧凑的成交记录，使用 __slots__ 代替 dict。
+    """
+    __slots__ = ('time', 'price', 'size', 'side', 'product_id')
+
+    def __init__(self, time, price, size, side, product_id):
+        self.time = time  # UNIX 秒（浮点）
+        self.price = price
+        self.size = size
+        self.side = side  # 'buy' or 'sell'
+        self.product_id = product_id
+
+    def __repr__(self):
+        return f"Trade(time={self.time}, price={self.price}, size={self.size}, side={self.side}, product_id={self.product_id})"
+
+def _days_from_civil(year, month, day):
+    # 公历日期到 1970-01-01 的天数（Howard Hinnant 算法）
+    year -= month <= 2
+    era = (year if year >= 0 else year - 399) // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+# 日期部分（YYYY-MM-DD）到当天零点 UNIX 时间的缓存，一天只需要计算一次
+_day_cache = {}
+
+def parse_iso8601(value):
+    """
+    解析固定格式的 UTC 时间 'YYYY-MM-DDTHH:MM:SS[.ffffff]Z'，返回 UNIX 秒（浮点）。
+    格式不符时退回 datetime 解析。
+    """
+    try:
+        date = value[:10]
+        midnight = _day_cache.get(date)
+        if midnight is None:
+            if value[4] != '-' or value[7] != '-':
+                raise ValueError(value)
+            midnight = _days_from_civil(int(value[0:4]), int(value[5:7]), int(value[8:10])) * 86400
+            if len(_day_cache) > 16:
+                _day_cache.clear()
+            _day_cache[date] = midnight
+
+        if value[10] != 'T' or value[13] != ':' or value[16] != ':' or value[-1] != 'Z':
+            raise ValueError(value)
+        seconds = midnight + int(value[11:13]) * 3600 + int(value[14:16]) * 60 + int(value[17:19])
+        if len(value) > 20 and value[19] == '.':
+            fraction = value[20:-1]
+            seconds += int(fraction) / 10 ** len(fraction)
+        return seconds
+    except (ValueError, IndexError):
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc).timestamp()
+
+def is_match(message):
+    for marker in MATCH_MARKERS:
+        if marker in message:
+            return True
+    return False
+
+def decode_match(message):
+    """
+    :param message: websocket 收到的原始文本
+    :return: match 消息对应的 Trade，其他消息返回 None
+    """
+    if not is_match(message):
+        return None
+    data = json_loads(message)
+    if data.get('type') != 'match':
+        return None
+    return Trade(
+        parse_iso8601(data['time']),
+        float(data['price']),
+        float(data['size']),
+        data['side'],
+        data['product_id']
+    )
+
+def measure_throughput(messages, decode=decode_match, min_seconds=1.0):
+    """
+    反复解码 messages，返回每秒能处理的消息数量。
+    """
+    count = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds:
+        for message in messages:
+            decode(message)
+        count += len(messages)
+        elapsed = time.perf_counter() - started
+    return count / elapsed
+
+def _legacy_decode(message):
+    # 旧版 on_message 的解析方式，用于对比
+    data = json.loads(message)
+    if data['type'] == 'match':
+        return {
+            'time': datetime.strptime(data['time'], '%Y-%m-%dT%H:%M:%S.%fZ'),
+            'price': float(data['price']),
+            'size': float(data['size']),
+            'side': data['side'],
+            'product_id': data['product_id']
+        }
+
+def sample_messages(count=1000):
+    messages = []
+    for i in range(count):
+        if i % 10 == 0:
+            messages.append('{"type":"heartbeat","last_trade_id":1,"product_id":"XRP-USD","sequence":1,"time":"2024-12-03T08:41:29.123456Z"}')
+        else:
+            messages.append(
+                '{"type":"match","trade_id":%d,"maker_order_id":"ac928c66-ca53-498f-9c13-a110027a60e8",'
+                '"taker_order_id":"132fb6ae-456b-4654-b4e0-d681ac05cea1","side":"%s","size":"%d.123456",'
+                '"price":"1.4%03d","product_id":"XRP-USD","sequence":%d,"time":"2024-12-03T08:41:%02d.%06dZ"}'
+                % (i, 'buy' if i % 2 else 'sell', i % 5000, i % 1000, 1000 + i, i % 60, i * 37 % 1000000)
+            )
+    return messages
+
+if __name__ == "__main__":
+    messages = sample_messages()
+    legacy = measure_throughput(messages, _legacy_decode)
+    fast = measure_throughput(messages)
+    print(f"JSON backend: {JSON_BACKEND}")
+    print(f"Legacy decode: {legacy:,.0f} msg/s")
+    print(f"Fast decode:   {fast:,.0f} msg/s ({fast / legacy:.1f}x)")
@@ -1,13 +1,31 @@
 import requests
 import json
+import logging
+import socket
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from latencyMetrics import metrics
 
-def call_llama_model(prompt):
-    url = "http://localhost:11434/api/generate"
-    headers = {
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": "llama3.1",
+logger = logging.getLogger(__name__)
+
+OLLAMA_URL = "http://localhost:11434/api/generate"
+MODEL = "llama3.1"
+# 流式决策的硬性截止时间（秒），超时返回 HOLD
+DECISION_DEADLINE = 30
+# 建立连接的超时时间（秒）
+CONNECT_TIMEOUT = 3
+# 按 make_llm_trade_decision 的判断顺序排列
+DECISIONS = ("BUY", "SELL", "HOLD")
+
+# 复用 HTTP 连接（keep-alive），不再每次调用都重新建立连接
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+session.headers.update({"Content-Type": "application/json"})
+
+def build_payload(prompt):
+    return {
+        "model": MODEL,
         "prompt": prompt,
         "system": "",  # 可选，系统提示词
         "options": {
@@ -17,8 +35,14 @@ def call_llama_model(prompt):
         }
     }
 
+def call_llama_model(prompt, product_id=None):
+    """
+    :param product_id: latencyMetrics 中记录耗时使用的交易对
+    """
+    started = time.monotonic()
+    outcome = 'error'
     try:
-        response = requests.post(url, json=payload, headers=headers, stream=True)
+        response = session.post(OLLAMA_URL, json=build_payload(prompt), stream=True)
 
         if response.status_code == 200:
             # 逐行读取生成的文本
@@ -31,6 +55,7 @@ def call_llama_model(prompt):
                     # 获取生成的文本
                     token = json_data.get('response', '')
                     generated_text += token
+            outcome = 'ok'
             return generated_text
         else:
             print("Error:", response.status_code, response.text)
@@ -38,6 +63,118 @@ def call_llama_model(prompt):
     except Exception as e:
         print("Exception occurred:", str(e))
         return None
+    finally:
+        # 失败时返回 None 而不是抛出异常，结果在这里按返回路径记录
+        metrics.record('call_llama_model', time.monotonic() - started, product_id=product_id, outcome=outcome)
+
+def find_decision(first_line):
+    # 与 make_llm_trade_decision 相同的优先级：BUY > SELL > HOLD
+    for decision in DECISIONS:
+        if decision in first_line:
+            return decision
+    return None
+
+def split_first_line(text):
+    """
+    按 str.splitlines 的规则（与 make_llm_trade_decision 相同）取出第一行。
+    :return: (第一行, 第一行是否已经结束)
+    """
+    lines = text.splitlines(keepends=True)
+    if not lines:
+        return "", False
+    first_line = lines[0].splitlines()[0]
+    return first_line, first_line != lines[0]
+
+def close_response(response):
+    """
+    从其他线程关闭流式响应。关闭套接字不会唤醒阻塞中的 recv，先 shutdown 让读取立即返回。
+    """
+    try:
+        connection = response.raw.connection
+        if connection is not None and connection.sock is not None:
+            connection.sock.shutdown(socket.SHUT_RDWR)
+    except (AttributeError, OSError):
+        pass
+    response.close()
+
+def stream_decision(prompt, deadline=DECISION_DEADLINE, fallback="HOLD", url=OLLAMA_URL, product_id=None):
+    """
+    逐行解析 Ollama 的 NDJSON 流，第一行结束（出现换行或生成结束）时就关闭连接并返回，不再等待生成剩余的文本。
+    判断规则与 make_llm_trade_decision 相同：对完整的第一行按 BUY > SELL > HOLD 的顺序查找，
+    例如 "HOLD, not BUY" 返回 BUY；第一行没有明确答案时返回 HOLD。
+    :param deadline: 从开始请求到得到答案的最长时间（秒）
+    :param fallback: 超时或请求失败时的返回值
+    :param product_id: latencyMetrics 中记录耗时使用的交易对
+    """
+    started = time.monotonic()
+    response = None
+    timer = None
+    expired = threading.Event()
+    # 记录到 latencyMetrics 的结果：ok / unclear / timeout / error
+    outcome = 'error'
+
+    def expire():
+        # 读取超时只限制单次读取，一直缓慢发送的长行不会触发；到期时直接关闭连接，阻塞的读取随即结束
+        expired.set()
+        close_response(response)
+
+    try:
+        # 读取超时不超过截止时间，等待响应头不会越过 deadline
+        response = session.post(url, json=build_payload(prompt), stream=True, timeout=(CONNECT_TIMEOUT, deadline))
+        if response.status_code != 200:
+            logger.error(f"Ollama error: {response.status_code} {response.text}")
+            return fallback
+
+        timer = threading.Timer(max(0.0, deadline - (time.monotonic() - started)), expire)
+        timer.daemon = True
+        timer.start()
+
+        text = ""
+        for line in response.iter_lines():
+            if expired.is_set() or time.monotonic() - started > deadline:
+                logger.warning(f"LLM decision deadline of {deadline}s exceeded, returning {fallback}.")
+                outcome = 'timeout'
+                return fallback
+            if not line:
+                continue
+            json_data = json.loads(line)
+            text += json_data.get('response', '')
+            # 只看第一行，第一行结束之前不做判断
+            _, complete = split_first_line(text)
+            if complete or json_data.get('done'):
+                break
+
+        if expired.is_set():
+            # 连接被关闭时流可能只是提前结束，不能把不完整的第一行当作答案
+            logger.warning(f"LLM decision deadline of {deadline}s exceeded, returning {fallback}.")
+            outcome = 'timeout'
+            return fallback
+
+        first_line, _ = split_first_line(text)
+        decision = find_decision(first_line)
+        if decision is None:
+            logger.warning(f"Unclear response from LLM: {first_line!r}, defaulting to HOLD.")
+            outcome = 'unclear'
+            return "HOLD"
+        logger.debug(f"LLM decision {decision} after {time.monotonic() - started:.3f}s")
+        outcome = 'ok'
+        return decision
+
+    except Exception as e:
+        # 流式读取中的读取超时会被 requests 包装成 ConnectionError
+        if expired.is_set() or isinstance(e, requests.exceptions.Timeout) or time.monotonic() - started >= deadline:
+            logger.warning(f"LLM decision deadline of {deadline}s exceeded, returning {fallback}.")
+            outcome = 'timeout'
+        else:
+            logger.exception("Failed to stream LLM decision.")
+        return fallback
+    finally:
+        if timer is not None:
+            timer.cancel()
+        if response is not None:
+            # 提前关闭流，Ollama 会停止生成
+            response.close()
+        metrics.record('stream_decision', time.monotonic() - started, product_id=product_id, outcome=outcome)
 
 # 示例使用
 if __name__ == "__main__":
@@ -3,15 +3,34 @@ import time
 import uuid
 import os
 import re
+from balanceCache import BalanceCache
+from collections import deque
+from cycleRuntime import CycleRuntime, call
+from rotatingLog import tail_lines
+from signalChannel import SignalConsumer
 from datetime import datetime
-from restClient import client
+from eventTrigger import EventTrigger, SignalChannelSource
+from latencyMetrics import metrics, start_exporter
+from marketSnapshot import get_current_price
 from restClientHelper import market_order_buy, market_order_sell
+from strategyRules import OPPOSITE_VOLUME_THRESHOLD, opposite_trader_action
 
 CRYPTO = "XRP"
 CASH = "USD"
 PRODUCT_ID = "XRP-USD"
 WAIT_TIME = 30
-THREASHOLD = 1400000
+# 每个 REST 调用的超时时间（秒）
+FETCH_TIMEOUT = 10
+# 事件驱动模式：wsMonitor 发布新窗口后立即决策，没有事件时按 WAIT_TIME 兜底
+EVENT_DRIVEN = True
+MIN_DECISION_INTERVAL = 5
+THREASHOLD = OPPOSITE_VOLUME_THRESHOLD
+# 每次最多读取的 wsMonitor 数据点数量，与 wsMonitor 保留的行数相同
+MAX_DATA_POINTS = 1000
+# 至少有这么多数据点才做判断
+MIN_DATA_POINTS = 3
+# 超过这个时间没有收到新记录，则重新附加共享内存（wsMonitor 可能已重启）
+CHANNEL_STALE_SECONDS = 5 * 60
 
 # Configure logging
 logging.basicConfig(
@@ -22,26 +41,28 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def get_balances():
-    try:
-        # Fetch account balances using the SDK
-        response = client.get_accounts()
+# wsMonitor 共享内存通道的读者，以及从通道收到的数据点
+signal_consumer = None
+channel_data_points = deque(maxlen=MAX_DATA_POINTS)
+last_signal_time = None
 
-        # Extract the list of accounts from the response
-        accounts = response['accounts']
+# 并发执行每个周期里互不依赖的数据请求
+runtime = CycleRuntime(default_timeout=FETCH_TIMEOUT)
 
-        crypto_balance = None
-        cash_balance = None
+# 决策触发器
+trigger = EventTrigger(min_interval=MIN_DECISION_INTERVAL)
 
-        # Loop through the accounts to find balances for CRYPTO and CASH
-        for account in accounts:
-            currency = account['currency']
-            available_balance = account['available_balance']['value']
+# 账户余额缓存，由用户频道的成交推送保持最新
+balance_cache = BalanceCache([PRODUCT_ID])
 
-            if currency == CRYPTO:
-                crypto_balance = float(available_balance)
-            elif currency == CASH:
-                cash_balance = float(available_balance)
+def get_balances():
+    try:
+        # 余额来自用户频道推送更新的缓存（字典读取），首次调用时通过 REST 初始化
+        # 在 try 之内计时，异常在下面被吞掉之前先记为 error
+        with metrics.stage('get_balances', PRODUCT_ID):
+            if not balance_cache.seeded:
+                balance_cache.start()
+            crypto_balance, cash_balance = balance_cache.get_balances(CRYPTO, CASH)
 
         return crypto_balance, cash_balance
 
@@ -49,36 +70,6 @@ def get_balances():
         logger.exception("Failed to retrieve account balances.")
         return None, None
 
-# Get current crypto price
-def get_current_crypto_price():
-    try:
-        logger.info(f"Fetching current {CRYPTO} price...")
-
-        # Fetch the product book data using the SDK's method
-        product_book_data = client.get_product_book(product_id=PRODUCT_ID)
-
-        # Extract bids and asks from 'pricebook'
-        pricebook = product_book_data['pricebook']
-        bids = pricebook['bids']
-        asks = pricebook['asks']
-
-        # Get the best bid and ask from the first entry
-        best_bid = float(bids[0]['price']) if bids else None
-        best_ask = float(asks[0]['price']) if asks else None
-
-        # Calculate the midpoint as the current price
-        if best_bid and best_ask:
-            current_price = (best_bid + best_ask) / 2
-            logger.info(f"Calculated {CRYPTO} price: {current_price:.8f} {CASH} (midpoint of best_bid and best_ask)")
-            return current_price
-        else:
-            logger.error("Best bid or best ask is missing.")
-            return None
-
-    except Exception as e:
-        logger.exception(f"Failed to retrieve {CRYPTO} price.")
-        return None
-
 def percentage_market_order_buy(price, cash_amount, percentage):
     try:
         spend_cash = cash_amount * (percentage / 100)
@@ -99,16 +90,15 @@ def percentage_market_order_sell(price, crypto_amount, percentage):
 def read_wsmonitor_output():
     try:
         # 定义文件路径
-        file_path = 'trade_analysis.txt'
+        file_path = f'trade_analysis_{PRODUCT_ID}.txt'
 
         # 检查文件是否存在
         if not os.path.exists(file_path):
             logger.warning(f"{file_path} 文件不存在。")
             return None
 
-        # 读取文件内容，获取所有数据点
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        # 从文件末尾读取最近的数据点（包括已轮转的旧段），不再读取整个文件
+        lines = tail_lines(file_path, MAX_DATA_POINTS, backup_count=1)
 
         # 过滤非空行
         lines = [line.strip() for line in lines if line.strip()]
@@ -144,71 +134,111 @@ def read_wsmonitor_output():
         logger.exception("读取 wsMonitor 输出时出错。")
         return None
 
+def read_signal_channel():
+    """
+    从 wsMonitor 的共享内存通道读取新记录，没有文本解析。
+    通道不可用时退回 read_wsmonitor_output()。
+    """
+    global signal_consumer, last_signal_time
+    try:
+        if signal_consumer is not None and time.monotonic() - last_signal_time > CHANNEL_STALE_SECONDS:
+            logger.warning("共享内存通道长时间没有新记录，重新连接。")
+            signal_consumer.close()
+            signal_consumer = None
+
+        if signal_consumer is None:
+            signal_consumer = SignalConsumer()
+            last_signal_time = time.monotonic()
+            channel_data_points.clear()
+
+        records, lagged = signal_consumer.poll()
+        if lagged:
+            logger.warning(f"读取共享内存通道落后，丢失了 {lagged} 条记录。")
+        if records:
+            last_signal_time = time.monotonic()
+
+        accumulate_signal_records(records, channel_data_points)
+
+    except FileNotFoundError:
+        # wsMonitor 没有运行或共享内存不可用
+        signal_consumer = None
+        return read_wsmonitor_output()
+    except Exception as e:
+        logger.exception("读取共享内存通道时出错。")
+        signal_consumer = None
+        return read_wsmonitor_output()
+
+    return ready_data_points(channel_data_points)
+
+def accumulate_signal_records(records, data_points, product_id=PRODUCT_ID):
+    """
+    把 wsMonitor 发布的窗口记录中属于 product_id 的有效数据点加入 data_points。
+    交易循环和 feedRecorder 的离线回放共用这一步，过滤规则保持一致。
+    :param records: SignalRecord 列表
+    :param data_points: deque(maxlen=MAX_DATA_POINTS)
+    :return: 加入的数据点数量
+    """
+    added = 0
+    for record in records:
+        if record.product_id != product_id:
+            continue
+        if record.total_volume == 0 or record.ratio == 0.0:
+            logger.error(f"Total Volume is {record.total_volume}, Ratio is {record.ratio}, please check web socket connection")
+            continue
+        data_points.append({'total_volume': record.total_volume, 'ratio': record.ratio})
+        added += 1
+    return added
+
+def ready_data_points(data_points):
+    """
+    :return: 数据点足够时返回列表，否则返回 None
+    """
+    if len(data_points) < MIN_DATA_POINTS:
+        logger.warning("数据点不足，无法进行判断。")
+        return None
+    return list(data_points)
+
 def check_trading_conditions(data_points):
     if not data_points or len(data_points) < 2:
         return 'hold', 0
 
-    # 获取最新的数据点和前一个数据点
-    latest_point = data_points[-1]
-    previous_point = data_points[-2]
-
-    latest_ratio = latest_point['ratio']
-    previous_ratio = previous_point['ratio']
-
-    latest_sign = 'positive' if latest_ratio > 0 else 'negative'
-    previous_sign = 'positive' if previous_ratio > 0 else 'negative'
-
-    sign = previous_sign
-    streak = 0
-    isThreasholdReached = False
-
-    if latest_sign != previous_sign:
-        # 从 previous_point 开始
-        for i in range(len(data_points) - 2, -1, -1):
-            point = data_points[i]
-            ratio = point['ratio']
-            total_volume = point['total_volume']
-            sign = 'positive' if ratio > 0 else 'negative'
-            if sign != previous_sign: 
-                break
-            streak += 1
-            if total_volume > THREASHOLD: 
-                isThreasholdReached = True
-
-        # 如果有datapoint达到THREASHOLD
-        if isThreasholdReached:
-            if previous_sign == 'positive' and latest_sign == 'negative':
-                # 从正变负，执行卖出操作
-                percentage = min(streak, 20)
-                logger.info(f"检测到从 {previous_sign} 到 {latest_sign} 的符号变化，之前连续 {streak} 个数据点。卖出 {percentage}% 的持仓。")
-                return 'sell', percentage
-            elif previous_sign == 'negative' and latest_sign == 'positive':
-                # 从负变正，执行买入操作
-                percentage = min(streak * 2, 20)
-                logger.info(f"检测到从 {previous_sign} 到 {latest_sign} 的符号变化，之前连续 {streak} 个数据点。买入 {percentage}% 的现金余额。")
-                return 'buy', percentage
-        else:
-            return 'hold', 0
-    else:
-        return 'hold', 0
+    ratios = [point['ratio'] for point in data_points]
+    total_volumes = [point['total_volume'] for point in data_points]
+    action, percentage, streak = opposite_trader_action(ratios, total_volumes, threshold=THREASHOLD)
+
+    if action == 'sell':
+        # 从正变负，执行卖出操作
+        logger.info(f"检测到从 positive 到 negative 的符号变化，之前连续 {streak} 个数据点。卖出 {percentage}% 的持仓。")
+    elif action == 'buy':
+        # 从负变正，执行买入操作
+        logger.info(f"检测到从 negative 到 positive 的符号变化，之前连续 {streak} 个数据点。买入 {percentage}% 的现金余额。")
+    return action, percentage
 
 
 def main():
     logger.info("Starting main trading loop...")
+    # 各阶段耗时定期写入 metrics_oppositeTrader.prom（Prometheus 文本格式）
+    start_exporter('oppositeTrader')
+    if EVENT_DRIVEN:
+        SignalChannelSource(PRODUCT_ID).start(trigger)
     while True:
         # 读取 wsMonitor 的输出
-        data_points = read_wsmonitor_output()
+        data_points = read_signal_channel()
         if not data_points:
             logger.info("无法获取有效的数据点，等待下一个周期。")
-            time.sleep(WAIT_TIME)  # 等待WAIT_TIME sec
+            trigger.wait(timeout=WAIT_TIME)  # 等待下一个窗口，最多WAIT_TIME sec
             continue
 
         # 检查交易条件
         action, percentage = check_trading_conditions(data_points)
 
-        # # 获取当前价格和账户余额
-        crypto_amount, cash_amount = get_balances()
-        current_price = get_current_crypto_price()
+        # 并发获取当前价格和账户余额
+        results = runtime.fetch_all({
+            'balances': call(get_balances, default=(None, None)),
+            'current_price': call(get_current_price, PRODUCT_ID),
+        })
+        crypto_amount, cash_amount = results['balances']
+        current_price = results['current_price']
 
         if not current_price or crypto_amount is None or cash_amount is None:
             logger.warning("无法获取账户余额或当前价格，跳过本次循环。")
@@ -227,7 +257,7 @@ def main():
             logger.info("未满足交易条件，保持持仓。")
 
         # 等待下一个周期
-        time.sleep(WAIT_TIME)  # 根据需要调整等待时间
+        trigger.wait(timeout=WAIT_TIME)  # 等待 wsMonitor 的下一个窗口，最多 WAIT_TIME sec
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,196 @@
+import inspect
+import itertools
+import logging
+import os
+import random
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from backtest import load_candle_history, run_backtest
+from technicalAnalysis import calculate_indicators
+
+logger = logging.getLogger(__name__)
+
+REPORT_FILE = 'optimizer_report.csv'
+
+# 参数空间：列表表示网格取值，元组 (low, high) 表示随机搜索的区间
+INDICATOR_SPACE = {
+    'ma_short': [3, 5, 8],
+    'ma_long': [10, 15, 20],
+    'bb_window': [14, 20, 30],
+    'bb_std': [1.5, 2, 2.5],
+    'rsi_window': [7, 14, 21],
+}
+
+# calculate_indicators 接受的参数名，用于把参数组合分给指标和策略
+INDICATOR_PARAMS = frozenset(inspect.signature(calculate_indicators).parameters) - {'df'}
+
+STRATEGY_SPACES = {
+    'simple': {
+        'buy_threshold': [0.8, 0.9, 0.94, 1.0],
+        'sell_threshold': [0.0, 0.06, 0.1, 0.2],
+        'buy_fraction': [0.1, 0.3, 0.5],
+        'sell_fraction': [0.3, 0.6, 0.9],
+    },
+    'ai': {},
+    'opposite': {
+        'threshold': [800000, 1000000, 1400000, 2000000],
+        'sell_cap': [10, 20, 40],
+        'buy_cap': [10, 20, 40],
+        'sell_streak_multiplier': [1, 2],
+        'buy_streak_multiplier': [1, 2, 3],
+    },
+}
+
+def default_space(strategy):
+    # oppositeTrader 不使用技术指标
+    if strategy == 'opposite':
+        return dict(STRATEGY_SPACES['opposite'])
+    return {**INDICATOR_SPACE, **STRATEGY_SPACES[strategy]}
+
+def grid_search(space):
+    """
+    :return: 参数空间内所有组合的迭代器
+    """
+    names = list(space)
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+def random_search(space, samples, seed=0):
+    """
+    :return: samples 个随机组合；列表随机取一个值，(low, high) 区间均匀采样（整数区间取整数）
+    """
+    rng = random.Random(seed)
+    for _ in range(samples):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                params[name] = rng.randint(low, high) if isinstance(low, int) and isinstance(high, int) else rng.uniform(low, high)
+            else:
+                params[name] = rng.choice(values)
+        yield params
+
+# ---------- 共享内存 ----------
+
+class SharedArrays:
+    """
+    把 NumPy 数组放进共享内存，子进程直接映射同一块内存，不需要为每个进程复制一份蜡烛数据。
+    """
+    def __init__(self, arrays):
+        self.blocks = []
+        self.specs = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            self.blocks.append(block)
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+def utc_nanoseconds(times):
+    return times.dt.tz_convert(None).to_numpy(dtype='datetime64[ns]').view('int64')
+
+def naive_utc(timestamp):
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp.tz_convert(None) if timestamp.tzinfo is not None else timestamp
+
+# 子进程中映射的数组
+_worker_blocks = []
+_worker_candles = None
+_worker_trade_flow = None
+
+def _attach(specs):
+    arrays = {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return arrays
+
+def _init_worker(specs):
+    global _worker_candles, _worker_trade_flow
+    arrays = _attach(specs)
+    # 时间列以不带时区的 UTC datetime64[ns] 直接映射共享内存，避免时区转换产生副本
+    _worker_candles = pd.DataFrame({
+        'start': pd.Series(arrays['start'].view('datetime64[ns]'), copy=False),
+        'close': pd.Series(arrays['close'], copy=False),
+    }, copy=False)
+    if 'flow_time' in arrays:
+        _worker_trade_flow = pd.DataFrame({
+            'time': pd.Series(arrays['flow_time'].view('datetime64[ns]'), copy=False),
+            'total_volume': pd.Series(arrays['flow_total_volume'], copy=False),
+            'ratio': pd.Series(arrays['flow_ratio'], copy=False),
+        }, copy=False)
+
+def _evaluate(job):
+    strategy, params, backtest_options = job
+    indicator_params = {name: value for name, value in params.items() if name in INDICATOR_PARAMS}
+    strategy_params = {name: value for name, value in params.items() if name not in INDICATOR_PARAMS}
+    try:
+        result = run_backtest(
+            _worker_candles, strategy=strategy, indicator_params=indicator_params,
+            strategy_params=strategy_params, trade_flow=_worker_trade_flow, **backtest_options
+        )
+        return {**params, 'pnl': result['pnl'], 'pnl_pct': result['pnl_pct'],
+                'max_drawdown': result['max_drawdown'], 'trades': result['trades']}
+    except Exception as e:
+        return {**params, 'pnl': np.nan, 'pnl_pct': np.nan, 'max_drawdown': np.nan, 'trades': 0, 'error': str(e)}
+
+def optimize(candles, combinations, strategy='simple', trade_flow=None, workers=None, report_file=REPORT_FILE, **backtest_options):
+    """
+    在所有 CPU 核心上并行评估参数组合，并把按 PnL 排序的结果写入报告。
+    :param candles: load_candle_history 返回的 DataFrame
+    :param combinations: grid_search / random_search 生成的参数组合
+    :param strategy: 'simple'、'ai' 或 'opposite'
+    :param trade_flow: opposite 策略使用的 load_trade_flow_history 结果
+    :param workers: 进程数，默认为 CPU 核心数
+    :param backtest_options: 传给 run_backtest 的其他参数（initial_cash、fee_rate 等）
+    :return: 排序后的结果 DataFrame
+    """
+    arrays = {
+        'start': utc_nanoseconds(candles['start']),
+        'close': candles['close'].to_numpy(dtype=np.float64),
+    }
+    if trade_flow is not None:
+        arrays['flow_time'] = utc_nanoseconds(trade_flow['time'])
+        arrays['flow_total_volume'] = trade_flow['total_volume'].to_numpy(dtype=np.float64)
+        arrays['flow_ratio'] = trade_flow['ratio'].to_numpy(dtype=np.float64)
+
+    for name in ('start_time', 'end_time'):
+        if backtest_options.get(name) is not None:
+            backtest_options[name] = naive_utc(backtest_options[name])
+
+    workers = workers or os.cpu_count()
+    jobs = [(strategy, params, backtest_options) for params in combinations]
+    shared = SharedArrays(arrays)
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared.specs,)) as executor:
+            results = list(executor.map(_evaluate, jobs, chunksize=max(1, len(jobs) // (workers * 8))))
+    finally:
+        shared.close()
+    elapsed = time.perf_counter() - started
+
+    report = pd.DataFrame(results).sort_values(['pnl', 'max_drawdown'], ascending=[False, True], na_position='last')
+    report = report.reset_index(drop=True)
+    report.index.name = 'rank'
+    if report_file:
+        report.to_csv(report_file)
+    logger.info(f"Evaluated {len(jobs)} combinations on {workers} workers in {elapsed:.1f}s ({len(jobs) / elapsed:.0f}/s).")
+    return report
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    candles = load_candle_history()
+    report = optimize(candles, grid_search(default_space('simple')), strategy='simple')
+    print(report.head(10).to_string())
+
+if __name__ == "__main__":
+    main()
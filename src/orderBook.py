@@ -0,0 +1,291 @@
+import json
+import logging
+import sys
+import threading
+import time
+import websocket
+from sortedcontainers import SortedDict
+
+logger = logging.getLogger(__name__)
+
+# Advanced Trade 公共行情 websocket
+MARKET_DATA_URL = 'wss://advanced-trade-ws.coinbase.com'
+# 断线后重新连接前等待的时间（秒）
+RECONNECT_DELAY = 1
+
+class _BookSide:
+    """
+    一侧盘口：按 key 排序的 SortedDict（key -> 数量）。
+    最优价格总是最后一个 key（买盘 key 为价格，卖盘 key 为负价格）；
+    增加、删除价位和查找都是 O(log n)，读取最优价是 O(log n) 的 peekitem。
+    """
+    def __init__(self, sign):
+        self.sign = sign
+        self.levels = SortedDict()
+
+    def clear(self):
+        self.levels = SortedDict()
+
+    def set(self, price, size):
+        key = self.sign * price
+        if size > 0:
+            self.levels[key] = size
+        else:
+            self.levels.pop(key, None)
+
+    def best(self):
+        try:
+            return self.sign * self.levels.peekitem(-1)[0]
+        except IndexError:
+            return None
+
+    def top(self, n):
+        """
+        :return: 前 n 档 [(price, size)]，从最优价格开始
+        """
+        if not n:
+            return []
+        levels = self.levels
+        return [(self.sign * key, levels[key]) for key in reversed(levels.keys()[-n:])]
+
+    def depth(self, n):
+        return sum(self.levels.values()[-n:]) if n else 0.0
+
+    def cumulative_size(self, price):
+        """
+        :return: 价格不差于 price 的所有档位的总数量
+        """
+        start = self.levels.bisect_left(self.sign * price)
+        return sum(self.levels.values()[start:])
+
+    def __len__(self):
+        return len(self.levels)
+
+class OrderBook:
+    """
+    本地维护的 L2 盘口，由 level2 频道的 snapshot 和 update 事件更新，价格和数量只在收到时转换一次。
+    """
+    def __init__(self, product_id):
+        self.product_id = product_id
+        self.bids = _BookSide(1)
+        self.asks = _BookSide(-1)
+        self.ready = False
+        self.updated_at = None
+        self.lock = threading.Lock()
+
+    def apply(self, event_type, updates):
+        """
+        :param event_type: 'snapshot' 或 'update'
+        :param updates: [{'side': 'bid'/'offer', 'price_level': str, 'new_quantity': str}]
+        """
+        with self.lock:
+            if event_type == 'snapshot':
+                self.bids.clear()
+                self.asks.clear()
+            for update in updates:
+                side = self.bids if update['side'] == 'bid' else self.asks
+                side.set(float(update['price_level']), float(update['new_quantity']))
+            if event_type == 'snapshot':
+                self.ready = True
+            self.updated_at = time.monotonic()
+
+    def reset(self):
+        with self.lock:
+            self.bids.clear()
+            self.asks.clear()
+            self.ready = False
+
+    def best_bid(self):
+        return self.bids.best()
+
+    def best_ask(self):
+        return self.asks.best()
+
+    def mid(self):
+        with self.lock:
+            best_bid = self.bids.best()
+            best_ask = self.asks.best()
+        if best_bid is None or best_ask is None:
+            return None
+        return (best_bid + best_ask) / 2
+
+    def top(self, n=10):
+        """
+        :return: (买盘前 n 档, 卖盘前 n 档)
+        """
+        with self.lock:
+            return self.bids.top(n), self.asks.top(n)
+
+    def depth(self, n=10):
+        """
+        :return: (买盘前 n 档总数量, 卖盘前 n 档总数量)
+        """
+        with self.lock:
+            return self.bids.depth(n), self.asks.depth(n)
+
+    def cumulative_size(self, side, price):
+        """
+        :param side: 'bid' 或 'offer'
+        """
+        with self.lock:
+            return (self.bids if side == 'bid' else self.asks).cumulative_size(price)
+
+class OrderBookFeed:
+    """
+    订阅 level2 频道并维护每个交易对的 OrderBook。
+    sequence_num 出现缺口时丢弃本地盘口并重新连接，重新订阅后会收到新的 snapshot。
+    """
+    def __init__(self, product_ids, url=MARKET_DATA_URL, jwt_provider=None, record_file=None):
+        """
+        :param jwt_provider: 返回 JWT 字符串的函数（level2 可以不认证）
+        :param record_file: 把收到的原始消息逐行写入这个文件，供 replay() 回放
+        """
+        self.product_ids = list(product_ids)
+        self.url = url
+        self.jwt_provider = jwt_provider
+        self.books = {product_id: OrderBook(product_id) for product_id in self.product_ids}
+        self.last_sequence = None
+        self.gaps = 0
+        self.ws = None
+        self._record = open(record_file, 'a', encoding='utf-8') if record_file else None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get_book(self, product_id):
+        """
+        :return: 已经收到 snapshot 的 OrderBook，否则返回 None
+        """
+        book = self.books.get(product_id)
+        return book if book is not None and book.ready else None
+
+    def handle_message(self, message):
+        """
+        处理一条原始消息。
+        :return: False 表示出现序号缺口，需要重新同步
+        """
+        if self._record is not None:
+            self._record.write(message.rstrip('\n') + '\n')
+        data = json.loads(message)
+
+        sequence = data.get('sequence_num')
+        if sequence is not None:
+            if self.last_sequence is not None and sequence != self.last_sequence + 1:
+                logger.warning(f"Level2 sequence gap: {self.last_sequence} -> {sequence}, resyncing.")
+                self.gaps += 1
+                self.last_sequence = None
+                for book in self.books.values():
+                    book.reset()
+                return False
+            self.last_sequence = sequence
+
+        if data.get('channel') != 'l2_data':
+            return True
+        for event in data.get('events', []):
+            book = self.books.get(event.get('product_id'))
+            if book is None:
+                continue
+            if event.get('type') != 'snapshot' and not book.ready:
+                # 还没有收到 snapshot（或刚刚重置），增量无法应用
+                continue
+            book.apply(event.get('type'), event.get('updates', []))
+        return True
+
+    def _subscribe_messages(self):
+        messages = []
+        for channel in ('level2', 'heartbeats'):
+            message = {
+                "type": "subscribe",
+                "product_ids": self.product_ids,
+                "channel": channel
+            }
+            jwt = self.jwt_provider() if self.jwt_provider else None
+            if jwt:
+                message["jwt"] = jwt
+            messages.append(json.dumps(message))
+        return messages
+
+    def _on_open(self, ws):
+        logger.info("Level2 connection opened")
+        self.last_sequence = None
+        for message in self._subscribe_messages():
+            ws.send(message)
+
+    def _on_message(self, ws, message):
+        try:
+            if not self.handle_message(message):
+                ws.close()
+        except Exception as e:
+            logger.exception("Failed to handle level2 message.")
+
+    def _on_error(self, ws, error):
+        logger.error(f"Level2 error: {error}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error
+            )
+            self.ws.run_forever()
+            for book in self.books.values():
+                book.reset()
+            if self._stop.wait(RECONNECT_DELAY):
+                break
+            logger.warning("Level2 connection closed, reconnecting")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def wait_ready(self, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(book.ready for book in self.books.values()):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def stop(self):
+        self._stop.set()
+        if self.ws is not None:
+            self.ws.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._record is not None:
+            self._record.close()
+            self._record = None
+
+def replay(file_path, product_ids=None):
+    """
+    回放 record_file 录制的 level2 消息，返回重建的 OrderBookFeed（不连接网络）。
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        messages = [line for line in f if line.strip()]
+    if product_ids is None:
+        product_ids = []
+        for message in messages:
+            for event in json.loads(message).get('events', []):
+                product_id = event.get('product_id')
+                if product_id and product_id not in product_ids:
+                    product_ids.append(product_id)
+    feed = OrderBookFeed(product_ids)
+    for message in messages:
+        feed.handle_message(message)
+    return feed
+
+if __name__ == "__main__":
+    # python orderBook.py captured_level2.jsonl
+    feed = replay(sys.argv[1])
+    for product_id, book in feed.books.items():
+        bids, asks = book.top(5)
+        print(f"{product_id}: ready={book.ready}, best bid={book.best_bid()}, best ask={book.best_ask()}, mid={book.mid()}, gaps={feed.gaps}")
+        print(f"  bids: {bids}")
+        print(f"  asks: {asks}")
+        started = time.perf_counter()
+        for _ in range(100000):
+            book.best_bid()
+            book.best_ask()
+        print(f"  best bid/ask read: {(time.perf_counter() - started) / 100000 * 1e6:.2f} us")
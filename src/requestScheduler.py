@@ -0,0 +1,242 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# 优先级通道，数字越小越先执行
+PRIORITY_ORDER = 0
+PRIORITY_ACCOUNT = 1
+PRIORITY_MARKET_DATA = 2
+LANE_NAMES = {PRIORITY_ORDER: 'order', PRIORITY_ACCOUNT: 'account', PRIORITY_MARKET_DATA: 'market_data'}
+
+# 进入下单通道的 SDK 方法：只包括会下单、改单、撤单的方法。
+# get_order / list_orders / get_fills / preview_* 等只读查询进入账户通道，不与真正的下单竞争
+ORDER_METHODS = {'create_order', 'edit_order', 'cancel_orders', 'close_position'}
+ORDER_METHOD_PREFIXES = ('market_order', 'limit_order_', 'stop_limit_order_', 'trigger_bracket_order_')
+# 其余账户相关的调用（包括只读的订单、成交、持仓查询）进入账户通道
+ACCOUNT_METHOD_KEYWORDS = ('account', 'portfolio', 'order', 'fill', 'position')
+
+# Advanced Trade 私有接口默认每秒 30 次，收到响应头后按实际额度调整
+DEFAULT_RATE = 30
+# 只使用额度的这一比例，给其他进程留出余量
+RATE_SAFETY = 0.8
+# 同时进行的请求数量
+MAX_CONCURRENCY = 4
+# 收到 429 后的最大重试次数
+MAX_RETRIES = 3
+
+def rate_limit_info(response):
+    """
+    从 SDK 的返回值中读取 rate_limit_headers 附带的 (limit, remaining, reset)，没有时为 None。
+    """
+    def read(attribute, header):
+        if isinstance(response, dict):
+            value = response.get(header)
+        else:
+            value = getattr(response, attribute, None)
+        try:
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+    return (
+        read('rate_limit_limit', 'x-ratelimit-limit'),
+        read('rate_limit_remaining', 'x-ratelimit-remaining'),
+        read('rate_limit_reset', 'x-ratelimit-reset'),
+    )
+
+def _status_code(error):
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+class TokenBucket:
+    """
+    令牌桶限速，速率和剩余额度根据交易所返回的限速响应头动态调整。
+    """
+    def __init__(self, rate=DEFAULT_RATE, safety=RATE_SAFETY, clock=time.monotonic):
+        self.safety = safety
+        self.rate = rate * safety
+        self.capacity = max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.paused_until = 0.0
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.last_refill = clock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """
+        取得一个令牌，必要时等待。
+        :return: 等待的秒数
+        """
+        started = self.clock()
+        while True:
+            with self.lock:
+                now = self.clock()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - started
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def update(self, limit, remaining, reset):
+        """
+        :param limit: 每秒请求额度
+        :param remaining: 当前窗口剩余额度
+        :param reset: 额度重置时间（UNIX 秒或距今秒数）
+        """
+        with self.lock:
+            now = self.clock()
+            self._refill(now)
+            if limit:
+                self.rate = max(1.0, limit * self.safety)
+                self.capacity = max(1.0, self.rate)
+            if remaining is not None:
+                # 不使用超过交易所报告的剩余额度
+                self.tokens = min(self.tokens, max(0.0, remaining - (1 - self.safety) * (limit or 0)))
+                if remaining <= 0 and reset:
+                    delay = reset - time.time() if reset > 1e9 else reset
+                    self.paused_until = max(self.paused_until, now + min(max(delay, 0.0), 60.0))
+
+    def penalize(self, retry_after=1.0):
+        # 收到 429：清空令牌并暂停
+        with self.lock:
+            self.tokens = 0.0
+            self.paused_until = max(self.paused_until, self.clock() + retry_after)
+
+class _LaneStats:
+    __slots__ = ('submitted', 'completed', 'failed', 'total_wait', 'max_wait')
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+class RequestScheduler:
+    """
+    所有 REST 请求的中央调度器：请求按优先级进入队列（下单优先于账户查询，账户查询优先于行情读取），
+    由固定数量的工作线程按令牌桶的速率执行，收到 429 时暂停并重试。
+    """
+    def __init__(self, bucket=None, max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.bucket = bucket or TokenBucket()
+        self.max_retries = max_retries
+        self.queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+        self.stats = {lane: _LaneStats() for lane in LANE_NAMES}
+        self.rate_limited = 0
+        self.workers = [threading.Thread(target=self._run, daemon=True) for _ in range(max_concurrency)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, priority, func, *args, **kwargs):
+        """
+        :return: concurrent.futures.Future
+        """
+        future = Future()
+        with self.lock:
+            self.stats[priority].submitted += 1
+        self.queue.put((priority, next(self.sequence), time.monotonic(), future, func, args, kwargs))
+        return future
+
+    def call(self, priority, func, *args, **kwargs):
+        """
+        提交请求并等待结果，异常会原样抛出。
+        """
+        return self.submit(priority, func, *args, **kwargs).result()
+
+    def _run(self):
+        while True:
+            priority, _, enqueued_at, future, func, args, kwargs = self.queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = self._execute(func, args, kwargs)
+            except BaseException as e:
+                self._record(priority, enqueued_at, failed=True)
+                future.set_exception(e)
+            else:
+                self._record(priority, enqueued_at, failed=False)
+                future.set_result(result)
+
+    def _execute(self, func, args, kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if _status_code(e) == 429 and attempt < self.max_retries:
+                    self.rate_limited += 1
+                    retry_after = getattr(getattr(e, 'response', None), 'headers', {}).get('Retry-After')
+                    self.bucket.penalize(float(retry_after) if retry_after else 2 ** attempt)
+                    logger.warning(f"Rate limited, retrying {getattr(func, '__name__', 'request')} (attempt {attempt + 1}).")
+                    continue
+                raise
+            self.bucket.update(*rate_limit_info(result))
+            return result
+
+    def _record(self, priority, enqueued_at, failed):
+        # 等待时间包括排队、限速等待和重试
+        waited = time.monotonic() - enqueued_at
+        with self.lock:
+            stats = self.stats[priority]
+            stats.completed += 1
+            stats.failed += failed
+            stats.total_wait += waited
+            stats.max_wait = max(stats.max_wait, waited)
+
+    def metrics(self):
+        """
+        :return: 各通道的排队数量、平均/最大等待时间，以及当前速率
+        """
+        with self.lock:
+            queued = {lane: 0 for lane in LANE_NAMES}
+            for item in list(self.queue.queue):
+                queued[item[0]] += 1
+            lanes = {
+                LANE_NAMES[lane]: {
+                    'queued': queued[lane],
+                    'submitted': stats.submitted,
+                    'completed': stats.completed,
+                    'failed': stats.failed,
+                    'avg_wait': stats.total_wait / stats.completed if stats.completed else 0.0,
+                    'max_wait': stats.max_wait,
+                }
+                for lane, stats in self.stats.items()
+            }
+        return {'rate': self.bucket.rate, 'rate_limited': self.rate_limited, 'lanes': lanes}
+
+def lane_for(method_name):
+    if method_name in ORDER_METHODS or method_name.startswith(ORDER_METHOD_PREFIXES):
+        return PRIORITY_ORDER
+    if any(keyword in method_name for keyword in ACCOUNT_METHOD_KEYWORDS):
+        return PRIORITY_ACCOUNT
+    return PRIORITY_MARKET_DATA
+
+class ScheduledClient:
+    """
+    包装 RESTClient：方法调用经过 RequestScheduler，按方法名分配优先级通道，其余属性直接转发。
+    """
+    def __init__(self, client, scheduler=None):
+        self._client = client
+        self.scheduler = scheduler or RequestScheduler()
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if not callable(attribute) or name.startswith('_'):
+            return attribute
+        priority = lane_for(name)
+
+        def scheduled(*args, **kwargs):
+            return self.scheduler.call(priority, attribute, *args, **kwargs)
+        scheduled.__name__ = name
+        return scheduled
@@ -0,0 +1,196 @@
+import logging
+import threading
+from candleStore import Candle, GRANULARITY_SECONDS, MAX_MEMORY_CANDLES
+
+logger = logging.getLogger(__name__)
+
+# 由一分钟蜡烛派生的较大粒度
+BASE_GRANULARITY = GRANULARITY_SECONDS["ONE_MINUTE"]
+TIMEFRAMES = ("FIVE_MINUTE", "FIFTEEN_MINUTE", "ONE_HOUR", "SIX_HOUR")
+# 每个较大粒度最多保留的蜡烛数量
+MAX_RESAMPLED_CANDLES = 1000
+
+class _Timeframe:
+    """
+    单一较大粒度的蜡烛，每根记录第一根和最后一根一分钟蜡烛的时间，乱序到达的一分钟蜡烛也能正确修正开盘价和收盘价。
+    """
+    def __init__(self, granularity, max_candles):
+        self.granularity = granularity
+        self.max_candles = max_candles
+        self.bars = {}  # start -> [low, high, open, close, volume, first_minute, last_minute]
+        self.head = None
+
+    def bucket(self, timestamp):
+        return int(timestamp) // self.granularity * self.granularity
+
+    def fold(self, candle):
+        start = self.bucket(candle.start)
+        bar = self.bars.get(start)
+        if bar is None:
+            if self.head is not None and start <= self.head - self.max_candles * self.granularity:
+                return
+            self.bars[start] = [candle.low, candle.high, candle.open, candle.close, candle.volume, candle.start, candle.start]
+            if self.head is None or start > self.head:
+                self.head = start
+                self._trim()
+            return
+        if candle.low < bar[0]:
+            bar[0] = candle.low
+        if candle.high > bar[1]:
+            bar[1] = candle.high
+        if candle.start < bar[5]:
+            bar[2] = candle.open
+            bar[5] = candle.start
+        if candle.start > bar[6]:
+            bar[3] = candle.close
+            bar[6] = candle.start
+        bar[4] += candle.volume
+
+    def rebuild(self, start, minutes):
+        # 用该时间段内的全部一分钟蜡烛重新汇总
+        if not minutes:
+            self.bars.pop(start, None)
+            return
+        self.bars[start] = [
+            min(candle.low for candle in minutes),
+            max(candle.high for candle in minutes),
+            minutes[0].open,
+            minutes[-1].close,
+            sum(candle.volume for candle in minutes),
+            minutes[0].start,
+            minutes[-1].start
+        ]
+
+    def _trim(self):
+        if len(self.bars) > self.max_candles:
+            horizon = self.head - self.max_candles * self.granularity
+            for start in [start for start in self.bars if start <= horizon]:
+                del self.bars[start]
+
+    def candles(self, count, forming=None):
+        """
+        :param forming: 尚未收盘的一分钟蜡烛，叠加到它所在的蜡烛上
+        :return: 最近 count 根 Candle，按时间倒序排列
+        """
+        bars = self.bars
+        if forming is not None:
+            start = self.bucket(forming.start)
+            bar = bars.get(start)
+            if bar is None:
+                bar = [forming.low, forming.high, forming.open, forming.close, forming.volume, forming.start, forming.start]
+            elif forming.start > bar[6]:
+                bar = [min(bar[0], forming.low), max(bar[1], forming.high), bar[2], forming.close,
+                       bar[4] + forming.volume, bar[5], forming.start]
+            bars = dict(bars)
+            bars[start] = bar
+        starts = sorted(bars, reverse=True)[:count]
+        return [Candle(start, *bars[start][:5]) for start in starts]
+
+class Resampler:
+    """
+    由一分钟蜡烛增量生成 5 分钟、15 分钟、1 小时、6 小时等较大粒度的蜡烛：
+    每收盘一根一分钟蜡烛，只把它合并到各粒度对应的蜡烛中，不需要额外的 REST 请求，也不需要重新整体重采样。
+    尚未收盘的一分钟蜡烛在读取时叠加到最新的蜡烛上。
+    """
+    def __init__(self, timeframes=TIMEFRAMES, max_candles=MAX_RESAMPLED_CANDLES, max_base_candles=MAX_MEMORY_CANDLES):
+        """
+        :param timeframes: GRANULARITY_SECONDS 中的粒度名称
+        :param max_base_candles: 保留的一分钟蜡烛数量，用于去重以及一分钟蜡烛被修正时重建对应的蜡烛
+        """
+        self.timeframes = {
+            GRANULARITY_SECONDS[name]: _Timeframe(GRANULARITY_SECONDS[name], max_candles) for name in timeframes
+        }
+        self.max_base_candles = max_base_candles
+        self.base = {}  # start -> 已合并的一分钟 Candle
+        self.forming = None
+        self.first_closed = None
+        self.last_closed = None
+        self.horizon = None  # 早于这个时间的一分钟蜡烛已从 base 中移除，不能再判断是否合并过
+        self.lock = threading.Lock()
+        self.folded = 0
+        self.rebuilt = 0
+
+    def add(self, candle):
+        """
+        合并一根已收盘的一分钟蜡烛。重复的蜡烛被忽略，内容有变化的蜡烛会重建它所在的较大粒度蜡烛。
+        :return: 是否有变化
+        """
+        with self.lock:
+            return self._add(candle)
+
+    def _add(self, candle):
+        previous = self.base.get(candle.start)
+        if previous == candle or (previous is None and self.horizon is not None and candle.start < self.horizon):
+            return False
+        self.base[candle.start] = candle
+        if previous is None:
+            for timeframe in self.timeframes.values():
+                timeframe.fold(candle)
+            self.folded += 1
+        else:
+            # 一分钟蜡烛被修正（例如 REST 对账后）：重建包含它的蜡烛
+            for timeframe in self.timeframes.values():
+                start = timeframe.bucket(candle.start)
+                minutes = [
+                    self.base[minute]
+                    for minute in range(start, start + timeframe.granularity, BASE_GRANULARITY)
+                    if minute in self.base
+                ]
+                timeframe.rebuild(start, minutes)
+            self.rebuilt += 1
+        if self.first_closed is None or candle.start < self.first_closed:
+            self.first_closed = candle.start
+        if self.last_closed is None or candle.start > self.last_closed:
+            self.last_closed = candle.start
+        if self.forming is not None and self.forming.start <= candle.start:
+            self.forming = None
+        self._trim()
+        return True
+
+    def _trim(self):
+        if len(self.base) > self.max_base_candles * 2:
+            starts = sorted(self.base)
+            for start in starts[:-self.max_base_candles]:
+                del self.base[start]
+            self.horizon = starts[-self.max_base_candles]
+
+    def update(self, candles, now):
+        """
+        合并 client.get_candles / CandleStore 返回的一分钟蜡烛（任意顺序），只处理新的或有变化的蜡烛。
+        :param candles: {'candles': [...]}
+        :param now: 当前交易所时间（UNIX 秒），用于区分已收盘和正在形成的蜡烛
+        :return: 新合并或修正的一分钟蜡烛数量
+        """
+        changed = 0
+        forming = None
+        with self.lock:
+            for candle in sorted(candles['candles'], key=lambda candle: int(candle.start)):
+                if not isinstance(candle, Candle):
+                    candle = Candle(int(candle.start), float(candle.low), float(candle.high),
+                                    float(candle.open), float(candle.close), float(candle.volume))
+                if candle.start + BASE_GRANULARITY <= now:
+                    changed += self._add(candle)
+                else:
+                    forming = candle
+            if forming is not None:
+                self.forming = forming
+        return changed
+
+    def get_candles(self, granularity, count=250):
+        """
+        :param granularity: 粒度名称（如 "FIVE_MINUTE"）或秒数
+        :return: 与 client.get_candles 相同结构的 dict，可以直接交给 technicalAnalysis.process_candle_data
+        """
+        seconds = GRANULARITY_SECONDS.get(granularity, granularity)
+        with self.lock:
+            return {'candles': self.timeframes[seconds].candles(count, self.forming)}
+
+# 每个交易对共享一个重采样器
+_resamplers = {}
+_resamplers_lock = threading.Lock()
+
+def get_resampler(product_id):
+    with _resamplers_lock:
+        if product_id not in _resamplers:
+            _resamplers[product_id] = Resampler()
+        return _resamplers[product_id]
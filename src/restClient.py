@@ -1,7 +1,9 @@
 from coinbase.rest import RESTClient
 from accountConfigs import key_file
+from requestScheduler import ScheduledClient
 
 # Debug
 # client = RESTClient(key_file=key_file, verbose=True, rate_limit_headers=True)
 
-client = RESTClient(key_file=key_file, rate_limit_headers=True)
\ No newline at end of file
+# 所有 REST 请求经过同一个调度器：按响应头限速，下单优先于行情读取
+client = ScheduledClient(RESTClient(key_file=key_file, rate_limit_headers=True))
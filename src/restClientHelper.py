@@ -1,18 +1,21 @@
 import uuid
-from restClient import client
+from latencyMetrics import metrics
 
 # Place buy order at certain amount
 def market_order_buy(product_id, buy_amount):
+    # 下单时才需要 REST 客户端，导入本模块不需要 API key
+    from restClient import client
     try:
         # Generate a unique order ID
         order_id = str(uuid.uuid4())
 
         # Use the SDK's built-in method to place a buy order
-        order = client.market_order_buy(
-            product_id=product_id, 
-            quote_size=f"{buy_amount:.2f}",  # The amount of USDC to spend
-            client_order_id=order_id
-        )
+        with metrics.stage('market_order_buy', product_id):
+            order = client.market_order_buy(
+                product_id=product_id, 
+                quote_size=f"{buy_amount:.2f}",  # The amount of USDC to spend
+                client_order_id=order_id
+            )
     except Exception as e:
         print("Error placing buy order.")
 
@@ -20,15 +23,17 @@ def market_order_buy(product_id, buy_amount):
 
 # Place sell order at certain amount
 def market_order_sell(product_id, sell_amount):
+    from restClient import client
     try:
         # Generate a unique order ID
         order_id = str(uuid.uuid4())
 
         # Use the SDK's built-in method to place a sell order
-        order = client.market_order_sell(
-            product_id=product_id, 
-            base_size=f"{sell_amount:.2f}",  # The amount of crypto to sell
-            client_order_id=order_id
-        )
+        with metrics.stage('market_order_sell', product_id):
+            order = client.market_order_sell(
+                product_id=product_id, 
+                base_size=f"{sell_amount:.2f}",  # The amount of crypto to sell
+                client_order_id=order_id
+            )
     except Exception as e:
         print("Error placing sell order.")
\ No newline at end of file
@@ -0,0 +1,109 @@
+import os
+import threading
+
+# 从文件末尾反向读取时每次读取的字节数
+TAIL_BLOCK_SIZE = 64 * 1024
+
+def segment_path(path, index):
+    # 当前段为 path，较旧的段依次为 path.1、path.2 ...
+    return path if index == 0 else f"{path}.{index}"
+
+def _tail_file(file_path, n):
+    """
+    从文件末尾反向按块读取，返回最后 n 行（不包含换行符），代价只与 n 有关，与文件大小无关。
+    """
+    if n <= 0 or not os.path.exists(file_path):
+        return []
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        # 多读一行，保证第一行是完整的
+        while position > 0 and data.count(b'\n') <= n:
+            read_size = min(TAIL_BLOCK_SIZE, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    return lines[-n:]
+
+def tail_lines(path, n, backup_count=1):
+    """
+    读取分段日志的最后 n 行，当前段不够时继续读取较旧的段。
+    :return: 按时间顺序排列的行列表
+    """
+    lines = []
+    for index in range(backup_count + 1):
+        if len(lines) >= n:
+            break
+        lines = _tail_file(segment_path(path, index), n - len(lines)) + lines
+    return lines
+
+class RotatingLineLog:
+    """
+    只追加的分段日志：写入永远是追加，不再读取和重写整个文件；
+    当前段达到 max_lines 行（或 max_bytes 字节）时通过原子重命名轮转，最多保留 backup_count 个旧段。
+    每次写入的代价与历史长度无关，进程崩溃也不会截断已有内容。
+    """
+    def __init__(self, path, max_lines=1000, max_bytes=None, backup_count=1):
+        self.path = path
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.lock = threading.Lock()
+        self._file = None
+        self._lines = 0
+        self._bytes = 0
+
+    def _open(self):
+        # 启动时统计一次当前段的行数和大小
+        if os.path.exists(self.path):
+            self._bytes = os.path.getsize(self.path)
+            with open(self.path, 'rb') as f:
+                self._lines = sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(TAIL_BLOCK_SIZE), b''))
+        else:
+            self._lines = 0
+            self._bytes = 0
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _should_rotate(self):
+        if self.max_lines is not None and self._lines >= self.max_lines:
+            return True
+        return self.max_bytes is not None and self._bytes >= self.max_bytes
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        if self.backup_count > 0:
+            for index in range(self.backup_count, 0, -1):
+                source = segment_path(self.path, index - 1)
+                if os.path.exists(source):
+                    os.replace(source, segment_path(self.path, index))
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._lines = 0
+        self._bytes = 0
+
+    def append(self, text):
+        """
+        追加一条记录并立即刷新到磁盘。
+        """
+        with self.lock:
+            if self._file is None:
+                self._open()
+            if self._should_rotate():
+                self._rotate()
+            self._file.write(text)
+            self._file.flush()
+            self._lines += text.count('\n')
+            self._bytes += len(text.encode('utf-8'))
+
+    def tail(self, n):
+        return tail_lines(self.path, n, self.backup_count)
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
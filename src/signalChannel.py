@@ -0,0 +1,149 @@
+import os
+import struct
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+# wsMonitor 发布买卖比窗口结果的共享内存名称
+CHANNEL_NAME = 'coinbasebot_trade_flow'
+DEFAULT_CAPACITY = 1024
+
+MAGIC = 0x43425343  # 'CBSC'
+VERSION = 1
+
+# 头部：magic, version, capacity, record_size, write_seq
+HEADER = struct.Struct('<IIIIQ')
+HEADER_SIZE = 64
+WRITE_SEQ_OFFSET = 16
+
+# 记录：stamp, window_end, buy_volume, sell_volume, total_volume, ratio, product_id
+RECORD = struct.Struct('<Qddddd16s')
+STAMP = struct.Struct('<Q')
+
+# 本进程创建的通道，读者附加时不需要取消 resource_tracker 的登记
+_created_names = set()
+
+SignalRecord = namedtuple('SignalRecord', ['seq', 'window_end', 'buy_volume', 'sell_volume', 'total_volume', 'ratio', 'product_id'])
+
+def _untrack(shm):
+    # Python 3.12 及以下，附加到已有共享内存的进程退出时 resource_tracker 会误删它
+    if os.name == 'posix':
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+
+class SignalChannel:
+    """
+    单写多读的共享内存环形缓冲区，每条窗口结果是固定 64 字节的二进制记录。
+    每个槽位带有 seqlock 风格的版本号：写入前置为奇数，写完置为偶数，
+    读者据此判断记录是否完整、是否已经被覆盖（读者落后太多）。
+    """
+    def __init__(self, name=CHANNEL_NAME, capacity=DEFAULT_CAPACITY):
+        size = HEADER_SIZE + capacity * RECORD.size
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # 上次进程异常退出残留的共享内存：重新创建
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created_names.add(name)
+        self.capacity = capacity
+        self.write_seq = 0
+        self.shm.buf[:size] = bytes(size)
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, capacity, RECORD.size, 0)
+
+    def publish(self, product_id, window_end, buy_volume, sell_volume, total_volume, ratio):
+        seq = self.write_seq
+        offset = HEADER_SIZE + (seq % self.capacity) * RECORD.size
+        buf = self.shm.buf
+        STAMP.pack_into(buf, offset, 2 * seq + 1)  # 写入中
+        RECORD.pack_into(
+            buf, offset, 2 * seq + 1, window_end, buy_volume, sell_volume, total_volume, ratio,
+            product_id.encode('ascii')[:16]
+        )
+        STAMP.pack_into(buf, offset, 2 * seq + 2)  # 写入完成
+        self.write_seq = seq + 1
+        STAMP.pack_into(buf, WRITE_SEQ_OFFSET, self.write_seq)
+
+    def close(self):
+        _created_names.discard(self.shm.name.lstrip('/'))
+        self.shm.close()
+        self.shm.unlink()
+
+class SignalConsumer:
+    """
+    读者各自维护读取位置，只读取新记录，没有文本解析。
+    落后超过容量的记录会被跳过，并计入 lagged。
+    """
+    def __init__(self, name=CHANNEL_NAME, from_start=True):
+        """
+        :param from_start: True 时从缓冲区中最旧的记录开始读取，False 时只读取之后发布的记录
+        """
+        self.shm = shared_memory.SharedMemory(name=name)
+        if name not in _created_names:
+            _untrack(self.shm)
+        magic, version, capacity, record_size, write_seq = HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self.shm.close()
+            raise ValueError(f"Shared memory {name} is not a signal channel.")
+        self.capacity = capacity
+        self.cursor = max(0, write_seq - capacity) if from_start else write_seq
+        self.lagged = 0
+
+    def _write_seq(self):
+        return STAMP.unpack_from(self.shm.buf, WRITE_SEQ_OFFSET)[0]
+
+    def poll(self):
+        """
+        :return: (新记录列表, 本次因落后而丢失的记录数)
+        """
+        write_seq = self._write_seq()
+        lagged = 0
+        if write_seq < self.cursor:
+            # 写者重启，从头开始读取
+            self.cursor = max(0, write_seq - self.capacity)
+        if write_seq - self.cursor > self.capacity:
+            lagged += write_seq - self.cursor - self.capacity
+            self.cursor = write_seq - self.capacity
+
+        records = []
+        buf = self.shm.buf
+        while self.cursor < write_seq:
+            seq = self.cursor
+            offset = HEADER_SIZE + (seq % self.capacity) * RECORD.size
+            stamp, window_end, buy_volume, sell_volume, total_volume, ratio, product_id = RECORD.unpack_from(buf, offset)
+            if stamp != 2 * seq + 2 or STAMP.unpack_from(buf, offset)[0] != stamp:
+                # 读取期间被覆盖：跳到当前仍然有效的最旧记录
+                latest = self._write_seq()
+                skip_to = max(seq + 1, latest - self.capacity + 1)
+                lagged += skip_to - seq
+                self.cursor = skip_to
+                write_seq = max(write_seq, latest)
+                continue
+            records.append(SignalRecord(
+                seq, window_end, buy_volume, sell_volume, total_volume, ratio,
+                product_id.rstrip(b'\0').decode('ascii')
+            ))
+            self.cursor = seq + 1
+
+        self.lagged += lagged
+        return records, lagged
+
+    def wait(self, timeout=None, poll_interval=0.0005):
+        """
+        等待新记录，轮询间隔为亚毫秒级。
+        :return: 同 poll()
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._write_seq() <= self.cursor:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(poll_interval)
+        return self.poll()
+
+    def close(self):
+        self.shm.close()
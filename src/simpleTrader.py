@@ -4,12 +4,26 @@ import logging
 import time
 import uuid
 from analysis import analysis
+from balanceCache import BalanceCache
+from cycleRuntime import CycleRuntime, call, exclusive
 from datetime import datetime
+from eventTrigger import CandleCloseSource, EventTrigger
+from latencyMetrics import metrics, start_exporter
+from indicatorEngine import IndicatorEngine
+from marketSnapshot import get_current_price
 from restClient import client
+from strategyRules import SIMPLE_BUY_FRACTION, SIMPLE_SELL_FRACTION, simple_trader_action
+from timeStamps import exchange_now
 
 CRYPTO = "XRP"
 CASH = "USD"
 PRODUCT_ID = "XRP-USD"
+# 每个 REST 调用的超时时间（秒）
+FETCH_TIMEOUT = 10
+# 事件驱动模式：5 分钟蜡烛收盘后立即决策，没有事件时按 DECISION_INTERVAL 兜底
+EVENT_DRIVEN = True
+DECISION_INTERVAL = 300
+MIN_DECISION_INTERVAL = 60
 
 # Configure logging
 logging.basicConfig(
@@ -20,29 +34,28 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def get_balances():
-    try:
-        # Fetch account balances using the SDK
-        response = client.get_accounts()
-
-        # Extract the list of accounts from the response
-        accounts = response['accounts']
+# 增量指标引擎，在交易循环之间保留状态
+indicator_engine = IndicatorEngine()
+# 超时的分析仍在后台线程运行时跳过本周期，两个线程不会同时更新 indicator_engine
+exclusive_analysis = exclusive(analysis)
 
-        # Log the raw accounts response for debugging
-        #logger.debug(f"Accounts data: {accounts}")
+# 并发执行每个周期里互不依赖的数据请求
+runtime = CycleRuntime(default_timeout=FETCH_TIMEOUT)
 
-        crypto_balance = None
-        cash_balance = None
+# 决策触发器
+trigger = EventTrigger(min_interval=MIN_DECISION_INTERVAL)
 
-        # Loop through the accounts to find balances for BTC and USDC
-        for account in accounts:
-            currency = account['currency']
-            available_balance = account['available_balance']['value']
+# 账户余额缓存，由用户频道的成交推送保持最新
+balance_cache = BalanceCache([PRODUCT_ID])
 
-            if currency == CRYPTO:
-                crypto_balance = float(available_balance)
-            elif currency == CASH:
-                cash_balance = float(available_balance)
+def get_balances():
+    try:
+        # 余额来自用户频道推送更新的缓存（字典读取），首次调用时通过 REST 初始化
+        # 在 try 之内计时，异常在下面被吞掉之前先记为 error
+        with metrics.stage('get_balances', PRODUCT_ID):
+            if not balance_cache.seeded:
+                balance_cache.start()
+            crypto_balance, cash_balance = balance_cache.get_balances(CRYPTO, CASH)
 
         # Print and return balances
         if crypto_balance is not None:
@@ -61,52 +74,22 @@ def get_balances():
         logger.exception("Failed to retrieve account balances.")
         return None, None
 
-# Get current crypto price
-def get_current_crypto_price():
-    try:
-        logger.info(f"Fetching current {CRYPTO} price...")
-
-        # Fetch the product book data using the SDK's method
-        product_book_data = client.get_product_book(product_id=PRODUCT_ID)
-
-        # Extract bids and asks from 'pricebook'
-        pricebook = product_book_data['pricebook']
-        bids = pricebook['bids']
-        asks = pricebook['asks']
-
-        # Get the best bid and ask from the first entry
-        best_bid = float(bids[0]['price']) if bids else None
-        best_ask = float(asks[0]['price']) if asks else None
-
-        # Calculate the midpoint as the current price
-        if best_bid and best_ask:
-            current_price = (best_bid + best_ask) / 2
-            logger.info(f"Calculated {CRYPTO} price: {current_price:.8f} {CASH} (midpoint of best_bid and best_ask)")
-            return current_price
-        else:
-            logger.error("Best bid or best ask is missing.")
-            return None
-
-    except Exception as e:
-        logger.exception(f"Failed to retrieve {CRYPTO} price.")
-        return None
-
-
 # Place buy order for 30% of the total cash
 def percentage_market_order_buy(price, cash_amount):
     try:
-        buy_amount = cash_amount * 0.3
+        buy_amount = cash_amount * SIMPLE_BUY_FRACTION
         logger.info(f"Placing buy order for {buy_amount:.2f} {CASH} at {price:.2f} {CASH}/{CRYPTO}")
 
         # Generate a unique order ID
         order_id = str(uuid.uuid4())
 
         # Use the SDK's built-in method to place a buy order
-        order = client.market_order_buy(
-            product_id=PRODUCT_ID, 
-            quote_size=f"{buy_amount:.2f}",  # The amount of USDC to spend
-            client_order_id=order_id
-        )
+        with metrics.stage('market_order_buy', PRODUCT_ID):
+            order = client.market_order_buy(
+                product_id=PRODUCT_ID, 
+                quote_size=f"{buy_amount:.2f}",  # The amount of USDC to spend
+                client_order_id=order_id
+            )
 
         logger.info(f"Buy order placed successfully at price {price:.2f} {CASH}/{CRYPTO}")
     except Exception as e:
@@ -117,18 +100,19 @@ def percentage_market_order_buy(price, cash_amount):
 # Place sell order for 60% of the total crypto
 def percentage_market_order_sell(price, crypto_amount):
     try:
-        sell_amount = crypto_amount * 0.6
+        sell_amount = crypto_amount * SIMPLE_SELL_FRACTION
         logger.info(f"Placing sell order for {sell_amount:.8f} {CRYPTO} at {price:.2f} {CASH}/{CRYPTO}")
 
         # Generate a unique order ID
         order_id = str(uuid.uuid4())
 
         # Use the SDK's built-in method to place a sell order
-        order = client.market_order_sell(
-            product_id=PRODUCT_ID, 
-            base_size=f"{sell_amount:.2f}",  # The amount of crypto to sell
-            client_order_id=order_id
-        )
+        with metrics.stage('market_order_sell', PRODUCT_ID):
+            order = client.market_order_sell(
+                product_id=PRODUCT_ID, 
+                base_size=f"{sell_amount:.2f}",  # The amount of crypto to sell
+                client_order_id=order_id
+            )
 
         logger.info(f"Sell order placed successfully at price {price:.2f} {CASH}/{CRYPTO}")
     except Exception as e:
@@ -139,12 +123,27 @@ def percentage_market_order_sell(price, crypto_amount):
 # Main trading logic
 def main():
     logger.info("Starting main trading loop...")
+    # 各阶段耗时定期写入 metrics_simpleTrader.prom（Prometheus 文本格式）
+    start_exporter('simpleTrader')
+    if EVENT_DRIVEN:
+        CandleCloseSource(DECISION_INTERVAL, clock=exchange_now).start(trigger)
     while True:
-        # Get the current balances
-        crypto_amount, cash_amount = get_balances()
+        # 余额、K 线指标和当前价格互不依赖，并发获取
+        results = runtime.fetch_all({
+            'balances': call(get_balances, default=(None, None)),
+            'analysis': call(exclusive_analysis, engine=indicator_engine, product_id=PRODUCT_ID),
+            'current_price': call(get_current_price, PRODUCT_ID),
+        })
+        crypto_amount, cash_amount = results['balances']
 
         if crypto_amount is None or cash_amount is None:
             logger.warning("Failed to retrieve account balances. Skipping this cycle.")
+            time.sleep(60)
+            continue
+
+        if results['analysis'] is None or results['current_price'] is None:
+            logger.warning("Failed to analyse candles or retrieve price. Skipping this cycle.")
+            time.sleep(60)
             continue
 
         # # Fetch real-time market data and construct prompt for LLM
@@ -152,21 +151,21 @@ def main():
         # print(best_bid, best_ask)
 
         # Add RSI and Bollinger Bands value to prompt
-        rsi, percent_b = analysis()
-
-        current_price = get_current_crypto_price()
+        signal, rsi, percent_b = results['analysis']
+        current_price = results['current_price']
 
-        if percent_b > 0.94:
+        action = simple_trader_action(percent_b)
+        if action == 'buy':
             print("BUY NOW!")
             percentage_market_order_buy(current_price, cash_amount)
-        elif percent_b < 0.06:
+        elif action == 'sell':
             print("SELL NOW!")
             percentage_market_order_sell(current_price, crypto_amount)
         else:
             print("HOLD")
 
-        # sleep for 5 minutes
-        time.sleep(300)
+        # 等待下一根蜡烛收盘（最多 5 分钟）
+        trigger.wait(timeout=DECISION_INTERVAL)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,67 @@
+import numpy as np
+
+# 各交易策略的纯计算规则，不依赖网络或账户，实盘交易和离线回测共用
+
+# simpleTrader：%B 阈值与下单比例
+SIMPLE_BUY_THRESHOLD = 0.94
+SIMPLE_SELL_THRESHOLD = 0.06
+SIMPLE_BUY_FRACTION = 0.3
+SIMPLE_SELL_FRACTION = 0.6
+
+def simple_trader_action(percent_b, buy_threshold=SIMPLE_BUY_THRESHOLD, sell_threshold=SIMPLE_SELL_THRESHOLD):
+    """
+    :return: 'buy'、'sell' 或 'hold'
+    """
+    if percent_b > buy_threshold:
+        return 'buy'
+    elif percent_b < sell_threshold:
+        return 'sell'
+    return 'hold'
+
+# aiTrader：根据 %B 决定买入现金和卖出持仓的比例，同时支持标量和 NumPy 数组
+def ai_buy_percentage(percent_b):
+    return (percent_b + 0.3) * 0.20
+
+def ai_sell_percentage(percent_b):
+    return np.minimum((1 - percent_b) * 0.40, 1)
+
+# oppositeTrader：成交量阈值以及连续数据点数量对应的下单百分比
+OPPOSITE_VOLUME_THRESHOLD = 1400000
+OPPOSITE_SELL_CAP = 20
+OPPOSITE_BUY_CAP = 20
+OPPOSITE_SELL_STREAK_MULTIPLIER = 1
+OPPOSITE_BUY_STREAK_MULTIPLIER = 2
+
+def opposite_trader_action(ratios, total_volumes, threshold=OPPOSITE_VOLUME_THRESHOLD,
+                           sell_cap=OPPOSITE_SELL_CAP, buy_cap=OPPOSITE_BUY_CAP,
+                           sell_streak_multiplier=OPPOSITE_SELL_STREAK_MULTIPLIER,
+                           buy_streak_multiplier=OPPOSITE_BUY_STREAK_MULTIPLIER):
+    """
+    买卖比由正转负时卖出、由负转正时买入，前提是之前同号的连续数据点中至少有一个成交量超过阈值。
+    :param ratios: 按时间顺序的买卖比
+    :param total_volumes: 对应的总成交量
+    :return: (action, percentage, streak)，action 为 'buy'、'sell' 或 'hold'
+    """
+    if len(ratios) < 2:
+        return 'hold', 0, 0
+
+    latest_positive = ratios[-1] > 0
+    previous_positive = ratios[-2] > 0
+    if latest_positive == previous_positive:
+        return 'hold', 0, 0
+
+    # 从倒数第二个数据点开始，统计之前同号的连续数据点
+    streak = 0
+    threshold_reached = False
+    for i in range(len(ratios) - 2, -1, -1):
+        if (ratios[i] > 0) != previous_positive:
+            break
+        streak += 1
+        if total_volumes[i] > threshold:
+            threshold_reached = True
+
+    if not threshold_reached:
+        return 'hold', 0, streak
+    if previous_positive:
+        return 'sell', min(streak * sell_streak_multiplier, sell_cap), streak
+    return 'buy', min(streak * buy_streak_multiplier, buy_cap), streak
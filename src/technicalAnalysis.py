@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
-from getProductCandles import get_candles
+from itertools import chain
+from operator import attrgetter
 
 def detect_golden_death_cross(df):
     """
@@ -29,57 +30,77 @@ def calculate_bollinger_percent_b(df):
     df['PercentB'] = (df['close'] - df['LowerBand']) / (df['UpperBand'] - df['LowerBand'])
     return df
 
-def calculate_indicators(df):
+def calculate_indicators(df, ma_short=5, ma_long=10, bb_window=20, bb_std=2, rsi_window=14):
     # 确保有足够的数据进行计算
-    if len(df) < 20:
-        raise Exception("ERROR: Need at least 20 datapoints to analyse.")
+    min_periods = max(20, bb_window, ma_long, rsi_window + 1)
+    if len(df) < min_periods:
+        raise Exception(f"ERROR: Need at least {min_periods} datapoints to analyse.")
 
-    # 计算移动平均线（MA）
-    df['MA5'] = df['close'].rolling(window=5).mean()
-    df['MA10'] = df['close'].rolling(window=10).mean()
+    # 计算移动平均线（MA），列名沿用 MA5 / MA10 表示短期和长期均线
+    df['MA5'] = df['close'].rolling(window=ma_short).mean()
+    df['MA10'] = df['close'].rolling(window=ma_long).mean()
 
     # 计算布林带（Bollinger Bands）
-    df['MiddleBand'] = df['close'].rolling(window=20).mean()
-    df['StdDev'] = df['close'].rolling(window=20).std()
-    df['UpperBand'] = df['MiddleBand'] + (df['StdDev'] * 2)
-    df['LowerBand'] = df['MiddleBand'] - (df['StdDev'] * 2)
+    df['MiddleBand'] = df['close'].rolling(window=bb_window).mean()
+    df['StdDev'] = df['close'].rolling(window=bb_window).std()
+    df['UpperBand'] = df['MiddleBand'] + (df['StdDev'] * bb_std)
+    df['LowerBand'] = df['MiddleBand'] - (df['StdDev'] * bb_std)
 
     # 计算相对强弱指数（RSI）
     delta = df['close'].diff()
     up = delta.clip(lower=0)
     down = -1 * delta.clip(upper=0)
-    average_gain = up.rolling(window=14).mean()
-    average_loss = down.rolling(window=14).mean()
+    average_gain = up.rolling(window=rsi_window).mean()
+    average_loss = down.rolling(window=rsi_window).mean()
     rs = average_gain / average_loss
     df['RSI'] = 100 - (100 / (1 + rs))
     df = calculate_bollinger_percent_b(df)
 
     return df
 
-def process_candle_data(candles):
-    data_list = []
-    for candle in candles['candles']:
-        data = {
-            'start': candle.start,
-            'low': candle.low,
-            'high': candle.high,
-            'open': candle.open,
-            'close': candle.close,
-            'volume': candle.volume
-        }
-        data_list.append(data)
-
-    # 创建DataFrame
-    df = pd.DataFrame(data_list)
-
-    # 数据类型转换
-    df['start'] = pd.to_datetime(df['start'].astype(int), unit='s', utc=True)
-    numeric_columns = ['open', 'high', 'low', 'close', 'volume']
-    df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric)
-    df = df.sort_values('start').reset_index(drop=True)
+# 列式解析的价格字段，顺序与原来 DataFrame 的列顺序相同
+CANDLE_VALUE_FIELDS = ('low', 'high', 'open', 'close', 'volume')
 
+def candle_arrays(candles):
+    """
+    把蜡烛直接解析为按时间升序排列的列式 NumPy 数组，不经过逐根蜡烛的 dict。
+    :param candles: 同 process_candle_data
+    :return: (start, values)：start 为 int64 UNIX 秒；values 为 5 x n 的 float64，每行依次为 low, high, open, close, volume
+    """
+    if hasattr(candles, 'get_candles'):
+        candles = candles.get_candles()
+    rows = candles['candles']
+    count = len(rows)
+    # 接口和本地缓存返回的蜡烛都按时间倒序排列，倒序读取即为升序；
+    # 字段（SDK 中为字符串）在 fromiter 中逐个转换，直接写入一次性分配好的数组
+    start = np.fromiter(map(int, map(attrgetter('start'), reversed(rows))), np.int64, count=count)
+    values = np.fromiter(
+        map(float, chain.from_iterable(map(attrgetter(field), reversed(rows)) for field in CANDLE_VALUE_FIELDS)),
+        np.float64,
+        count=len(CANDLE_VALUE_FIELDS) * count
+    ).reshape(len(CANDLE_VALUE_FIELDS), count)
+    if count > 1 and not (start[1:] > start[:-1]).all():
+        # 输入不是严格倒序时才需要重新排序（会复制一次）
+        order = np.argsort(start, kind='stable')
+        start = start[order]
+        values = values[:, order]
+    return start, values
+
+def candle_frame(start, values):
+    """
+    在 candle_arrays 的数组上建立 DataFrame，价格列直接引用 values，不复制。
+    """
+    df = pd.DataFrame(values.T, columns=list(CANDLE_VALUE_FIELDS), copy=False)
+    df.insert(0, 'start', pd.to_datetime(start, unit='s', utc=True))
     return df
 
+def process_candle_data(candles):
+    """
+    :param candles: client.get_candles / CandleStore 返回的 dict，或者本地生成蜡烛的 candleAggregator.CandleAggregator
+    :return: 按时间升序排列的 DataFrame，列为 start, low, high, open, close, volume
+    """
+    return candle_frame(*candle_arrays(candles))
+
 def get_latest_indicators(df):
     # 计算指标
     df = calculate_indicators(df)
@@ -100,6 +121,9 @@ def get_latest_indicators(df):
     return indicators
 
 def main():
+    # 只有直接运行时才需要 REST 客户端，保证指标计算可以离线导入
+    from getProductCandles import get_candles
+
     # 处理蜡烛数据
     df_candle_data = process_candle_data(get_candles())
     # 计算指标
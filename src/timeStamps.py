@@ -1,6 +1,6 @@
-import time
 from restClient import client
-from datetime import datetime, timedelta
+from clockSync import ClockSync
+from datetime import datetime, timedelta, timezone
 
 def dhms_to_seconds(hours, minutes, seconds):
     return (hours * 60 + minutes) * 60 + seconds
@@ -16,16 +16,33 @@ def convert_timedelta_to_seconds(duration):
     hours, minutes, seconds = convert_timedelta(duration)
     return dhms_to_seconds(hours, minutes, seconds)
 
+def fetch_exchange_time():
+    server_time = client.get_unix_time()
+    # 优先使用毫秒精度
+    if getattr(server_time, 'epoch_millis', None) is not None:
+        return int(server_time.epoch_millis) / 1000, 0.001
+    return float(server_time.epoch_seconds), 1.0
+
+# 共享的交易所时钟，只偶尔通过网络同步
+exchange_clock = ClockSync(fetch_exchange_time)
+
+def exchange_now():
+    # 交易所当前 UNIX 时间（秒，浮点），不发起网络请求
+    return exchange_clock.now()
+
+def exchange_now_uncertainty():
+    # 当前时钟偏移估计的误差（秒）
+    return exchange_clock.uncertainty()
+
+def exchange_utcnow():
+    # 与 datetime.utcnow() 相同，返回不带时区的 UTC 时间
+    return datetime.fromtimestamp(exchange_now(), tz=timezone.utc).replace(tzinfo=None)
+
 def generate_unix_timestamp(minutes=0, hours=0, days=0, seconds=0):
     # 获取当前时间
-    now = datetime.fromtimestamp(int(client.get_unix_time().epoch_seconds))
+    now = int(exchange_now())
 
     # 根据传入的时间差（分钟、小时、天、秒）计算目标时间
-    target_time = now - timedelta(minutes=minutes, hours=hours, days=days, seconds=seconds)
-
-    # 转换为 UNIX 时间戳（秒）
-    unix_timestamp = int(time.mktime(target_time.timetuple()))
+    unix_timestamp = now - int(timedelta(minutes=minutes, hours=hours, days=days, seconds=seconds).total_seconds())
 
     return str(unix_timestamp)
-
-
@@ -0,0 +1,130 @@
+import threading
+import time
+
+# 每秒一个桶记录的字段
+FIELDS = ('buy_volume', 'sell_volume', 'buy_notional', 'sell_notional', 'trade_count')
+
+class TimeWheel:
+    """
+    按秒分桶的环形缓冲区（时间轮），同时维护多个时间窗口（默认 1 分钟、5 分钟、15 分钟）的汇总值。
+    插入和窗口查询都是 O(1)，时间前进时每秒只需要把离开窗口的桶减掉，内存只与最长窗口有关。
+    websocket 线程写入、处理线程读取，通过锁保证线程安全。
+    """
+    def __init__(self, windows=(60, 300, 900)):
+        """
+        :param windows: 时间窗口长度（秒）
+        """
+        self.windows = tuple(sorted(windows))
+        self.size = self.windows[-1]
+        self.buckets = [[0.0] * len(FIELDS) for _ in range(self.size)]
+        self.bucket_seconds = [None] * self.size
+        self.totals = {window: [0.0] * len(FIELDS) for window in self.windows}
+        self.head = None  # 当前最新的秒
+        self.dropped = 0  # 因为太旧而被丢弃的成交数
+        self.lock = threading.Lock()
+        self._seconds_since_resync = 0
+
+    def _advance(self, second):
+        if self.head is None:
+            self.head = second
+            return
+        if second <= self.head:
+            return
+
+        if second - self.head >= self.size:
+            # 超过最长窗口没有数据，全部清空
+            for bucket in self.buckets:
+                bucket[:] = [0.0] * len(FIELDS)
+            self.bucket_seconds = [None] * self.size
+            for totals in self.totals.values():
+                totals[:] = [0.0] * len(FIELDS)
+            self.head = second
+            return
+
+        steps = second - self.head
+        for current in range(self.head + 1, second + 1):
+            # 窗口 w 覆盖 (current - w, current]，current - w 这一秒离开窗口
+            for window, totals in self.totals.items():
+                leaving = current - window
+                index = leaving % self.size
+                if self.bucket_seconds[index] == leaving:
+                    bucket = self.buckets[index]
+                    for i in range(len(FIELDS)):
+                        totals[i] -= bucket[i]
+            # 复用最旧的桶（它已经离开了最长的窗口）
+            index = current % self.size
+            self.buckets[index][:] = [0.0] * len(FIELDS)
+            self.bucket_seconds[index] = current
+
+        self.head = second
+
+        # 加减运算会累积浮点误差，每转一圈按桶重新精确求和（均摊 O(1)）
+        self._seconds_since_resync += steps
+        if self._seconds_since_resync >= self.size:
+            self._resync(second)
+
+    def _resync(self, second):
+        self._seconds_since_resync = 0
+        for window, totals in self.totals.items():
+            totals[:] = [0.0] * len(FIELDS)
+            for current in range(second - window + 1, second + 1):
+                index = current % self.size
+                if self.bucket_seconds[index] == current:
+                    bucket = self.buckets[index]
+                    for i in range(len(FIELDS)):
+                        totals[i] += bucket[i]
+
+    def add(self, timestamp, side, price, size):
+        """
+        记录一笔成交。
+        :param timestamp: 成交时间（UNIX 秒）
+        :param side: 'buy' 或 'sell'
+        """
+        second = int(timestamp)
+        notional = price * size
+        values = (size, 0.0, notional, 0.0, 1) if side == 'buy' else (0.0, size, 0.0, notional, 1)
+        with self.lock:
+            self._advance(second)
+            age = self.head - second
+            if age >= self.size:
+                self.dropped += 1
+                return
+
+            index = second % self.size
+            if self.bucket_seconds[index] != second:
+                self.buckets[index][:] = [0.0] * len(FIELDS)
+                self.bucket_seconds[index] = second
+            bucket = self.buckets[index]
+            for i, value in enumerate(values):
+                bucket[i] += value
+            # 迟到的成交只计入仍然包含这一秒的窗口
+            for window, totals in self.totals.items():
+                if age < window:
+                    for i, value in enumerate(values):
+                        totals[i] += value
+
+    def window(self, window, now=None):
+        """
+        :param window: 窗口长度（秒），必须是构造时指定的窗口之一
+        :param now: 当前时间（UNIX 秒），默认为本地时间
+        :return: 最近 window 秒内的汇总 dict
+        """
+        second = int(time.time() if now is None else now)
+        with self.lock:
+            self._advance(second)
+            totals = self.totals[window]
+            result = dict(zip(FIELDS, totals))
+        result['trade_count'] = int(round(result['trade_count']))
+        return result
+
+    def windows_snapshot(self, now=None):
+        """
+        :return: {窗口长度: 汇总 dict}，一次加锁取得所有窗口
+        """
+        second = int(time.time() if now is None else now)
+        with self.lock:
+            self._advance(second)
+            snapshot = {window: dict(zip(FIELDS, totals)) for window, totals in self.totals.items()}
+        for result in snapshot.values():
+            result['trade_count'] = int(round(result['trade_count']))
+        return snapshot
@@ -1,33 +1,74 @@
-import os
+import atexit
 import websocket
 import json
 import threading
 import time
-from datetime import datetime, timedelta
-from discordNotification import send_discord_notification
+from datetime import datetime, timedelta, timezone
+from candleAggregator import CandleAggregator
+from candleStore import get_candle_store
+from discordNotification import notifier, send_discord_notification
+from feedRecorder import FEED_RECORD_FILE, FeedRecorder
+from messageDecoder import JSON_BACKEND, decode_match, measure_throughput, sample_messages
+from rotatingLog import RotatingLineLog
+from signalChannel import SignalChannel
+from timeWheel import TimeWheel
 
-# 存储交易数据的全局变量
-trade_data = []
-VOLUME_THRESHOLD = 1400000
 PRODUCT_IDS = ["XRP-USD"]  # 替换为您感兴趣的交易对
 
+# 每个交易对单独的提醒阈值（按该交易对的币数量计），没有列出的交易对使用 VOLUME_THRESHOLD
+VOLUME_THRESHOLD = 1400000
+VOLUME_THRESHOLDS = {
+    "XRP-USD": 1400000,
+}
+
 # 定义时间窗口（例如，最近1分钟）
 WINDOW_DURATION = timedelta(minutes=1)
 
-# 添加一个全局变量，用于跟踪是否已发送警报
-alert_sent = False
+# process_trade_data 汇总的间隔（秒）
+PROCESS_INTERVAL = 30
+
+# 把收到的原始消息录制到 FEED_RECORD_FILE，之后可以用 feedRecorder.py replay 离线回放
+RECORD_FEED = False
+feed_recorder = None
+
+# 同时维护 1 分钟、5 分钟、15 分钟的窗口
+WINDOWS = (60, 5 * 60, 15 * 60)
+
+# 每个交易对一个按秒分桶的时间轮（各自加锁），内存大小固定，不随成交量增长
+trade_wheels = {product_id: TimeWheel(WINDOWS) for product_id in PRODUCT_IDS}
+
+# 每个交易对由成交流在本地生成 1 分钟 / 5 分钟 / 15 分钟蜡烛，只在（重新）连接后与 REST 对账
+candle_aggregators = {product_id: CandleAggregator(product_id) for product_id in PRODUCT_IDS}
+
+# 已收盘的本地蜡烛写入 candleStore 的磁盘缓存，交易脚本的 get_candles 直接读取，不再通过 REST 拉取
+# 每个交易对已经写入到的时间（UNIX 秒）
+candles_stored_until = {}
+
+# 输出给 oppositeTrader 的分析结果，每个交易对一个只追加的分段日志
+TRADE_LOG_FILE = 'trade_analysis_{product_id}.txt'
+trade_logs = {}
+
+# 通过共享内存把每个窗口结果以二进制记录发布给 oppositeTrader
+signal_channel = None
+
+# 已发送"未收到交易数据"警报的交易对
+alert_sent = set()
+
+# 收到的消息数量，用于统计实际的消息速率
+message_count = 0
 
 def on_message(ws, message):
-    data = json.loads(message)
-    if data['type'] == 'match':
-        trade = {
-            'time': datetime.strptime(data['time'], '%Y-%m-%dT%H:%M:%S.%fZ'),
-            'price': float(data['price']),
-            'size': float(data['size']),
-            'side': data['side'],  # 'buy' or 'sell'
-            'product_id': data['product_id']
-        }
-        trade_data.append(trade)
+    global message_count
+    message_count += 1
+    if feed_recorder is not None:
+        feed_recorder.record(message)
+    # 快速解码：先按类型过滤，只解析 match 消息
+    trade = decode_match(message)
+    if trade is not None:
+        wheel = trade_wheels.get(trade.product_id)
+        if wheel is not None:
+            wheel.add(trade.time, trade.side, trade.price, trade.size)
+            candle_aggregators[trade.product_id].add(trade.time, trade.price, trade.size)
 
 def on_error(ws, error):
     print(f"Error: {error}")
@@ -37,6 +78,9 @@ def on_close(ws):
 
 def on_open(ws):
     print("WebSocket connection opened")
+    # 断线期间的成交无法恢复，之后用 REST 蜡烛补齐这段时间
+    for aggregator in candle_aggregators.values():
+        aggregator.mark_connected()
     subscribe_message = {
         "type": "subscribe",
         "channels": [
@@ -74,70 +118,122 @@ def start_websocket():
         print("WebSocket connection closed, restarting in 1 second")
         time.sleep(1)  # 等待一秒钟后重新启动连接
 
+def get_volume_threshold(product_id):
+    return VOLUME_THRESHOLDS.get(product_id, VOLUME_THRESHOLD)
+
+def trade_log_file(product_id):
+    return TRADE_LOG_FILE.format(product_id=product_id)
+
 def process_trade_data():
-    global alert_sent
+    # 启动时测量一次解码能力，与实际消息速率对比可以知道还有多少余量
+    decode_capacity = measure_throughput(sample_messages(), min_seconds=0.2)
+    print(f"Decoder capacity: {decode_capacity:,.0f} msg/s ({JSON_BACKEND})")
+    last_count = message_count
+    last_time = time.monotonic()
     while True:
         # 等待一定时间间隔（例如，每30秒处理一次数据）
-        time.sleep(30)
+        time.sleep(PROCESS_INTERVAL)
+
+        current_time = time.monotonic()
+        message_rate = (message_count - last_count) / (current_time - last_time)
+        last_count, last_time = message_count, current_time
+        print(f"Message rate: {message_rate:,.1f} msg/s, headroom: {decode_capacity / max(message_rate, 1):,.0f}x")
+        notifier_metrics = notifier.metrics()
+        print(f"Discord notifier: backlog {notifier_metrics['backlog']}, dropped {notifier_metrics['dropped']}, sent {notifier_metrics['sent']}, failed {notifier_metrics['failed']}")
 
         # 获取当前时间
         now = datetime.utcnow()
-        window_start = now - WINDOW_DURATION
 
-        # 过滤时间窗口内的交易数据
-        window_trades = [trade for trade in trade_data if trade['time'] >= window_start]
+        # 每个交易对单独汇总，代价只与交易对数量有关，与成交笔数无关
+        for product_id, wheel in trade_wheels.items():
+            try:
+                process_product(product_id, wheel, now)
+            except Exception as e:
+                print(f"处理 {product_id} 的交易数据时出错：{e}")
 
-        # 计算买入和卖出总量
-        buy_volume = sum(trade['size'] for trade in window_trades if trade['side'] == 'buy')
-        sell_volume = sum(trade['size'] for trade in window_trades if trade['side'] == 'sell')
-        total_volume = buy_volume + sell_volume
-        ratio = calculate_ratio(buy_volume, sell_volume)
+        # 重新连接后，缺口所在的蜡烛收盘时与 REST 对账
+        for product_id, aggregator in candle_aggregators.items():
+            try:
+                if aggregator.reconcile_due():
+                    aggregator.reconcile()
+                store_closed_candles(product_id, aggregator)
+            except Exception as e:
+                print(f"{product_id} 蜡烛对账或写入缓存失败：{e}")
 
-        result = f"\nTime Window：{window_start.strftime('%Y-%m-%d %H:%M:%S')} - {now.strftime('%Y-%m-%d %H:%M:%S')}, Buy Volume: {buy_volume}, Sell Volume: {sell_volume}, Ratio: {ratio}, Total Volume: {total_volume} "
+def store_closed_candles(product_id, aggregator):
+    """
+    把上次之后收盘的一分钟蜡烛写入 candleStore 缓存。
+    """
+    candles, start, end = aggregator.closed_candles(candles_stored_until.get(product_id))
+    if end > start:
+        get_candle_store(product_id).add_closed(candles, start, end)
+        candles_stored_until[product_id] = end
 
-        print(result)
+def process_product(product_id, wheel, now):
+    window_start = now - WINDOW_DURATION
 
-        write_to_file(result)
+    # 从时间轮中一次取得所有窗口的汇总，O(1)
+    snapshot = wheel.windows_snapshot(now.replace(tzinfo=timezone.utc).timestamp())
+    window = snapshot[int(WINDOW_DURATION.total_seconds())]
 
-        # Send notification to discord if reach specific condition
-        if total_volume >= VOLUME_THRESHOLD:
-            send_discord_notification(result)
+    # 计算买入和卖出总量
+    buy_volume = window['buy_volume']
+    sell_volume = window['sell_volume']
+    total_volume = buy_volume + sell_volume
+    ratio = calculate_ratio(buy_volume, sell_volume)
 
-        # 当交易量为零且尚未发送警报时，发送一次性警报
-        if total_volume == 0 and not alert_sent:
-            send_discord_notification("警报：在最近的时间窗口内未收到任何交易数据。")
-            alert_sent = True
-        elif total_volume > 0:
-            # 当交易量恢复时，重置alert_sent
-            alert_sent = False
+    result = f"\nProduct: {product_id}, Time Window：{window_start.strftime('%Y-%m-%d %H:%M:%S')} - {now.strftime('%Y-%m-%d %H:%M:%S')}, Buy Volume: {buy_volume}, Sell Volume: {sell_volume}, Ratio: {ratio}, Total Volume: {total_volume} "
 
-        # 清理过期的交易数据，防止列表无限增长
-        trade_data[:] = [trade for trade in trade_data if trade['time'] >= window_start]
+    print(result)
+    for seconds, totals in snapshot.items():
+        print(
+            f"{product_id} {seconds // 60}m window: Buy Volume: {totals['buy_volume']:.2f}, Sell Volume: {totals['sell_volume']:.2f}, "
+            f"Buy Notional: {totals['buy_notional']:.2f}, Sell Notional: {totals['sell_notional']:.2f}, Trades: {totals['trade_count']}"
+        )
 
-def write_to_file(input, max_lines=1000):
-    file_path = 'trade_analysis.txt'
-    try:
-        # 读取现有的文件内容
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-        else:
-            lines = []
+    write_to_file(result, product_id)
+    publish_signal(product_id, now, buy_volume, sell_volume, total_volume, ratio)
 
-        # 添加新数据
-        lines.append(input)
+    # Send notification to discord if reach specific condition
+    if total_volume >= get_volume_threshold(product_id):
+        send_discord_notification(result)
 
-        # 如果行数超过最大值，删除最旧的行
-        if len(lines) > max_lines:
-            lines = lines[-max_lines:]
+    # 当交易量为零且尚未发送警报时，发送一次性警报
+    if total_volume == 0 and product_id not in alert_sent:
+        send_discord_notification(f"警报：{product_id} 在最近的时间窗口内未收到任何交易数据。")
+        alert_sent.add(product_id)
+    elif total_volume > 0:
+        # 当交易量恢复时，重置警报状态
+        alert_sent.discard(product_id)
 
-        # 写回文件
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.writelines(lines)
+def write_to_file(input, product_id=PRODUCT_IDS[0], max_lines=1000):
+    try:
+        # 只追加写入，超过 max_lines 行时轮转到 trade_analysis_<交易对>.txt.1
+        trade_log = trade_logs.get(product_id)
+        if trade_log is None:
+            trade_log = trade_logs[product_id] = RotatingLineLog(trade_log_file(product_id), max_lines=max_lines, backup_count=1)
+        trade_log.append(input)
 
     except Exception as e:
         raise Exception(f"写入文件时发生错误：{e}")
 
+def publish_signal(product_id, window_end, buy_volume, sell_volume, total_volume, ratio):
+    global signal_channel
+    try:
+        if signal_channel is None:
+            signal_channel = SignalChannel()
+        signal_channel.publish(
+            product_id,
+            window_end.replace(tzinfo=timezone.utc).timestamp(),
+            buy_volume,
+            sell_volume,
+            total_volume,
+            ratio
+        )
+    except Exception as e:
+        # 共享内存不可用时 oppositeTrader 会退回读取 trade_analysis_<交易对>.txt
+        print(f"发布信号失败：{e}")
+
 def calculate_ratio(buy_volume, sell_volume):
     if buy_volume > sell_volume and sell_volume != 0:
         return ((buy_volume - sell_volume) / sell_volume) * 100
@@ -147,6 +243,11 @@ def calculate_ratio(buy_volume, sell_volume):
         return 0.0
 
 if __name__ == "__main__":
+    if RECORD_FEED:
+        feed_recorder = FeedRecorder(FEED_RECORD_FILE)
+        # 退出时写完最后一个 gzip 块，否则文件末尾是不完整的块
+        atexit.register(feed_recorder.close)
+
     # 启动WebSocket连接的线程
     websocket_thread = threading.Thread(target=start_websocket)
     websocket_thread.daemon = True
@@ -0,0 +1,64 @@
+"""
+生成 matches_capture.log.gz：XRP-USD 的 matches 录制，每 30 秒一段，每段的买卖量按 SEGMENTS 设定，
+成交时间避开段的边界，wsMonitor 每个 PROCESS_INTERVAL 的一分钟窗口只包含相邻的两段。
+python tests/fixtures/make_matches_capture.py
+"""
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from feedRecorder import FeedRecorder
+
+START = int(datetime(2026, 10, 18, 9, 30, tzinfo=timezone.utc).timestamp())
+SEGMENT_SECONDS = 30
+# 每段的 (买入量, 卖出量)
+SEGMENTS = [
+    (800000, 200000),
+    (800000, 200000),
+    (100000, 900000),
+    (100000, 900000),
+    (900000, 100000),
+    (900000, 100000),
+    (0, 0),
+    (0, 0),
+]
+TRADES_PER_SIDE = 4
+# 接收时间比成交时间晚 50 毫秒
+RECEIVE_DELAY = 0.05
+FILE_NAME = 'matches_capture.log.gz'
+
+def match(trade_id, side, size, price, timestamp):
+    moment = datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    return json.dumps({
+        'type': 'match', 'trade_id': trade_id, 'maker_order_id': f'maker-{trade_id}', 'taker_order_id': f'taker-{trade_id}',
+        'side': side, 'size': f'{size:.6f}', 'price': f'{price:.4f}', 'product_id': 'XRP-USD',
+        'sequence': 1000 + trade_id, 'time': moment
+    }, separators=(',', ':'))
+
+def main(file_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), FILE_NAME)):
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    recorder = FeedRecorder(file_path)
+    # 订阅确认：第一条消息的接收时间决定 process_product 的周期（START + 30 秒起）
+    recorder.record(json.dumps({'type': 'subscriptions', 'channels': [{'name': 'matches', 'product_ids': ['XRP-USD']}]}), START)
+    trade_id = 0
+    for segment, (buy_volume, sell_volume) in enumerate(SEGMENTS):
+        trades = []
+        for side, volume in (('buy', buy_volume), ('sell', sell_volume)):
+            if volume:
+                trades += [(side, volume / TRADES_PER_SIDE)] * TRADES_PER_SIDE
+        for i, (side, size) in enumerate(sorted(trades, key=lambda trade: trade[0] == 'sell')):
+            # 成交分布在段内第 5 到 25 秒
+            timestamp = START + segment * SEGMENT_SECONDS + 5 + i * 20 / max(len(trades), 1)
+            recorder.record(match(trade_id, side, size, 0.5 + 0.001 * segment, timestamp), timestamp + RECEIVE_DELAY)
+            trade_id += 1
+    # 最后一条消息推动最后一个周期
+    end = START + len(SEGMENTS) * SEGMENT_SECONDS
+    recorder.record(json.dumps({'type': 'heartbeat', 'sequence': 1000 + trade_id, 'product_id': 'XRP-USD'}), end + 1)
+    recorder.close()
+    return file_path
+
+if __name__ == '__main__':
+    print(main())
@@ -0,0 +1,73 @@
+import math
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+import pytest
+import analysisTest
+from backtest import load_candle_history, load_trade_flow_history, run_backtest
+
+LEGACY_LINES = (
+    "Time Window：2024-12-03 08:41:29 - 2024-12-03 08:42:29, Buy Volume: 10.0, Sell Volume: 30.0, Ratio: -200.0, Total Volume: 40.0 \n"
+    "Time Window：2024-12-03 08:41:59 - 2024-12-03 08:42:59, Buy Volume: 0.0, Sell Volume: 0.0, Ratio: 0.0, Total Volume: 0.0 \n"
+)
+PRODUCT_LINES = (
+    "Product: XRP-USD, Time Window：2024-12-04 08:41:29 - 2024-12-04 08:42:29, Buy Volume: 30.0, Sell Volume: 10.0, Ratio: 200.0, Total Volume: 40.0 \n"
+)
+
+def test_trade_flow_defaults_to_per_product_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'trade_analysis.txt').write_text(LEGACY_LINES, encoding='utf-8')
+    (tmp_path / 'trade_analysis_XRP-USD.txt').write_text(PRODUCT_LINES, encoding='utf-8')
+    df = load_trade_flow_history()
+    assert df['ratio'].tolist() == [200.0]
+    assert str(df['time'].iloc[0]) == '2024-12-04 08:42:29+00:00'
+
+def test_trade_flow_falls_back_to_legacy_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'trade_analysis.txt').write_text(LEGACY_LINES, encoding='utf-8')
+    df = load_trade_flow_history()
+    # 零成交量的数据点被跳过
+    assert df['ratio'].tolist() == [-200.0]
+    assert df['total_volume'].tolist() == [40.0]
+
+def test_trade_flow_missing_everywhere(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(FileNotFoundError):
+        load_trade_flow_history(product_id='ETH-USD')
+
+def write_candle_cache(cache_dir, minutes=3 * 24 * 60):
+    start = int(datetime(2026, 10, 1, tzinfo=timezone.utc).timestamp())
+    rows = []
+    for i in range(minutes):
+        price = 0.5 + 0.01 * math.sin(i / 30)
+        rows.append((start + 60 * i, price - 0.001, price + 0.001, price, price, 1000.0))
+    pd.DataFrame(rows, columns=['start', 'low', 'high', 'open', 'close', 'volume']).to_csv(
+        cache_dir / 'XRP-USD_ONE_MINUTE.csv', index=False)
+    return load_candle_history(cache_dir=str(cache_dir))
+
+def test_empty_backtest_window_names_ranges(tmp_path):
+    df = write_candle_cache(tmp_path)
+    start_time = datetime(2024, 11, 27, 0, 20, tzinfo=timezone.utc)
+    end_time = datetime(2024, 11, 27, 1, 10, tzinfo=timezone.utc)
+    with pytest.raises(ValueError) as error:
+        run_backtest(df, strategy='simple', start_time=start_time, end_time=end_time)
+    message = str(error.value)
+    assert '2024-11-27 00:20:00' in message
+    assert '2026-10-01 00:00:00' in message
+
+def test_empty_opposite_window(tmp_path):
+    df = write_candle_cache(tmp_path)
+    trade_flow = pd.DataFrame({
+        'time': pd.to_datetime(['2026-10-02 00:00:00'], utc=True), 'total_volume': [10.0], 'ratio': [5.0]
+    })
+    with pytest.raises(ValueError, match='2026-10-02'):
+        run_backtest(df, strategy='opposite', trade_flow=trade_flow,
+                     start_time=datetime(2026, 10, 5, tzinfo=timezone.utc))
+
+def test_analysis_test_defaults_to_last_day(tmp_path, monkeypatch, capsys):
+    df = write_candle_cache(tmp_path)
+    monkeypatch.setattr(analysisTest, 'load_candle_history', lambda: df)
+    analysisTest.main()
+    output = capsys.readouterr().out
+    last = df['start'].iloc[-1]
+    assert f"TimeFrame: {last - timedelta(days=1)}" in output
+    assert 'Strategy: simple' in output and 'Strategy: ai' in output
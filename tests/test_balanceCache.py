@@ -0,0 +1,146 @@
+import asyncio
+import json
+import threading
+import pytest
+import websockets
+from balanceCache import BalanceCache
+from conftest import wait_until
+
+def accounts(balances):
+    return {'accounts': [
+        {'currency': currency, 'available_balance': {'value': str(value), 'currency': currency}}
+        for currency, value in balances.items()
+    ]}
+
+def user_message(sequence, event_type, orders):
+    return json.dumps({
+        'channel': 'user',
+        'sequence_num': sequence,
+        'events': [{'type': event_type, 'orders': orders}]
+    })
+
+def order(order_id, side, quantity, value, fees, status='OPEN'):
+    return {
+        'order_id': order_id,
+        'product_id': 'XRP-USD',
+        'order_side': side,
+        'cumulative_quantity': str(quantity),
+        'filled_value': str(value),
+        'total_fees': str(fees),
+        'status': status,
+    }
+
+class UserChannelStub:
+    """
+    本地 websocket 服务器：记录订阅消息，由测试线程通过 push 向最近的连接推送用户频道消息。
+    """
+    def __init__(self):
+        self.subscriptions = []
+        self.connections = []
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    async def _handler(self, websocket):
+        self.subscriptions.append(json.loads(await websocket.recv()))
+        self.connections.append(websocket)
+        await websocket.wait_closed()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(websockets.serve(self._handler, '127.0.0.1', 0))
+        self.url = f"ws://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        self.ready.set()
+        self.loop.run_forever()
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(5)
+
+    def start(self):
+        self.thread.start()
+        self.ready.wait(5)
+        return self
+
+    def push(self, message):
+        self._call(self.connections[-1].send(message))
+
+    async def _close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def stop(self):
+        self._call(self._close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.loop.close()
+
+@pytest.fixture
+def stub():
+    server = UserChannelStub().start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def rest():
+    state = {'balances': {'XRP': 100.0, 'USD': 1000.0}, 'calls': 0}
+
+    def fetch_accounts():
+        state['calls'] += 1
+        return accounts(state['balances'])
+    state['fetch'] = fetch_accounts
+    return state
+
+def test_fills_update_balances_and_gap_reconciles(stub, rest):
+    cache = BalanceCache(['XRP-USD'], url=stub.url, jwt_provider=None,
+                         fetch_accounts=rest['fetch'], reconcile_interval=3600)
+    cache.start()
+    try:
+        assert cache.get_balances('XRP', 'USD') == (100.0, 1000.0)
+        assert wait_until(lambda: stub.connections)
+        assert stub.subscriptions[0] == {'type': 'subscribe', 'channel': 'user', 'product_ids': ['XRP-USD']}
+
+        # snapshot 中已有的成交包含在 REST 余额中，只记录基准
+        stub.push(user_message(0, 'snapshot', [order('o1', 'BUY', 5, 2.5, 0.01)]))
+        assert wait_until(lambda: 'o1' in cache.orders)
+        assert cache.get_balances('XRP', 'USD') == (100.0, 1000.0)
+
+        # 之后的推送按累计数量的增量更新余额
+        stub.push(user_message(1, 'update', [order('o1', 'BUY', 10, 5.0, 0.02)]))
+        assert wait_until(lambda: cache.fills_applied == 1)
+        crypto, cash = cache.get_balances('XRP', 'USD')
+        assert crypto == pytest.approx(105.0)
+        assert cash == pytest.approx(1000.0 - 2.5 - 0.01)
+
+        stub.push(user_message(2, 'update', [order('o2', 'SELL', 20, 10.0, 0.05, status='FILLED')]))
+        assert wait_until(lambda: cache.fills_applied == 2)
+        crypto, cash = cache.get_balances('XRP', 'USD')
+        assert crypto == pytest.approx(85.0)
+        assert cash == pytest.approx(1000.0 - 2.51 + 10.0 - 0.05)
+        assert 'o2' not in cache.orders
+        assert rest['calls'] == 1
+
+        # 序号跳跃说明漏掉了消息，以 REST 余额为准
+        rest['balances'] = {'XRP': 90.0, 'USD': 1005.0}
+        stub.push(user_message(5, 'update', []))
+        assert wait_until(lambda: rest['calls'] == 2)
+        assert wait_until(lambda: cache.get_balances('XRP', 'USD') == (90.0, 1005.0))
+        assert cache.last_sequence == 5
+    finally:
+        cache.stop()
+
+def test_start_is_idempotent(stub, rest):
+    cache = BalanceCache(['XRP-USD'], url=stub.url, jwt_provider=None,
+                         fetch_accounts=rest['fetch'], reconcile_interval=3600)
+    try:
+        threads = [threading.Thread(target=cache.start) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cache.start()
+        assert rest['calls'] == 1
+        assert len(cache._threads) == 2
+        assert wait_until(lambda: len(stub.connections) == 1)
+        assert len(stub.subscriptions) == 1
+    finally:
+        cache.stop()
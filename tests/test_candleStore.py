@@ -0,0 +1,66 @@
+from candleAggregator import CandleAggregator
+from candleStore import Candle, CandleStore
+
+T0 = 1790000000 // 60 * 60
+
+def fetch_nothing(product_id, start, end):
+    return []
+
+class RecordingClient:
+    """
+    记录 get_candles 请求的区间，只返回正在形成的那一根蜡烛。
+    """
+    def __init__(self):
+        self.requests = []
+
+    def get_candles(self, product_id, start, end, granularity):
+        self.requests.append((int(start), int(end) + 1))
+        return {'candles': []}
+
+def test_closed_local_candles_reach_another_process(tmp_path):
+    # 交易脚本先打开缓存，wsMonitor 之后才写入
+    reader = CandleStore('XRP-USD', cache_dir=str(tmp_path))
+
+    aggregator = CandleAggregator('XRP-USD', fetch_candles=fetch_nothing, backfill_seconds=0)
+    for minute in range(5):
+        aggregator.add(T0 + minute * 60 + 10, 1.0 + minute, 100.0)
+        aggregator.add(T0 + minute * 60 + 50, 2.0 + minute, 50.0)
+    candles, start, end = aggregator.closed_candles(now=T0 + 4 * 60 + 30)
+    # 第 5 分钟还没有收盘
+    assert (start, end) == (T0, T0 + 4 * 60)
+    assert [candle.start for candle in candles] == [T0 + minute * 60 for minute in range(4)]
+    CandleStore('XRP-USD', cache_dir=str(tmp_path)).add_closed(candles, start, end)
+
+    client = RecordingClient()
+    window = reader.get_candles(client, T0, T0 + 4 * 60, now=T0 + 4 * 60 + 30)
+    # 只有正在形成的那一分钟通过 REST 拉取
+    assert client.requests == [(T0 + 4 * 60, T0 + 5 * 60)]
+    assert window['candles'][0] == Candle(T0 + 3 * 60, 4.0, 5.0, 4.0, 5.0, 150.0)
+    assert len(window['candles']) == 4
+
+def test_closed_candles_stop_at_pending_reconcile():
+    aggregator = CandleAggregator('XRP-USD', fetch_candles=fetch_nothing, backfill_seconds=0)
+    aggregator.mark_connected(now=T0)
+    for minute in range(3):
+        aggregator.add(T0 + minute * 60 + 10, 1.0, 1.0)
+    # 首次连接的缺口尚未对账，不写入缓存
+    candles, start, end = aggregator.closed_candles(now=T0 + 3 * 60)
+    assert candles == [] and start == end
+
+    aggregator.reconcile(now=T0 + 60 + 10)
+    candles, start, end = aggregator.closed_candles(now=T0 + 3 * 60 + 10)
+    assert (start, end) == (T0, T0 + 3 * 60)
+    assert len(candles) == 3
+
+def test_partial_row_is_read_once_complete(tmp_path):
+    writer = CandleStore('XRP-USD', cache_dir=str(tmp_path))
+    writer.add_closed([Candle(T0, 1.0, 2.0, 1.5, 1.8, 10.0)], T0, T0 + 60)
+    reader = CandleStore('XRP-USD', cache_dir=str(tmp_path))
+    with open(writer.candle_file, 'a', encoding='utf-8') as f:
+        f.write(f"{T0 + 60},1.0,2.0")
+    reader._sync()
+    assert sorted(reader.candles) == [T0]
+    with open(writer.candle_file, 'a', encoding='utf-8') as f:
+        f.write(",1.5,1.8,20.0\n")
+    reader._sync()
+    assert reader.candles[T0 + 60].volume == 20.0
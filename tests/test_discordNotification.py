@@ -0,0 +1,76 @@
+import threading
+from discordNotification import DiscordNotifier, coalesce, coalesce_batches
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+    def json(self):
+        return {}
+
+class FakeSession:
+    """
+    content 中包含 fail 的请求返回 400，其余返回 204。
+    """
+    def __init__(self):
+        self.posted = []
+
+    def post(self, url, json=None, timeout=None):
+        self.posted.append(json['content'])
+        return FakeResponse(400 if 'fail' in json['content'] else 204)
+
+def make_notifier(session):
+    return DiscordNotifier(url_provider=lambda: 'http://discord.invalid/webhook', coalesce_seconds=0.05,
+                           session=session, max_retries=0)
+
+def test_coalesce_batches_tracks_members():
+    batches = coalesce_batches(['a' * 6, 'b' * 3, 'c' * 12, 'd'], max_length=10)
+    assert [batch for batch, _ in batches] == ['a' * 6 + '\n' + 'b' * 3, 'c' * 10, 'cc\nd']
+    assert [members for _, members in batches] == [{0, 1}, {2}, {2, 3}]
+    assert coalesce(['a' * 6, 'b' * 3, 'c' * 12, 'd'], max_length=10) == [batch for batch, _ in batches]
+
+def test_failed_batch_does_not_drop_the_rest():
+    session = FakeSession()
+    notifier = make_notifier(session)
+    notifier._send(['ok 1', 'fail 2', 'x' * 1996, 'ok 3'])
+    # 第一条合并消息（ok 1 + fail 2）失败，后面两条照常发送
+    assert session.posted == ['ok 1\nfail 2', 'x' * 1996, 'ok 3']
+    metrics = notifier.metrics()
+    assert metrics['sent'] == 2
+    assert metrics['failed'] == 2
+    assert metrics['coalesced'] == 1
+
+def test_exception_in_one_batch_counts_its_messages():
+    class RaisingSession(FakeSession):
+        def post(self, url, json=None, timeout=None):
+            if 'boom' in json['content']:
+                raise ValueError('boom')
+            return super().post(url, json, timeout)
+
+    session = RaisingSession()
+    notifier = make_notifier(session)
+    notifier._send(['boom ' + 'x' * 1994, 'ok'])
+    assert session.posted == ['ok']
+    assert notifier.metrics()['failed'] == 1
+    assert notifier.metrics()['sent'] == 1
+
+def test_counters_are_consistent_across_threads():
+    session = FakeSession()
+    notifier = DiscordNotifier(url_provider=lambda: 'http://discord.invalid/webhook', coalesce_seconds=0.01,
+                               session=session, max_queue_size=50, max_retries=0)
+
+    def produce():
+        for i in range(200):
+            notifier.notify(f'message {i}')
+
+    threads = [threading.Thread(target=produce) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert notifier.flush(timeout=10)
+    metrics = notifier.metrics()
+    assert metrics['enqueued'] + metrics['dropped'] == 800
+    assert metrics['failed'] == 0
+    assert metrics['sent'] + metrics['coalesced'] == metrics['enqueued']
@@ -0,0 +1,88 @@
+import os
+from collections import deque
+from datetime import datetime, timezone
+import pytest
+from conftest import wait_until
+from feedRecorder import FeedRecorder, opposite_trader_decisions, read_recording, recorded_products, replay_ws_monitor
+from oppositeTrader import accumulate_signal_records, ready_data_points
+from signalChannel import SignalRecord
+from strategyRules import OPPOSITE_BUY_CAP, OPPOSITE_SELL_CAP
+
+# 由 fixtures/make_matches_capture.py 生成
+CAPTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'matches_capture.log.gz')
+START = datetime(2026, 10, 18, 9, 30, tzinfo=timezone.utc).timestamp()
+
+# 每个 30 秒周期结束时一分钟窗口的 (买入量, 卖出量)
+EXPECTED_WINDOWS = [
+    (800000, 200000),
+    (1600000, 400000),
+    (900000, 1100000),
+    (200000, 1800000),
+    (1000000, 1000000),
+    (1800000, 200000),
+    (900000, 100000),
+    (0, 0),
+]
+
+def test_recording_reads_back():
+    messages = list(read_recording(CAPTURE))
+    assert len(messages) == 50
+    assert [received_at for received_at, _ in messages] == sorted(received_at for received_at, _ in messages)
+    assert recorded_products(CAPTURE) == ['XRP-USD']
+
+def test_replay_publishes_windows():
+    replayer, signals = replay_ws_monitor(CAPTURE)
+    assert replayer.messages == 50
+    assert [record.window_end for record in signals] == [START + 30 * (i + 1) for i in range(len(EXPECTED_WINDOWS))]
+    assert [(record.buy_volume, record.sell_volume) for record in signals] == pytest.approx(EXPECTED_WINDOWS)
+    assert [record.total_volume for record in signals] == pytest.approx([buy + sell for buy, sell in EXPECTED_WINDOWS])
+    assert signals[1].ratio == pytest.approx(300.0)
+    assert signals[2].ratio == pytest.approx(-200 / 9)
+    assert signals[4].ratio == 0.0
+
+def test_replay_is_independent_of_speed():
+    _, at_max_speed = replay_ws_monitor(CAPTURE)
+    _, scaled = replay_ws_monitor(CAPTURE, speed=2000)
+    assert [record[1:] for record in scaled] == [record[1:] for record in at_max_speed]
+
+def test_decisions_follow_trader_cadence():
+    _, signals = replay_ws_monitor(CAPTURE)
+    decisions = opposite_trader_decisions(signals, 'XRP-USD')
+    # 前两个周期数据点不足；零成交量 / 零买卖比的窗口被过滤，但仍按周期用之前的数据点判断一次
+    assert decisions == [
+        (START + 90, 'sell', min(2, OPPOSITE_SELL_CAP)),
+        (START + 120, 'hold', 0),
+        (START + 150, 'hold', 0),
+        (START + 180, 'buy', min(4, OPPOSITE_BUY_CAP)),
+        (START + 210, 'hold', 0),
+        (START + 240, 'hold', 0),
+    ]
+    assert opposite_trader_decisions(signals, 'BTC-USD') == []
+
+def test_accumulate_filters_like_the_trader():
+    records = [
+        SignalRecord(0, 1.0, 10.0, 5.0, 15.0, 100.0, 'XRP-USD'),
+        SignalRecord(1, 2.0, 0.0, 0.0, 0.0, 0.0, 'XRP-USD'),
+        SignalRecord(2, 3.0, 5.0, 5.0, 10.0, 0.0, 'XRP-USD'),
+        SignalRecord(3, 4.0, 1.0, 2.0, 3.0, -100.0, 'BTC-USD'),
+        SignalRecord(4, 5.0, 2.0, 4.0, 6.0, -100.0, 'XRP-USD'),
+    ]
+    data_points = deque(maxlen=2)
+    assert accumulate_signal_records(records, data_points, 'XRP-USD') == 2
+    assert list(data_points) == [{'total_volume': 15.0, 'ratio': 100.0}, {'total_volume': 6.0, 'ratio': -100.0}]
+    assert ready_data_points(data_points) is None
+    data_points = deque(maxlen=10)
+    accumulate_signal_records(records * 2, data_points, 'XRP-USD')
+    assert len(ready_data_points(data_points)) == 4
+
+def test_recorder_flushes_without_new_messages(tmp_path):
+    file_path = str(tmp_path / 'feed.log.gz')
+    recorder = FeedRecorder(file_path, flush_interval=0.05, clock=lambda: 1.0)
+    try:
+        recorder.record('{"type":"match"}')
+        # 之后没有新消息，由后台线程刷新
+        assert wait_until(lambda: list(read_recording(file_path)) == [(1.0, '{"type":"match"}')])
+    finally:
+        recorder.close()
+    assert not recorder.flush_thread.is_alive()
+    assert list(read_recording(file_path)) == [(1.0, '{"type":"match"}')]
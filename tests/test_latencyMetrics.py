@@ -0,0 +1,42 @@
+import atexit
+import os
+import pytest
+from latencyMetrics import LatencyHistogram, LatencyMetrics, bucket_index, bucket_upper_bound
+
+def test_bucket_bounds_cover_every_value():
+    for microseconds in list(range(0, 5000)) + [10 ** 6, 3600 * 10 ** 6]:
+        index = bucket_index(microseconds)
+        assert bucket_upper_bound(index) >= microseconds
+        assert index == 0 or bucket_upper_bound(index - 1) < microseconds
+
+def test_percentiles_within_relative_error():
+    histogram = LatencyHistogram()
+    for i in range(1, 10001):
+        histogram.record(i / 1000000 * 37)
+    for q in (0.5, 0.9, 0.99):
+        expected = q * 10000 * 37 / 1000000
+        assert histogram.percentile(q) == pytest.approx(expected, rel=0.035)
+
+def test_start_dump_writes_immediately_and_at_exit(tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, 'register', lambda func, *args: registered.append((func, args)))
+    metrics = LatencyMetrics(prefix='test')
+    file_path = str(tmp_path / 'metrics_test.prom')
+
+    metrics.start_dump(file_path, interval=3600)
+    with open(file_path, encoding='utf-8') as f:
+        assert '# TYPE test_stage_latency_seconds histogram' in f.read()
+
+    # 退出时写入的是最新的指标
+    metrics.record('get_candles', 0.002, 'XRP-USD')
+    assert len(registered) == 1
+    func, args = registered[0]
+    func(*args)
+    with open(file_path, encoding='utf-8') as f:
+        assert 'test_stage_calls_total{stage="get_candles",product="XRP-USD",outcome="ok"} 1' in f.read()
+
+def test_dump_failure_is_logged_not_raised(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(atexit, 'register', lambda func, *args: None)
+    metrics = LatencyMetrics()
+    metrics.start_dump(os.path.join(str(tmp_path), 'missing', 'metrics.prom'), interval=3600)
+    assert 'Failed to write metrics' in caplog.text
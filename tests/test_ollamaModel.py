@@ -0,0 +1,122 @@
+import json
+import time
+import pytest
+import ollamaModel
+from conftest import HTTPStub, QuietHandler, wait_until
+from latencyMetrics import metrics
+from ollamaModel import split_first_line, stream_decision
+
+# 每个路径对应一个流：[(发送前等待的秒数, response 片段, done)]
+STREAMS = {
+    '/precedence': [(0, "HOLD", False), (0.02, ", not", False), (0.02, " BUY", False), (0.02, "\n", False)]
+                   + [(0.1, " more reasoning", False)] * 20 + [(0, "", True)],
+    '/split-token': [(0, "SE", False), (0.02, "LL", False), (0.02, "\nBUY", False), (0, "", True)],
+    '/unclear': [(0, "Maybe", False), (0.02, " wait.\n", False), (0.02, "BUY", False), (0, "", True)],
+    '/done': [(0, "BUY", False), (0.02, "", True)],
+    '/slow': [(0, "HO", False), (2, "LD\n", False), (0, "", True)],
+}
+
+# 一行很长的 NDJSON 每 0.4 秒发送 20 字节：每次读取都在读取超时之内，只有截止时间能结束它
+TRICKLE_LINE = json.dumps({'model': 'llama3.1', 'response': "HOLD " * 200 + "\n", 'done': False}).encode() + b'\n'
+TRICKLES = {
+    '/trickle': (0.4, [TRICKLE_LINE[i:i + 20] for i in range(0, len(TRICKLE_LINE), 20)]),
+}
+
+class OllamaStub(HTTPStub):
+    """
+    本地 http.server：与 Ollama 一样以 chunked 编码逐块发送 NDJSON，并记录客户端是否提前断开。
+    """
+    def __init__(self):
+        self.disconnected = set()
+        self.requests = []
+        stub = self
+
+        class Handler(QuietHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                stub.requests.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for delay, chunk in self.chunks():
+                        time.sleep(delay)
+                        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    stub.disconnected.add(self.path)
+
+            def chunks(self):
+                if self.path in TRICKLES:
+                    delay, pieces = TRICKLES[self.path]
+                    return [(delay, piece) for piece in pieces]
+                return [
+                    (delay, json.dumps({'model': 'llama3.1', 'response': token, 'done': done}).encode() + b'\n')
+                    for delay, token, done in STREAMS[self.path]
+                ]
+
+        super().__init__(Handler)
+
+@pytest.fixture
+def stub():
+    server = OllamaStub()
+    yield server
+    server.stop()
+
+def test_split_first_line():
+    assert split_first_line("") == ("", False)
+    assert split_first_line("BU") == ("BU", False)
+    assert split_first_line("BUY\nmore") == ("BUY", True)
+    assert split_first_line("\nBUY") == ("", True)
+    assert split_first_line("SELL\r") == ("SELL", True)
+
+def test_full_first_line_precedence_and_early_close(stub):
+    started = time.monotonic()
+    assert stream_decision("prompt", deadline=5, url=stub.url + '/precedence') == "BUY"
+    # 第一行结束后立即返回，不等待剩余约 2 秒的生成
+    assert time.monotonic() - started < 0.5
+    assert wait_until(lambda: '/precedence' in stub.disconnected)
+    assert stub.requests[0]['prompt'] == "prompt"
+
+def test_decision_split_across_chunks(stub):
+    assert stream_decision("prompt", deadline=5, url=stub.url + '/split-token') == "SELL"
+
+def test_unclear_first_line_holds(stub):
+    assert stream_decision("prompt", deadline=5, url=stub.url + '/unclear') == "HOLD"
+
+def test_done_without_newline(stub):
+    assert stream_decision("prompt", deadline=5, url=stub.url + '/done') == "BUY"
+
+def test_deadline_fallback(stub):
+    started = time.monotonic()
+    assert stream_decision("prompt", deadline=0.5, fallback=None, url=stub.url + '/slow') is None
+    assert time.monotonic() - started < 0.5 + 0.2
+    assert stream_decision("prompt", deadline=0.5, url=stub.url + '/slow') == "HOLD"
+
+def test_deadline_cuts_trickling_line(stub):
+    started = time.monotonic()
+    assert stream_decision("prompt", deadline=0.5, fallback=None, url=stub.url + '/trickle') is None
+    assert time.monotonic() - started < 0.5 + 0.2
+    assert wait_until(lambda: '/trickle' in stub.disconnected)
+
+def test_connection_refused_returns_fallback(stub):
+    url = stub.url
+    stub.stop()
+    assert stream_decision("prompt", deadline=1, fallback=None, url=url) is None
+
+def test_decisions_recorded_per_product(stub):
+    metrics.stages.clear()
+    stream_decision("prompt", deadline=5, url=stub.url + '/done', product_id='XRP-USD')
+    stream_decision("prompt", deadline=0.5, url=stub.url + '/slow', product_id='ETH-USD')
+    summary = metrics.summary()
+    assert summary[('stream_decision', 'XRP-USD')]['outcomes'] == {'ok': 1}
+    assert summary[('stream_decision', 'ETH-USD')]['outcomes'] == {'timeout': 1}
+
+def test_failed_llama_call_recorded_as_error(monkeypatch):
+    metrics.stages.clear()
+    monkeypatch.setattr(ollamaModel, 'OLLAMA_URL', 'http://127.0.0.1:1/api/generate')
+    assert ollamaModel.call_llama_model("prompt", product_id='XRP-USD') is None
+    assert metrics.summary()[('call_llama_model', 'XRP-USD')]['outcomes'] == {'error': 1}
@@ -0,0 +1,15 @@
+import oppositeTrader
+from latencyMetrics import metrics
+
+class FailingBalanceCache:
+    seeded = True
+
+    def get_balances(self, crypto, cash):
+        raise ConnectionError("user channel down")
+
+def test_swallowed_balance_failure_recorded_as_error(monkeypatch):
+    metrics.stages.clear()
+    monkeypatch.setattr(oppositeTrader, 'balance_cache', FailingBalanceCache())
+    assert oppositeTrader.get_balances() == (None, None)
+    outcomes = metrics.summary()[('get_balances', oppositeTrader.PRODUCT_ID)]['outcomes']
+    assert outcomes == {'error': 1}
@@ -0,0 +1,19 @@
+import optimizer
+
+def test_params_routed_by_calculate_indicators_signature(monkeypatch):
+    calls = []
+    def fake_backtest(candles, strategy, indicator_params, strategy_params, trade_flow, **options):
+        calls.append((indicator_params, strategy_params))
+        return {'pnl': 1.0, 'pnl_pct': 0.1, 'max_drawdown': 0.0, 'trades': 2}
+    monkeypatch.setattr(optimizer, 'run_backtest', fake_backtest)
+    # 不在 INDICATOR_SPACE 中的指标参数也按 calculate_indicators 的参数名分配
+    monkeypatch.setattr(optimizer, 'INDICATOR_SPACE', {'ma_short': [3]})
+
+    result = optimizer._evaluate(('simple', {'ma_short': 3, 'rsi_window': 7, 'bb_std': 2.5, 'buy_threshold': 0.9}, {}))
+
+    assert 'error' not in result
+    assert calls == [({'ma_short': 3, 'rsi_window': 7, 'bb_std': 2.5}, {'buy_threshold': 0.9})]
+
+def test_rsi_window_in_default_space():
+    assert 'rsi_window' in optimizer.default_space('simple')
+    assert 'rsi_window' not in optimizer.default_space('opposite')
@@ -0,0 +1,69 @@
+import json
+import os
+import pytest
+from orderBook import OrderBookFeed, replay
+
+CAPTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'level2_capture.jsonl')
+
+def read_capture():
+    with open(CAPTURE, 'r', encoding='utf-8') as f:
+        return [line for line in f if line.strip()]
+
+def test_replay_builds_book():
+    feed = replay(CAPTURE)
+    book = feed.get_book('XRP-USD')
+    assert book is not None
+    assert feed.gaps == 0
+    assert book.best_bid() == 0.5011
+    assert book.best_ask() == 0.5013
+    assert book.mid() == pytest.approx(0.5012)
+
+def test_top_and_depth():
+    book = replay(CAPTURE).get_book('XRP-USD')
+    bids, asks = book.top(3)
+    assert bids == [(0.5011, 25.0), (0.5010, 120.0), (0.5009, 300.5)]
+    assert asks == [(0.5013, 200.0), (0.5014, 60.0), (0.5015, 500.25)]
+    bid_depth, ask_depth = book.depth(3)
+    assert bid_depth == pytest.approx(445.5)
+    assert ask_depth == pytest.approx(760.25)
+    # 档位不足 n 时返回全部档位
+    bids, asks = book.top(10)
+    assert len(bids) == 4 and len(asks) == 4
+    assert book.top(0) == ([], [])
+
+def test_cumulative_size():
+    book = replay(CAPTURE).get_book('XRP-USD')
+    assert book.cumulative_size('bid', 0.5010) == pytest.approx(145.0)
+    assert book.cumulative_size('bid', 0.5008) == pytest.approx(520.5)
+    assert book.cumulative_size('bid', 0.5000) == pytest.approx(520.5)
+    assert book.cumulative_size('offer', 0.5014) == pytest.approx(260.0)
+    assert book.cumulative_size('offer', 0.5012) == 0.0
+
+def test_sequence_gap_resyncs():
+    messages = read_capture()
+    feed = OrderBookFeed(['XRP-USD'])
+    for message in messages:
+        assert feed.handle_message(message)
+
+    # 跳过序号 5 和 6：丢弃本地盘口，等待新的 snapshot
+    gap = json.loads(messages[2])
+    gap['sequence_num'] = 7
+    assert not feed.handle_message(json.dumps(gap))
+    assert feed.gaps == 1
+    assert feed.get_book('XRP-USD') is None
+    assert feed.books['XRP-USD'].best_bid() is None
+
+    # 重新订阅后的增量在 snapshot 之前被忽略
+    update = json.loads(messages[4])
+    update['sequence_num'] = 0
+    assert feed.handle_message(json.dumps(update))
+    assert feed.get_book('XRP-USD') is None
+
+    snapshot = json.loads(messages[0])
+    snapshot['sequence_num'] = 1
+    assert feed.handle_message(json.dumps(snapshot))
+    book = feed.get_book('XRP-USD')
+    assert book is not None
+    assert book.best_bid() == 0.5010
+    assert book.best_ask() == 0.5012
+    assert book.top(2) == ([(0.5010, 120.0), (0.5009, 300.5)], [(0.5012, 80.0), (0.5013, 200.0)])
@@ -0,0 +1,157 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+import requests
+from conftest import HTTPStub, QuietHandler, wait_until
+from requestScheduler import (PRIORITY_ACCOUNT, PRIORITY_MARKET_DATA, PRIORITY_ORDER, RequestScheduler,
+                              ScheduledClient, TokenBucket, lane_for)
+
+class RateLimitStub(HTTPStub):
+    """
+    本地 http.server：记录请求路径，按 responses 中排好的 (状态码, 响应头) 依次返回，没有时返回 200。
+    """
+    def __init__(self):
+        self.paths = []
+        self.responses = {}
+        self.headers = {}
+        stub = self
+
+        class Handler(QuietHandler):
+            def do_GET(self):
+                stub.paths.append(self.path)
+                scripted = stub.responses.get(self.path)
+                status, headers = scripted.pop(0) if scripted else (200, stub.headers)
+                body = b'{}'
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        super().__init__(Handler)
+
+class FakeRESTClient:
+    """
+    与 RESTClient(rate_limit_headers=True) 行为相同的替身：请求本地 stub，
+    非 2xx 时抛出带 response 的 HTTPError，成功时把限速响应头放到返回值的 rate_limit_* 属性上。
+    """
+    def __init__(self, url):
+        self.url = url
+        self.session = requests.Session()
+
+    def _get(self, path):
+        response = self.session.get(self.url + path, timeout=5)
+        response.raise_for_status()
+        return SimpleNamespace(
+            path=path,
+            rate_limit_limit=response.headers.get('x-ratelimit-limit'),
+            rate_limit_remaining=response.headers.get('x-ratelimit-remaining'),
+            rate_limit_reset=response.headers.get('x-ratelimit-reset'),
+        )
+
+    def market_order_buy(self, client_order_id, product_id, quote_size):
+        return self._get('/market_order_buy')
+
+    def get_order(self, order_id):
+        return self._get('/get_order')
+
+    def get_accounts(self, limit=250):
+        return self._get('/get_accounts')
+
+    def get_best_bid_ask(self, product_ids):
+        return self._get('/get_best_bid_ask')
+
+@pytest.fixture
+def stub():
+    server = RateLimitStub()
+    yield server
+    server.stop()
+
+def test_lane_for_only_sends_mutating_calls_to_order_lane():
+    for name in ('create_order', 'market_order_buy', 'market_order_sell', 'limit_order_gtc_buy',
+                 'stop_limit_order_gtd_sell', 'cancel_orders', 'edit_order', 'close_position'):
+        assert lane_for(name) == PRIORITY_ORDER, name
+    for name in ('get_order', 'list_orders', 'get_fills', 'preview_market_order_buy', 'preview_edit_order',
+                 'get_accounts', 'get_portfolio_breakdown', 'list_perps_positions'):
+        assert lane_for(name) == PRIORITY_ACCOUNT, name
+    for name in ('get_candles', 'get_product_book', 'get_best_bid_ask', 'get_market_trades'):
+        assert lane_for(name) == PRIORITY_MARKET_DATA, name
+
+def test_lanes_run_in_priority_order(stub):
+    scheduler = RequestScheduler(bucket=TokenBucket(rate=1000), max_concurrency=1)
+    client = ScheduledClient(FakeRESTClient(stub.url), scheduler)
+
+    # 占住唯一的工作线程，让后面的请求都在队列中排队
+    release = threading.Event()
+    blocker = scheduler.submit(PRIORITY_MARKET_DATA, release.wait)
+    assert wait_until(lambda: scheduler.queue.empty())
+
+    calls = [
+        lambda: client.get_best_bid_ask(['XRP-USD']),
+        lambda: client.get_order('order-1'),
+        lambda: client.get_accounts(),
+        lambda: client.market_order_buy('client-1', 'XRP-USD', '10'),
+    ]
+    threads = []
+    for func in calls:
+        thread = threading.Thread(target=func)
+        thread.start()
+        threads.append(thread)
+        # 保证同一通道内的提交顺序
+        assert wait_until(lambda: scheduler.queue.qsize() == len(threads))
+
+    lanes = scheduler.metrics()['lanes']
+    assert (lanes['order']['queued'], lanes['account']['queued'], lanes['market_data']['queued']) == (1, 2, 1)
+
+    release.set()
+    blocker.result(timeout=5)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert stub.paths == ['/market_order_buy', '/get_order', '/get_accounts', '/get_best_bid_ask']
+
+def test_bucket_adapts_to_rate_limit_headers(stub):
+    bucket = TokenBucket(rate=30, safety=0.8)
+    client = ScheduledClient(FakeRESTClient(stub.url), RequestScheduler(bucket=bucket, max_concurrency=1))
+
+    stub.headers = {'x-ratelimit-limit': '10', 'x-ratelimit-remaining': '5', 'x-ratelimit-reset': '1'}
+    client.get_accounts()
+    assert bucket.rate == pytest.approx(8.0)
+    assert bucket.capacity == pytest.approx(8.0)
+    # 剩余 5 次，保留 20% 额度给其他进程
+    assert bucket.tokens == pytest.approx(3.0)
+
+    # 额度用完：暂停到 reset 之后
+    stub.headers = {'x-ratelimit-limit': '10', 'x-ratelimit-remaining': '0', 'x-ratelimit-reset': '0.3'}
+    client.get_accounts()
+    stub.headers = {}
+    started = time.monotonic()
+    client.get_accounts()
+    assert time.monotonic() - started >= 0.25
+
+def test_429_penalizes_bucket_and_retries(stub):
+    bucket = TokenBucket(rate=1000)
+    scheduler = RequestScheduler(bucket=bucket, max_concurrency=1)
+    client = ScheduledClient(FakeRESTClient(stub.url), scheduler)
+
+    stub.responses['/get_order'] = [(429, {'Retry-After': '0.3'})]
+    started = time.monotonic()
+    result = client.get_order('order-1')
+    assert result.path == '/get_order'
+    assert time.monotonic() - started >= 0.25
+    assert stub.paths == ['/get_order', '/get_order']
+    assert scheduler.rate_limited == 1
+    assert scheduler.metrics()['lanes']['account']['completed'] == 1
+
+def test_429_gives_up_after_max_retries(stub):
+    scheduler = RequestScheduler(bucket=TokenBucket(rate=1000), max_concurrency=1, max_retries=1)
+    client = ScheduledClient(FakeRESTClient(stub.url), scheduler)
+
+    stub.responses['/get_accounts'] = [(429, {'Retry-After': '0.05'})] * 2
+    with pytest.raises(requests.HTTPError) as error:
+        client.get_accounts()
+    assert error.value.response.status_code == 429
+    assert len(stub.paths) == 2
+    assert scheduler.metrics()['lanes']['account']['failed'] == 1